@@ -0,0 +1,255 @@
+# Rotinas administrativas e de carga inicial do catálogo.
+# Ficam fora de main.py para que o processo que atende os alunos não pague o
+# custo de importá-las: main.py as importa apenas no primeiro uso.
+import json
+import os
+
+from archive import archived_count
+from jobs import JobCancelled
+from parse_client import (
+    PARSE_SERVER_URL,
+    count_objects,
+    default_tenant,
+    iter_objects,
+    parse_request,
+)
+from rate_limit import LimiterOverloaded
+from tenants import current_tenant
+
+# Função para extrair questões do PDF do ENADE
+def extract_questions_from_pdf(existing_questions=None):
+    """
+    Extrai questões do PDF, preservando questões existentes.
+    
+    Args:
+        existing_questions (list, optional): Lista de questões existentes
+    
+    Returns:
+        list: Lista atualizada de questões
+    """
+    # Se não houver questões existentes, iniciar com lista vazia
+    questions = existing_questions or []
+    
+    # Verificar se já existem questões com IDs específicos para evitar duplicatas
+    existing_ids = {q.get('id', 0) for q in questions}
+    
+    # Função auxiliar para adicionar questão se ID não existir
+    def add_question_if_not_exists(question):
+        if question['id'] not in existing_ids:
+            questions.append(question)
+            existing_ids.add(question['id'])
+    
+    # Questões de dados pessoais
+    default_personal_questions = []
+    
+    # Adicionar questões padrão se não existirem
+    for q in default_personal_questions:
+        add_question_if_not_exists(q)
+    
+    # Adicionar questões de exemplo para completar o conjunto
+    if len(questions) < 20:
+        for i in range(len(questions) + 1, 21):
+            category = ""
+            question_type = ""
+            
+            if i <= 10:
+                category = "dados-pessoais"
+                question_type = "multiple-choice"
+            elif i <= 19:
+                category = "formacao"
+                question_type = "multiple-choice"
+            else:
+                category = "academico"
+                question_type = "likert"
+            
+            options = []
+            if question_type == "multiple-choice":
+                options = [
+                    {"label": "A", "text": f"Opção A para questão {i}"},
+                    {"label": "B", "text": f"Opção B para questão {i}"},
+                    {"label": "C", "text": f"Opção C para questão {i}"},
+                    {"label": "D", "text": f"Opção D para questão {i}"}
+                ]
+            else:  # likert
+                options = [
+                    {"label": "1", "text": "Discordo totalmente"},
+                    {"label": "2", "text": ""},
+                    {"label": "3", "text": ""},
+                    {"label": "4", "text": ""},
+                    {"label": "5", "text": ""},
+                    {"label": "6", "text": "Concordo totalmente"},
+                    {"label": "N", "text": "Não sei responder"},
+                    {"label": "NA", "text": "Não se aplica"}
+                ]
+            
+            add_question_if_not_exists({
+                "id": i,
+                "number": i,
+                "text": f"Questão exemplo {i}: {['Dados pessoais', 'Formação acadêmica', 'Avaliação'][i % 3]}",
+                "type": question_type,
+                "category": category,
+                "options": options
+            })
+    
+    # Adicionar questões de licenciatura
+    for i in range(50, 55):
+        add_question_if_not_exists({
+            "id": i,
+            "number": i,
+            "text": f"Competência {i-49}: Habilidade para aplicar conhecimentos na prática",
+            "type": "likert",
+            "category": "licenciatura",
+            "options": [
+                {"label": "1", "text": "Discordo totalmente"},
+                {"label": "2", "text": ""},
+                {"label": "3", "text": ""},
+                {"label": "4", "text": ""},
+                {"label": "5", "text": ""},
+                {"label": "6", "text": "Concordo totalmente"},
+                {"label": "N", "text": "Não sei responder"},
+                {"label": "NA", "text": "Não se aplica"}
+            ]
+        })
+    
+    return questions
+
+def parse_status():
+    """
+    Verifica a conexão com o Parse Server e conta os itens de cada coleção
+    """
+    tenant = current_tenant.get(default_tenant)
+    try:
+        # Verificar se as credenciais do Parse Server estão configuradas
+        if not tenant.app_id or not tenant.rest_api_key:
+            return {
+                "status": "warning",
+                "message": "Parse Server credentials not configured",
+                "environment": "back4app"
+            }
+        
+        # Tentar fazer uma requisição simples ao Parse Server (só a contagem, sem objetos)
+        test_url = f"{PARSE_SERVER_URL}/classes/Question"
+        params = {"count": 1, "limit": 0}
+        
+        response = parse_request("GET", test_url, params=params)
+        
+        if response.status_code == 200:
+            def count_or_error(class_name):
+                try:
+                    return count_objects(class_name)
+                except RuntimeError:
+                    return "error"
+            
+            return {
+                "status": "online",
+                "database": "Parse Server",
+                "counts": {
+                    "questions": response.json().get("count", 0),
+                    "questionnaires": count_or_error("Questionnaire"),
+                    "responses": count_or_error("Response"),
+                    "archived_responses": archived_count() if tenant.is_default else 0
+                },
+                "version": "1.0.0",
+                "environment": "back4app",
+                "tenant": tenant.id,
+                "parse_app_id": tenant.app_id[:4] + "..." if tenant.app_id else "not set"
+            }
+        else:
+            return {
+                "status": "error",
+                "message": f"Parse Server connection failed with status {response.status_code}",
+                "error": response.text[:100] + "..." if len(response.text) > 100 else response.text
+            }
+    except LimiterOverloaded:
+        raise
+    except Exception as e:
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
+def migrate_questions(job=None):
+    """
+    Migra para o Parse Server as questões de data/questions.json que ainda não existem lá
+    
+    Args:
+        job (JobContext, optional): Job em execução (progresso e cancelamento)
+    """
+    try:
+        # Definir o caminho do arquivo JSON
+        DATA_DIR = "data"
+        QUESTIONS_FILE = os.path.join(DATA_DIR, "questions.json")
+        
+        # Criar diretório se não existir
+        os.makedirs(DATA_DIR, exist_ok=True)
+        
+        # Verificar quais questões já existem no Parse Server (só o questionId de cada uma)
+        existing_ids = {item.get("questionId") for item in iter_objects("Question", keys=("questionId",))}
+        
+        print(f"Encontradas {len(existing_ids)} questões já existentes no Parse Server")
+        
+        # Carregar todas as questões do arquivo JSON
+        if os.path.exists(QUESTIONS_FILE):
+            with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
+                all_questions = json.load(f)
+            
+            print(f"Carregadas {len(all_questions)} questões do arquivo JSON")
+            
+            # Identificar questões faltantes
+            missing_questions = [q for q in all_questions if q["id"] not in existing_ids]
+            print(f"Identificadas {len(missing_questions)} questões faltantes")
+            
+            # Migrar cada questão faltante
+            migrated_count = 0
+            for position, question in enumerate(missing_questions):
+                if job is not None:
+                    job.progress(position, len(missing_questions), f"{migrated_count} questões migradas")
+                try:
+                    # Preparar dados para o Parse Server
+                    question_data = {
+                        "questionId": question["id"],
+                        "number": question["number"],
+                        "text": question["text"],
+                        "type": question["type"],
+                        "category": question["category"],
+                        "options": question["options"]
+                    }
+                    
+                    # Criar a questão no Parse Server
+                    create_url = f"{PARSE_SERVER_URL}/classes/Question"
+                    create_response = parse_request("POST", create_url, data=json.dumps(question_data))
+                    
+                    if create_response.status_code == 201:
+                        migrated_count += 1
+                    else:
+                        print(f"Erro ao migrar questão {question['id']}: {create_response.status_code} - {create_response.text}")
+                except LimiterOverloaded:
+                    raise
+                except Exception as e:
+                    print(f"Erro ao processar questão {question['id']}: {e}")
+            
+            # Retornar resultados
+            return {
+                "status": "success",
+                "total_in_json": len(all_questions),
+                "existing_in_parse": len(existing_ids),
+                "missing_identified": len(missing_questions),
+                "successfully_migrated": migrated_count,
+                "final_total": len(existing_ids) + migrated_count
+            }
+        else:
+            # Se o arquivo não existir, verificar se o arquivo foi implantado corretamente
+            return {
+                "status": "error",
+                "message": f"Arquivo JSON não encontrado: {QUESTIONS_FILE}",
+                "current_directory": os.getcwd(),
+                "files_in_data_dir": os.listdir(DATA_DIR) if os.path.exists(DATA_DIR) else "data dir not found"
+            }
+    except (LimiterOverloaded, JobCancelled):
+        raise
+    except Exception as e:
+        print(f"Erro na migração: {e}")
+        return {
+            "status": "error",
+            "message": str(e)
+        }
@@ -0,0 +1,192 @@
+import difflib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from parse_client import PARSE_SERVER_URL, batch_path, iter_pages, parse_request, response_from_parse
+from question_search import fold
+
+# Alterar sempre que as regras mudarem, para que o backfill reprocesse as respostas
+PARSER_VERSION = 1
+
+QUESTION_PREFIX = re.compile(r"^\s*(\d+)\.\s*")
+# "A) texto"; em respostas com várias alternativas os rótulos vêm após "," ou ";"
+OPTION_MARKER = re.compile(r"(?:^|[;,]\s*)([A-Z])\)\s*")
+
+# Atualizações por chamada ao endpoint /batch do Parse Server (máximo 50)
+PARSE_BATCH_SIZE = 50
+
+# Similaridade mínima para aceitar um enunciado com redação diferente do catálogo
+DRIFT_CUTOFF = 0.85
+
+
+def normalize(text):
+    return " ".join(fold(text).split())
+
+
+class AnswerParser:
+    """
+    Converte as respostas gravadas como texto ("1. Qual o seu estado civil?",
+    "A) Solteiro(a)") em pares (número da questão no ENADE, rótulo da alternativa).
+
+    Construído a partir de uma versão do catálogo: o enunciado é localizado
+    pelo texto normalizado e, se a redação mudou, pela questão mais parecida.
+    Os resultados por enunciado e por resposta são memorizados.
+    """
+
+    def __init__(self, questions):
+        self.by_text = {normalize(q["text"]): q for q in questions}
+        self._texts = list(self.by_text)
+        self._labels = {q["id"]: {o.get("label") for o in q.get("options") or []} for q in questions}
+        self._labels_by_text = {
+            q["id"]: {normalize(o.get("text")): o.get("label") for o in q.get("options") or [] if o.get("text")}
+            for q in questions
+        }
+        self.find_question = lru_cache(maxsize=4096)(self._find_question)
+        self.parse_answer = lru_cache(maxsize=16384)(self._parse_answer)
+
+    def _find_question(self, question_text):
+        text = normalize(QUESTION_PREFIX.sub("", question_text or "", count=1))
+        question = self.by_text.get(text)
+        if question is None and text:
+            close = difflib.get_close_matches(text, self._texts, n=1, cutoff=DRIFT_CUTOFF)
+            if close:
+                question = self.by_text[close[0]]
+        return question
+
+    def _parse_answer(self, question_id, answer):
+        answer = (answer or "").strip()
+        valid = self._labels.get(question_id, set())
+
+        markers = [m.group(1) for m in OPTION_MARKER.finditer(answer)]
+        if markers and all(label in valid for label in markers):
+            return tuple(markers)
+        if answer in valid:
+            return (answer,)
+        label = self._labels_by_text.get(question_id, {}).get(normalize(answer))
+        return (label,) if label else ()
+
+    def parse(self, responses):
+        """
+        Args:
+            responses (list): Itens {"question": ..., "answer": ...} de uma resposta
+
+        Returns:
+            list: Pares [número, rótulo]; respostas com várias alternativas geram
+                um par por alternativa. Itens não reconhecidos são ignorados.
+        """
+        parsed = []
+        for item in responses:
+            question = self.find_question(item.get("question", ""))
+            if question is None:
+                continue
+            for label in self.parse_answer(question["id"], item.get("answer", "")):
+                parsed.append([question["number"], label])
+        return parsed
+
+
+class ParsedAnswerCache:
+    """
+    Respostas já convertidas, por objectId, e um parser por versão do catálogo.
+    """
+
+    def __init__(self, max_entries=50000, max_parsers=8):
+        self.max_entries = max_entries
+        self.max_parsers = max_parsers
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._parsers = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "stored": 0}
+
+    def parser_for(self, snapshot):
+        with self._lock:
+            parser = self._parsers.get(snapshot.version)
+            if parser is None:
+                parser = self._parsers[snapshot.version] = AnswerParser(snapshot.questions)
+                while len(self._parsers) > self.max_parsers:
+                    self._parsers.popitem(last=False)
+            return parser
+
+    def get(self, record, snapshot):
+        """
+        Pares (número, rótulo) de uma resposta no formato de `response_from_parse`.
+        """
+        # Forma estruturada já gravada (no envio ou pelo backfill)
+        if record.get("parserVersion") == PARSER_VERSION and record.get("parsedAnswers") is not None:
+            self.counters["stored"] += 1
+            return record["parsedAnswers"]
+
+        object_id = record.get("objectId")
+        with self._lock:
+            entry = self._entries.get(object_id) if object_id else None
+            if entry is not None and entry[0] == snapshot.version:
+                self._entries.move_to_end(object_id)
+                self.counters["hits"] += 1
+                return entry[1]
+
+        parsed = self.parser_for(snapshot).parse(record.get("responses", []))
+        with self._lock:
+            self.counters["misses"] += 1
+            if object_id:
+                self._entries[object_id] = (snapshot.version, parsed)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return parsed
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "parsers": len(self._parsers), **self.counters}
+
+
+def backfill_parsed_answers(cache, catalog_for, job=None):
+    """
+    Grava no Parse Server a forma estruturada (`parsedAnswers`) das respostas
+    que ainda não a têm ou que foram convertidas por uma versão anterior do parser.
+
+    Args:
+        cache (ParsedAnswerCache): Cache usado para converter as respostas
+        catalog_for (callable): Versão do catálogo -> CatalogSnapshot
+        job (JobContext, optional): Job em execução (progresso e cancelamento)
+
+    Returns:
+        dict: Resumo da execução
+    """
+    start = time.monotonic()
+    scanned = updated = 0
+
+    # Só o necessário para converter: o texto das respostas e a versão do catálogo
+    where = {"parserVersion": {"$ne": PARSER_VERSION}}
+    for results in iter_pages("Response", where, keys=("responses", "catalogVersion"), page_size=500):
+        scanned += len(results)
+
+        requests_batch = []
+        for item in results:
+            record = response_from_parse(item)
+            parsed = cache.get(record, catalog_for(record.get("catalogVersion")))
+            requests_batch.append({
+                "method": "PUT",
+                "path": batch_path(f"/classes/Response/{item['objectId']}"),
+                "body": {"parsedAnswers": parsed, "parserVersion": PARSER_VERSION},
+            })
+
+        for i in range(0, len(requests_batch), PARSE_BATCH_SIZE):
+            body = {"requests": requests_batch[i:i + PARSE_BATCH_SIZE]}
+            batch = parse_request("POST", f"{PARSE_SERVER_URL}/batch", data=json.dumps(body))
+            if batch.status_code != 200:
+                print(f"Erro ao gravar respostas convertidas: {batch.status_code} - {batch.text}")
+                continue
+            updated += sum(1 for result in batch.json() if "success" in result)
+
+        if job is not None:
+            job.progress(scanned, None, f"{updated} respostas atualizadas")
+
+    return {
+        "status": "success",
+        "parser_version": PARSER_VERSION,
+        "scanned": scanned,
+        "updated": updated,
+        "elapsed_seconds": round(time.monotonic() - start, 2)
+    }
@@ -0,0 +1,286 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from parse_client import (
+    PARSE_SERVER_URL,
+    RESPONSE_KEYS,
+    batch_path,
+    iter_objects,
+    parse_request,
+    response_from_parse,
+)
+from rate_limit import env_int
+
+# Armazenamento em camadas das respostas:
+# - camada quente: classe Response no Parse Server (ciclo de prova atual)
+# - camada fria: segmentos .jsonl.gz imutáveis, particionados por data, com um índice
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join("data", "archive", "responses"))
+INDEX_FILE = os.path.join(ARCHIVE_DIR, "index.json")
+
+# Respostas mais antigas que este número de dias pertencem a ciclos anteriores
+ARCHIVE_CYCLE_DAYS = env_int("ARCHIVE_CYCLE_DAYS", 365)
+
+# Quantidade de exclusões por chamada ao endpoint /batch do Parse Server (máximo 50)
+PARSE_BATCH_SIZE = 50
+
+_index_lock = threading.Lock()
+_index_cache = {"mtime": None, "segments": []}
+
+
+def load_index():
+    """
+    Carrega o índice de segmentos arquivados (relido apenas se o arquivo mudar).
+
+    Returns:
+        list: Metadados dos segmentos, do mais recente para o mais antigo
+    """
+    with _index_lock:
+        try:
+            mtime = os.path.getmtime(INDEX_FILE)
+        except OSError:
+            return []
+
+        if _index_cache["mtime"] != mtime:
+            with open(INDEX_FILE, "r", encoding="utf-8") as f:
+                segments = json.load(f).get("segments", [])
+            segments.sort(key=lambda s: s["max_created"], reverse=True)
+            _index_cache["mtime"] = mtime
+            _index_cache["segments"] = segments
+        return list(_index_cache["segments"])
+
+
+def _write_index(segments):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = f"{INDEX_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"segments": segments}, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, INDEX_FILE)
+
+
+def _write_segment(day, records):
+    """
+    Grava um segmento imutável para um dia e devolve seus metadados.
+    """
+    year, month, _ = day.split("-")
+    directory = os.path.join(ARCHIVE_DIR, year, month)
+    os.makedirs(directory, exist_ok=True)
+
+    payload = "\n".join(json.dumps(r, ensure_ascii=False) for r in records).encode("utf-8")
+    digest = hashlib.sha256(payload).hexdigest()
+    relative_path = os.path.join(year, month, f"{day}-{digest[:12]}.jsonl.gz")
+    path = os.path.join(ARCHIVE_DIR, relative_path)
+
+    # Segmentos nunca são sobrescritos: o nome inclui o hash do conteúdo
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=9) as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    return {
+        "path": relative_path,
+        "day": day,
+        "count": len(records),
+        "min_created": min(r["submissionDate"] for r in records),
+        "max_created": max(r["submissionDate"] for r in records),
+        "questionnaires": sorted({r.get("questionnaire", "") for r in records}),
+        "sha256": digest,
+    }
+
+
+def read_segment(segment):
+    """
+    Lê os registros de um segmento, do mais recente para o mais antigo.
+    """
+    with gzip.open(os.path.join(ARCHIVE_DIR, segment["path"]), "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r["submissionDate"], reverse=True)
+    return records
+
+
+def iter_archived(since=None, until=None, questionnaire=None):
+    """
+    Percorre as respostas arquivadas, usando o índice para pular segmentos.
+
+    Args:
+        since (str, optional): Data ISO mínima de envio (inclusive)
+        until (str, optional): Data ISO máxima de envio (exclusive)
+        questionnaire (str, optional): Título do questionário
+
+    Yields:
+        dict: Resposta no mesmo formato de `load_responses()`
+    """
+    for segment in load_index():
+        if since and segment["max_created"] < since:
+            continue
+        if until and segment["min_created"] >= until:
+            continue
+        if questionnaire and questionnaire not in segment["questionnaires"]:
+            continue
+
+        for record in read_segment(segment):
+            created = record["submissionDate"]
+            if since and created < since:
+                continue
+            if until and created >= until:
+                continue
+            if questionnaire and record.get("questionnaire") != questionnaire:
+                continue
+            yield record
+
+
+def archived_count():
+    return sum(segment["count"] for segment in load_index())
+
+
+def _archived_ids(since, until):
+    """
+    objectIds já arquivados em segmentos que cobrem o intervalo [since, until].
+    """
+    ids = set()
+    for segment in load_index():
+        if segment["max_created"] < since or segment["min_created"] > until:
+            continue
+        ids.update(record.get("objectId") for record in read_segment(segment))
+    return ids
+
+
+def _fetch_older_than(cutoff_iso):
+    """
+    Busca no Parse Server as respostas anteriores ao corte (só os campos guardados no arquivo).
+    """
+    where = {"createdAt": {"$lt": {"__type": "Date", "iso": cutoff_iso}}}
+    return iter_objects("Response", where, keys=RESPONSE_KEYS)
+
+
+def _delete_from_parse(object_ids):
+    """
+    Remove do Parse Server as respostas já arquivadas, em lotes.
+
+    Returns:
+        int: Quantidade de exclusões confirmadas
+    """
+    deleted = 0
+    for i in range(0, len(object_ids), PARSE_BATCH_SIZE):
+        chunk = object_ids[i:i + PARSE_BATCH_SIZE]
+        body = {
+            "requests": [
+                {"method": "DELETE", "path": batch_path(f"/classes/Response/{object_id}")}
+                for object_id in chunk
+            ]
+        }
+        response = parse_request("POST", f"{PARSE_SERVER_URL}/batch", data=json.dumps(body))
+        if response.status_code != 200:
+            print(f"Erro ao excluir respostas arquivadas: {response.status_code} - {response.text}")
+            continue
+        deleted += sum(1 for result in response.json() if "success" in result)
+    return deleted
+
+
+def default_cutoff():
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_CYCLE_DAYS)
+    return cutoff.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_cutoff(before):
+    """
+    Valida a data de corte informada e a normaliza para o formato do Parse Server.
+
+    Args:
+        before (str, optional): Data ou data/hora ISO; vazio usa default_cutoff()
+
+    Returns:
+        str: Corte em UTC no formato "%Y-%m-%dT%H:%M:%S.000Z"
+
+    Raises:
+        ValueError: Se `before` não for uma data ISO válida
+    """
+    if before is None or before == "":
+        return default_cutoff()
+    if not isinstance(before, str):
+        raise ValueError("Data de corte deve ser uma string ISO")
+    try:
+        cutoff = datetime.fromisoformat(before.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Data de corte inválida: {before}")
+    if cutoff.tzinfo is None:
+        cutoff = cutoff.replace(tzinfo=timezone.utc)
+    return cutoff.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def archive_responses(before=None, job=None):
+    """
+    Move para a camada fria as respostas enviadas antes de `before`.
+
+    Os segmentos e o índice são gravados (e sincronizados em disco) antes de
+    qualquer exclusão no Parse Server, então uma falha no meio do processo
+    nunca perde respostas; no pior caso elas ficam nas duas camadas e são
+    deduplicadas na leitura pelo objectId. Ao repetir o arquivamento, as
+    respostas que já estão em algum segmento apenas são excluídas do Parse
+    Server, sem entrar de novo na camada fria.
+
+    Args:
+        before (str, optional): Data ISO de corte; padrão: ARCHIVE_CYCLE_DAYS atrás
+        job (JobContext, optional): Job em execução (progresso e cancelamento)
+
+    Returns:
+        dict: Resumo da execução
+
+    Raises:
+        ValueError: Se `before` não for uma data ISO válida
+    """
+    cutoff = parse_cutoff(before)
+    start = time.monotonic()
+
+    if job is not None:
+        job.progress(0, message="Lendo respostas anteriores ao corte")
+    records = [response_from_parse(item) for item in _fetch_older_than(cutoff)]
+    if not records:
+        return {"status": "success", "cutoff": cutoff, "archived": 0, "segments": 0, "deleted_from_parse": 0}
+
+    # Exclusão interrompida em uma execução anterior: não arquivar de novo
+    already = _archived_ids(min(r["submissionDate"] for r in records), max(r["submissionDate"] for r in records))
+    by_day = {}
+    for record in records:
+        if record["objectId"] not in already:
+            by_day.setdefault(record["submissionDate"][:10], []).append(record)
+
+    if job is not None:
+        job.progress(0, len(records), message="Gravando segmentos")
+    new_segments = [_write_segment(day, day_records) for day, day_records in sorted(by_day.items())]
+
+    known = {segment["path"] for segment in load_index()}
+    segments = load_index() + [s for s in new_segments if s["path"] not in known]
+    _write_index(segments)
+
+    # A partir daqui as respostas estão seguras na camada fria: a exclusão não é cancelada
+    object_ids = [r["objectId"] for r in records]
+    deleted = _delete_from_parse(object_ids)
+
+    return {
+        "status": "success",
+        "cutoff": cutoff,
+        "archived": len(object_ids) - len(already.intersection(object_ids)),
+        "already_archived": len(already.intersection(object_ids)),
+        "segments": len(new_segments),
+        "deleted_from_parse": deleted,
+        "elapsed_seconds": round(time.monotonic() - start, 2)
+    }
+
+
+def archive_summary():
+    segments = load_index()
+    return {
+        "cycle_days": ARCHIVE_CYCLE_DAYS,
+        "segments": len(segments),
+        "responses": sum(s["count"] for s in segments),
+        "oldest": min((s["min_created"] for s in segments), default=None),
+        "newest": max((s["max_created"] for s in segments), default=None),
+    }
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Mede o cold start do servidor: tempo até a primeira resposta e memória residente.
+# Uso: python bench_startup.py [--runs 5] [--path /api/questions]
+
+IMPORT_SNIPPET = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss_kb //= 1024
+print(json.dumps({"import_seconds": elapsed, "max_rss_kb": rss_kb, "requests_loaded": "requests" in sys.modules}))
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def read_rss_kb(pid):
+    """
+    Lê a memória residente de um processo (Linux: /proc; outros: psutil, se instalado).
+    """
+    status_path = f"/proc/{pid}/status"
+    if os.path.exists(status_path):
+        with open(status_path, "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss // 1024
+    except ImportError:
+        return None
+
+def measure_import():
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def measure_server(path, timeout):
+    """
+    Sobe o uvicorn e mede o tempo até a primeira resposta de `path`.
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    response.read()
+                    first_response = time.perf_counter() - start
+                    return {"first_response_seconds": first_response, "rss_kb": read_rss_kb(process.pid)}
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"Servidor não respondeu em {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cold start do servidor ENADE")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/api/test", help="Rota usada como primeira requisição")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    servers = [measure_server(args.path, args.timeout) for _ in range(args.runs)]
+
+    report = {
+        "runs": args.runs,
+        "path": args.path,
+        "import_seconds": summarize([r["import_seconds"] for r in imports]),
+        "import_max_rss_kb": summarize([r["max_rss_kb"] for r in imports]),
+        "requests_loaded_on_import": any(r["requests_loaded"] for r in imports),
+        "first_response_seconds": summarize([r["first_response_seconds"] for r in servers]),
+        "server_rss_kb": summarize([r["rss_kb"] for r in servers]),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
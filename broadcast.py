@@ -0,0 +1,182 @@
+import asyncio
+import json
+import threading
+import time
+
+
+class Subscription:
+    """
+    Conexão de um painel: fila própria e limitada de eventos pendentes.
+    """
+
+    def __init__(self, buffer_size, topic=None):
+        self.topic = topic
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+        self.connected_at = time.time()
+
+
+class BroadcastHub:
+    """
+    Distribui eventos para todos os painéis conectados.
+
+    Cada painel tem uma fila limitada. Se um painel não consome rápido o
+    suficiente e sua fila enche, ele é desconectado (o navegador reconecta e
+    recarrega a lista) em vez de atrasar ou acumular memória para os demais.
+    A publicação pode ser feita de qualquer thread com `publish_threadsafe`.
+    """
+
+    def __init__(self, buffer_size=100, max_clients=200):
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self._clients = set()
+        self._loop = None
+        self.sequence = 0
+        self.counters = {"published": 0, "delivered": 0, "dropped_clients": 0}
+
+    def bind(self, loop):
+        """Associa o hub ao event loop do servidor (chamado no startup)."""
+        self._loop = loop
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    def subscribe(self, topic=None):
+        """
+        Registra um novo painel.
+
+        Args:
+            topic (str, optional): Só recebe eventos publicados com este tópico
+
+        Returns:
+            Subscription | None: None se o limite de conexões foi atingido
+        """
+        if len(self._clients) >= self.max_clients:
+            return None
+        subscription = Subscription(self.buffer_size, topic)
+        self._clients.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._clients.discard(subscription)
+
+    def publish(self, event_type, data, topic=None):
+        """
+        Enfileira um evento para os painéis do tópico (deve rodar no event loop).
+        """
+        self.sequence += 1
+        self.counters["published"] += 1
+        message = (self.sequence, event_type, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+        for subscription in list(self._clients):
+            if subscription.topic != topic:
+                continue
+            try:
+                subscription.queue.put_nowait(message)
+                self.counters["delivered"] += 1
+            except asyncio.QueueFull:
+                # Consumidor lento: descartar a conexão em vez de bloquear o hub
+                subscription.dropped = True
+                self._clients.discard(subscription)
+                self.counters["dropped_clients"] += 1
+
+    def publish_threadsafe(self, event_type, data, topic=None):
+        """
+        Publica um evento a partir de uma thread do threadpool.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.publish(event_type, data, topic)
+        else:
+            loop.call_soon_threadsafe(self.publish, event_type, data, topic)
+
+    async def stream(self, subscription, is_disconnected, initial=None, heartbeat=15.0):
+        """
+        Gera as mensagens Server-Sent Events de uma conexão.
+
+        Args:
+            subscription (Subscription): Conexão registrada com `subscribe`
+            is_disconnected (callable): Corrotina que indica se o cliente saiu
+            initial (tuple, optional): (tipo, dados) enviado logo na conexão
+            heartbeat (float): Intervalo dos comentários de keep-alive
+        """
+        try:
+            if initial:
+                event_type, data = initial
+                yield f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+            while not subscription.dropped:
+                try:
+                    sequence, event_type, payload = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield f"id: {sequence}\nevent: {event_type}\ndata: {payload}\n\n"
+
+            if subscription.dropped:
+                yield "event: dropped\ndata: {}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        return {
+            "clients": len(self._clients),
+            "buffer_size": self.buffer_size,
+            "max_clients": self.max_clients,
+            "sequence": self.sequence,
+            **self.counters,
+        }
+
+
+class ResponseCounters:
+    """
+    Contagem de respostas por questionário, número da questão e rótulo da
+    alternativa, desde que o processo iniciou (`since`).
+
+    As chaves vêm das respostas já convertidas pelo AnswerParser, limitadas
+    pelo catálogo; questionários além de `max_questionnaires` contam só no total geral.
+    """
+
+    def __init__(self, max_questionnaires=1000):
+        self.max_questionnaires = max_questionnaires
+        self._lock = threading.Lock()
+        self.since = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.total = 0
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, response_data, answers):
+        """
+        Contabiliza uma resposta e devolve os contadores das questões que ela tocou.
+
+        Args:
+            response_data (dict): Resposta gravada
+            answers (list): Pares [número, rótulo] da resposta
+        """
+        questionnaire = response_data.get("questionnaire", "")
+        touched = {}
+        with self._lock:
+            self.total += 1
+            if questionnaire not in self.totals and len(self.totals) >= self.max_questionnaires:
+                return {"questionnaire": questionnaire, "total": None, "questions": {}, "since": self.since}
+            self.totals[questionnaire] = self.totals.get(questionnaire, 0) + 1
+            per_question = self.counts.setdefault(questionnaire, {})
+            for number, label in answers:
+                labels = per_question.setdefault(number, {})
+                labels[label] = labels.get(label, 0) + 1
+                touched[number] = dict(labels)
+        return {"questionnaire": questionnaire, "total": self.totals[questionnaire], "questions": touched,
+                "since": self.since}
+
+    def snapshot(self):
+        with self._lock:
+            return {"since": self.since, "total": self.total, "totals": dict(self.totals)}
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+# Versões do catálogo de questões, persistidas de forma endereçada por conteúdo:
+# - objects/<hash>.json: uma questão (compartilhada entre todas as versões que a contêm)
+# - versions/<id>.json: manifesto da versão (lista de hashes)
+# - HEAD: id da versão atual
+# O id da versão é o hash do manifesto: o mesmo conteúdo tem o mesmo id em qualquer
+# instância e após um redeploy, e um id fixado no Parse Server nunca aponta para outro texto.
+CATALOG_DIR = os.environ.get("CATALOG_DIR", os.path.join("data", "catalog"))
+# Catálogos das demais instituições: <TENANT_CATALOG_DIR>/<instituição>/catalog
+TENANT_CATALOG_DIR = os.environ.get("TENANT_CATALOG_DIR", os.path.join("data", "tenants"))
+
+# Quantidade de versões antigas mantidas em memória
+CATALOG_VERSIONS_IN_MEMORY = 8
+
+
+def fingerprint(question):
+    """
+    Hash do conteúdo de uma questão: identifica a questão nos manifestos e
+    permite detectar exatamente quais questões mudaram entre versões.
+    """
+    content = json.dumps(
+        [question.get("id"), question.get("number"), question.get("text"), question.get("category"),
+         question.get("type"), question.get("options")],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def version_id(hashes):
+    """
+    Id de uma versão do catálogo: hash do conjunto de questões (seus fingerprints).
+    """
+    content = "\n".join(sorted(hashes.values()))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+
+class CatalogSnapshot:
+    """
+    Versão imutável do catálogo.
+
+    As questões (dicionários) são compartilhadas entre versões sempre que não
+    mudaram, e não devem ser alteradas por quem as lê. Representações derivadas
+    (JSON serializado, ETag) são calculadas uma única vez por versão.
+    """
+
+    __slots__ = ("version", "created_at", "parent", "by_id", "hashes", "questions", "_json")
+
+    def __init__(self, version, questions, hashes, created_at=None, parent=None):
+        self.version = version
+        self.created_at = created_at or time.time()
+        self.parent = parent
+        self.questions = tuple(sorted(questions, key=lambda q: (q.get("number") or 0, q.get("id") or 0)))
+        self.by_id = MappingProxyType({q["id"]: q for q in self.questions})
+        self.hashes = MappingProxyType(hashes)
+        self._json = None
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    @property
+    def etag(self):
+        return f'"catalog-{self.version}"'
+
+    def json_bytes(self):
+        """Catálogo serializado, calculado uma vez por versão."""
+        if self._json is None:
+            self._json = json.dumps(list(self.questions), ensure_ascii=False).encode("utf-8")
+        return self._json
+
+    def summary(self):
+        return {
+            "version": self.version,
+            "parent": self.parent,
+            "created_at": self.created_at,
+            "questions": len(self.questions),
+        }
+
+
+class CatalogStore:
+    """
+    Mantém o ponteiro para a versão atual do catálogo e o histórico de versões.
+
+    Leitores apenas leem `current` (a troca do ponteiro é atômica), então nunca
+    esperam por escritas. Escritores são serializados por um lock, montam a nova
+    versão reaproveitando as questões inalteradas e só então trocam o ponteiro.
+    """
+
+    def __init__(self, directory=CATALOG_DIR, bundled_path=None):
+        self.directory = directory
+        self.bundled_path = bundled_path
+        self.current = None
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._versions = OrderedDict()
+
+    # --- Interface de snapshot usada por StaleWhileRevalidateCache ---
+
+    def save(self, questions):
+        """Registra o catálogo recebido do Parse Server e devolve a versão atual."""
+        return self.commit(questions)
+
+    def load(self, include_bundled=True):
+        """
+        Recupera a última versão persistida (ou o catálogo empacotado com a aplicação).
+        """
+        if self.current is not None:
+            return self.current
+
+        head = self._read_head()
+        if head is not None:
+            snapshot = self.get(head)
+            if snapshot is not None:
+                self.current = snapshot
+                return snapshot
+
+        if include_bundled and self.bundled_path and os.path.exists(self.bundled_path):
+            with open(self.bundled_path, "r", encoding="utf-8") as f:
+                return self.commit(json.load(f))
+        return None
+
+    # --- Escrita ---
+
+    def commit(self, questions):
+        """
+        Cria uma nova versão com exatamente estas questões.
+
+        Se o conteúdo for idêntico ao da versão atual nenhuma versão é criada.
+        """
+        with self._write_lock:
+            hashes = {q["id"]: fingerprint(q) for q in questions}
+            base = self._base()
+            if base is not None and dict(base.hashes) == hashes:
+                return base
+
+            # Compartilhamento estrutural: reaproveitar as questões que não mudaram
+            shared = []
+            for question in questions:
+                if base is not None and base.hashes.get(question["id"]) == hashes[question["id"]]:
+                    shared.append(base.by_id[question["id"]])
+                else:
+                    shared.append(question)
+            return self._publish(shared, hashes, base)
+
+    def apply(self, changed_questions):
+        """
+        Cria uma nova versão alterando/incluindo apenas as questões informadas.
+        """
+        with self._write_lock:
+            base = self._base()
+            by_id = dict(base.by_id) if base is not None else {}
+            hashes = dict(base.hashes) if base is not None else {}
+            modified = False
+            for question in changed_questions:
+                digest = fingerprint(question)
+                if hashes.get(question["id"]) != digest:
+                    by_id[question["id"]] = dict(question)
+                    hashes[question["id"]] = digest
+                    modified = True
+            if not modified:
+                return base
+            return self._publish(list(by_id.values()), hashes, base)
+
+    def _base(self):
+        # Versão sobre a qual a próxima será construída (a gravada em disco, após um restart)
+        if self.current is None:
+            head = self._read_head()
+            if head is not None:
+                self.current = self.get(head)
+        return self.current
+
+    def _publish(self, questions, hashes, base):
+        # Chamado com o lock de escrita adquirido
+        version = version_id(hashes)
+        # Conteúdo igual ao de uma versão anterior: reaproveitar a versão (e o id)
+        snapshot = self.get(version)
+        if snapshot is None:
+            snapshot = CatalogSnapshot(version, questions, hashes, parent=base.version if base else None)
+        self._persist(snapshot)
+        self._remember(snapshot)
+        self.current = snapshot
+        return snapshot
+
+    def _persist(self, snapshot):
+        objects_dir = os.path.join(self.directory, "objects")
+        versions_dir = os.path.join(self.directory, "versions")
+        os.makedirs(objects_dir, exist_ok=True)
+        os.makedirs(versions_dir, exist_ok=True)
+
+        for question in snapshot.questions:
+            path = os.path.join(objects_dir, f"{snapshot.hashes[question['id']]}.json")
+            if not os.path.exists(path):
+                self._write_json(path, question)
+
+        manifest = dict(snapshot.summary(), hashes=[snapshot.hashes[q["id"]] for q in snapshot.questions])
+        self._write_json(os.path.join(versions_dir, f"{snapshot.version}.json"), manifest)
+        self._write_text(os.path.join(self.directory, "HEAD"), str(snapshot.version))
+
+    # --- Leitura ---
+
+    def get(self, version):
+        """
+        Retorna uma versão específica do catálogo (None se não existir).
+        """
+        if version is None:
+            return self.current
+        # Ids antigos (sequenciais) eram inteiros
+        version = str(version)
+        current = self.current
+        if current is not None and current.version == version:
+            return current
+
+        with self._lock:
+            snapshot = self._versions.get(version)
+        if snapshot is not None:
+            return snapshot
+
+        if os.sep in version or version.startswith("."):
+            return None
+        manifest_path = os.path.join(self.directory, "versions", f"{version}.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        questions = []
+        hashes = {}
+        for digest in manifest["hashes"]:
+            with open(os.path.join(self.directory, "objects", f"{digest}.json"), "r", encoding="utf-8") as f:
+                question = json.load(f)
+            questions.append(question)
+            hashes[question["id"]] = digest
+
+        snapshot = CatalogSnapshot(str(manifest["version"]), questions, hashes,
+                                   created_at=manifest.get("created_at"), parent=manifest.get("parent"))
+        self._remember(snapshot)
+        return snapshot
+
+    def versions(self):
+        versions_dir = os.path.join(self.directory, "versions")
+        if not os.path.isdir(versions_dir):
+            return []
+        summaries = []
+        for name in os.listdir(versions_dir):
+            if name.endswith(".json"):
+                with open(os.path.join(versions_dir, name), "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                manifest.pop("hashes", None)
+                summaries.append(manifest)
+        return sorted(summaries, key=lambda m: m.get("created_at") or 0, reverse=True)
+
+    def _remember(self, snapshot):
+        with self._lock:
+            self._versions[snapshot.version] = snapshot
+            self._versions.move_to_end(snapshot.version)
+            while len(self._versions) > CATALOG_VERSIONS_IN_MEMORY:
+                self._versions.popitem(last=False)
+
+    def _read_head(self):
+        try:
+            with open(os.path.join(self.directory, "HEAD"), "r") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def _tmp_path(path):
+        # Único por thread: duas instâncias (ex.: a mesma instituição carregada em
+        # paralelo) podem gravar o mesmo objeto ao mesmo tempo
+        return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+    @classmethod
+    def _write_json(cls, path, data):
+        tmp_path = cls._tmp_path(path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _write_text(cls, path, text):
+        tmp_path = cls._tmp_path(path)
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
@@ -0,0 +1,187 @@
+import contextvars
+import json
+import os
+import threading
+import time
+
+# Diretório dos snapshots locais do último catálogo válido recebido do Parse Server
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join("data", "snapshots"))
+
+
+def write_snapshot(name, data):
+    """
+    Persiste um snapshot em disco de forma atômica (arquivo temporário + rename).
+
+    Args:
+        name (str): Nome do snapshot (ex.: "questions")
+        data: Conteúdo serializável em JSON
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = os.path.join(SNAPSHOT_DIR, f"{name}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(name, fallback_path=None):
+    """
+    Lê o snapshot persistido, ou o arquivo de dados empacotado com a aplicação.
+
+    Args:
+        name (str): Nome do snapshot
+        fallback_path (str, optional): Arquivo usado se ainda não houver snapshot
+
+    Returns:
+        list | None: Conteúdo do snapshot ou None se não houver nenhum
+    """
+    for path in (os.path.join(SNAPSHOT_DIR, f"{name}.json"), fallback_path):
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Erro ao ler snapshot {path}: {e}")
+    return None
+
+
+class FileSnapshot:
+    """
+    Persistência padrão do cache: um arquivo JSON por snapshot.
+    """
+
+    def __init__(self, name, fallback_path=None):
+        self.name = name
+        self.fallback_path = fallback_path
+
+    def save(self, value):
+        write_snapshot(self.name, value)
+        return value
+
+    def load(self, include_bundled=True):
+        return read_snapshot(self.name, self.fallback_path if include_bundled else None)
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache de um único valor com revalidação em segundo plano.
+
+    - Dentro do TTL o valor em memória é servido diretamente.
+    - Após o TTL o valor antigo continua sendo servido e uma única thread
+      busca a versão nova.
+    - Se não houver valor em memória e a busca falhar, usa o snapshot em disco.
+    Cada busca bem-sucedida atualiza o snapshot.
+
+    `snapshot` define como o valor é persistido e recuperado (`save`/`load`);
+    por padrão é um arquivo JSON em data/snapshots/.
+    """
+
+    def __init__(self, name, loader, ttl, fallback_path=None, snapshot=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.snapshot = snapshot or FileSnapshot(name, fallback_path)
+        self.value = None
+        self.loaded_at = 0.0
+        self.from_snapshot = False
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        """
+        Retorna o valor atual, buscando ou revalidando conforme necessário.
+
+        Raises:
+            Exception: A falha original da busca, se não houver nenhum dado local
+        """
+        value = self.value
+        if value is None:
+            return self._load_blocking()
+
+        if time.monotonic() - self.loaded_at > self.ttl:
+            self._refresh_in_background()
+        return value
+
+    def warm(self):
+        """
+        Pré-carrega o cache na inicialização.
+
+        Se houver snapshot local ele é servido imediatamente e a versão do
+        Parse Server é buscada em segundo plano, sem atrasar o cold start.
+        """
+        if self.value is not None:
+            return
+        snapshot = self.snapshot.load(include_bundled=False)
+        if snapshot is None:
+            try:
+                self._load_blocking()
+            except Exception as e:
+                print(f"Erro ao pré-carregar {self.name}: {e}")
+            return
+        with self._lock:
+            if self.value is None:
+                self.value = snapshot
+                self.loaded_at = 0.0
+                self.from_snapshot = True
+        self._refresh_in_background()
+
+    def set(self, value):
+        """Substitui o valor em memória (ex.: logo após uma escrita bem-sucedida)."""
+        self.value = value
+        self.loaded_at = time.monotonic()
+        self.from_snapshot = False
+
+    def invalidate(self):
+        """Descarta o valor em memória: a próxima leitura busca dados novos."""
+        self.value = None
+        self.loaded_at = 0.0
+
+    def _fetch(self):
+        value = self.snapshot.save(self.loader())
+        self.value = value
+        self.loaded_at = time.monotonic()
+        self.from_snapshot = False
+        return value
+
+    def _load_blocking(self):
+        with self._lock:
+            if self.value is not None:
+                return self.value
+            try:
+                return self._fetch()
+            except Exception as e:
+                snapshot = self.snapshot.load()
+                if snapshot is None:
+                    raise
+                print(f"Usando snapshot local de {self.name}: {e}")
+                self.value = snapshot
+                # Tentar de novo na próxima leitura, em segundo plano
+                self.loaded_at = 0.0
+                self.from_snapshot = True
+                return snapshot
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        # A revalidação roda no mesmo contexto (ex.: instituição) de quem a disparou
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._refresh,), name=f"{self.name}-refresh", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self._fetch()
+        except Exception as e:
+            print(f"Erro ao revalidar {self.name}, mantendo dados anteriores: {e}")
+            self.loaded_at = time.monotonic()
+        finally:
+            self._refreshing = False
+
+    def stats(self):
+        return {
+            "loaded": self.value is not None,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+            "from_snapshot": self.from_snapshot,
+            "items": len(self.value) if self.value is not None else 0,
+        }
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import deque
+
+from rate_limit import LimiterOverloaded
+
+
+class CircuitOpenError(LimiterOverloaded):
+    """Chamada rejeitada imediatamente porque o circuito está aberto."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para um serviço externo.
+
+    Observa as chamadas dos últimos `window` segundos e abre o circuito quando a
+    taxa de falhas (erros ou chamadas mais lentas que `slow_call_threshold`)
+    atinge `failure_threshold`. Com o circuito aberto as chamadas falham na hora
+    e uma thread em segundo plano executa `probe` a cada `probe_interval`
+    segundos até o serviço responder, quando o circuito volta a fechar.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, name, probe, failure_threshold=0.5, min_calls=5, window=30.0,
+                 slow_call_threshold=5.0, probe_interval=10.0):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call_threshold = slow_call_threshold
+        self.probe_interval = probe_interval
+
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self._prober = None
+        self.counters = {"success": 0, "failure": 0, "slow": 0, "rejected": 0, "trips": 0}
+
+    def check(self):
+        """
+        Falha imediatamente se o circuito estiver aberto.
+
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto
+        """
+        if self.state == self.OPEN:
+            with self._lock:
+                self.counters["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} indisponível (circuito aberto)", self.probe_interval)
+
+    def call(self, func, is_failure=None):
+        """
+        Executa `func` protegida pelo circuito.
+
+        Args:
+            func (callable): Função sem argumentos que realiza a chamada externa
+            is_failure (callable, optional): Classifica um resultado como falha
+
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto
+        """
+        self.check()
+
+        start = time.monotonic()
+        try:
+            result = func()
+        except Exception:
+            self._record(False, time.monotonic() - start)
+            raise
+
+        failed = bool(is_failure and is_failure(result))
+        self._record(not failed, time.monotonic() - start)
+        return result
+
+    def _record(self, ok, elapsed):
+        slow = elapsed > self.slow_call_threshold
+        now = time.monotonic()
+
+        with self._lock:
+            if slow:
+                self.counters["slow"] += 1
+            self.counters["success" if ok else "failure"] += 1
+
+            self._calls.append((now, ok and not slow))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+
+            if self.state == self.OPEN or len(self._calls) < self.min_calls:
+                return
+
+            failures = sum(1 for _, good in self._calls if not good)
+            if failures / len(self._calls) >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self):
+        # Chamado com o lock adquirido
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        self.counters["trips"] += 1
+        self._calls.clear()
+        print(f"AVISO: circuito de {self.name} aberto; servindo dados locais até a recuperação")
+
+        if self._prober is None or not self._prober.is_alive():
+            self._prober = threading.Thread(target=self._probe_loop, name=f"{self.name}-probe", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                healthy = self.probe()
+            except Exception:
+                healthy = False
+
+            if healthy:
+                with self._lock:
+                    self.state = self.CLOSED
+                    self.opened_at = None
+                print(f"Circuito de {self.name} fechado: serviço recuperado")
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "opened_at": self.opened_at,
+                "window_calls": len(self._calls),
+                **self.counters,
+            }
@@ -0,0 +1,529 @@
+import hashlib
+import json
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from rate_limit import env_int
+from tenants import DEFAULT_TENANT
+
+# Coortes de alunos definidas por condições sobre as respostas (ex.: "questão 2 ≠ A"),
+# guardadas como conjuntos de linhas (bitmaps) para cruzamentos em milissegundos
+COHORT_CACHE_SIZE = env_int("COHORT_CACHE_SIZE", 256)
+
+# Blocos com até ARRAY_MAX linhas ficam como lista ordenada; acima disso, como bitmap
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+ARRAY_MAX = 4096
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8
+
+OPERATORS = ("eq", "ne", "in", "not_in", "answered", "unanswered")
+
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count
+else:  # Python < 3.10
+    def _popcount(bits):
+        return bin(bits).count("1")
+
+
+def _to_bits(values):
+    buffer = bytearray(CHUNK_BYTES)
+    for value in values:
+        buffer[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _to_array(bits):
+    values = array("H")
+    for index, byte in enumerate(bits.to_bytes(CHUNK_BYTES, "little")):
+        if byte:
+            base = index << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    values.append(base + bit)
+    return values
+
+
+def _compact(chunk):
+    """Escolhe a representação menor para o bloco (None se vazio)."""
+    if isinstance(chunk, int):
+        if not chunk:
+            return None
+        return _to_array(chunk) if _popcount(chunk) <= ARRAY_MAX else chunk
+    if not chunk:
+        return None
+    return _to_bits(chunk) if len(chunk) > ARRAY_MAX else chunk
+
+
+def _chunk_len(chunk):
+    return _popcount(chunk) if isinstance(chunk, int) else len(chunk)
+
+
+def _chunk_and(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return a & b
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return array("H", (value for value in a if b >> value & 1))
+    return array("H", sorted(set(a).intersection(b)))
+
+
+def _chunk_or(a, b):
+    if isinstance(a, int) or isinstance(b, int) or len(a) + len(b) > ARRAY_MAX:
+        return (a if isinstance(a, int) else _to_bits(a)) | (b if isinstance(b, int) else _to_bits(b))
+    return array("H", sorted(set(a).union(b)))
+
+
+def _chunk_andnot(a, b):
+    if isinstance(a, int):
+        return a & ~(b if isinstance(b, int) else _to_bits(b))
+    if isinstance(b, int):
+        return array("H", (value for value in a if not b >> value & 1))
+    return array("H", sorted(set(a).difference(b)))
+
+
+class Bitmap:
+    """
+    Conjunto comprimido de números de linha, no estilo Roaring.
+
+    As linhas são divididas em blocos de 2^16; cada bloco é uma lista
+    ordenada (array de 16 bits) enquanto tiver até 4096 linhas e um
+    bitmap de 8 KB (inteiro do Python) acima disso. Interseção, união e
+    diferença trabalham bloco a bloco.
+    """
+
+    __slots__ = ("_chunks",)
+
+    def __init__(self, values=()):
+        self._chunks = {}
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def _from_chunks(cls, chunks):
+        bitmap = cls()
+        for high, chunk in chunks:
+            chunk = _compact(chunk)
+            if chunk is not None:
+                bitmap._chunks[high] = chunk
+        return bitmap
+
+    def add(self, value):
+        high, low = value >> CHUNK_BITS, value & CHUNK_MASK
+        chunk = self._chunks.get(high)
+        if chunk is None:
+            self._chunks[high] = array("H", [low])
+        elif isinstance(chunk, int):
+            self._chunks[high] = chunk | (1 << low)
+        else:
+            # Linhas novas chegam em ordem crescente: quase sempre um append
+            if chunk[-1] < low:
+                chunk.append(low)
+            else:
+                i = bisect_left(chunk, low)
+                if i < len(chunk) and chunk[i] == low:
+                    return
+                chunk.insert(i, low)
+            if len(chunk) > ARRAY_MAX:
+                self._chunks[high] = _to_bits(chunk)
+
+    def __contains__(self, value):
+        chunk = self._chunks.get(value >> CHUNK_BITS)
+        if chunk is None:
+            return False
+        low = value & CHUNK_MASK
+        if isinstance(chunk, int):
+            return bool(chunk >> low & 1)
+        i = bisect_left(chunk, low)
+        return i < len(chunk) and chunk[i] == low
+
+    def __len__(self):
+        return sum(_chunk_len(chunk) for chunk in self._chunks.values())
+
+    def __iter__(self):
+        for high in sorted(self._chunks):
+            chunk = self._chunks[high]
+            base = high << CHUNK_BITS
+            for low in (_to_array(chunk) if isinstance(chunk, int) else chunk):
+                yield base + low
+
+    def __and__(self, other):
+        return Bitmap._from_chunks(
+            (high, _chunk_and(chunk, other._chunks[high]))
+            for high, chunk in self._chunks.items() if high in other._chunks
+        )
+
+    def __or__(self, other):
+        chunks = dict(self._chunks)
+        for high, chunk in other._chunks.items():
+            chunks[high] = _chunk_or(chunks[high], chunk) if high in chunks else chunk
+        return Bitmap._from_chunks(chunks.items())
+
+    def __sub__(self, other):
+        return Bitmap._from_chunks(
+            (high, _chunk_andnot(chunk, other._chunks[high]) if high in other._chunks else chunk)
+            for high, chunk in self._chunks.items()
+        )
+
+    def intersection_count(self, other):
+        """Tamanho de `self & other`, sem montar o resultado."""
+        total = 0
+        for high, chunk in self._chunks.items():
+            other_chunk = other._chunks.get(high)
+            if other_chunk is None:
+                continue
+            if isinstance(chunk, int) and isinstance(other_chunk, int):
+                total += _popcount(chunk & other_chunk)
+            else:
+                total += len(_chunk_and(chunk, other_chunk))
+        return total
+
+    def copy(self):
+        return Bitmap._from_chunks(
+            (high, chunk if isinstance(chunk, int) else array("H", chunk)) for high, chunk in self._chunks.items()
+        )
+
+    @property
+    def nbytes(self):
+        return sum(CHUNK_BYTES if isinstance(chunk, int) else 2 * len(chunk) for chunk in self._chunks.values())
+
+
+class InvalidPredicate(Exception):
+    pass
+
+
+def normalize_predicate(predicate, resolve=None):
+    """
+    Valida uma condição e a reescreve em forma canônica (mesma condição, mesmo hash).
+
+    Formatos aceitos:
+        {"question": 2, "op": "ne", "value": "A"}
+        {"question": 5, "op": "in", "value": ["D", "E", "F"]}
+        {"question": 7, "op": "answered"}  /  {"question": 7, "op": "unanswered"}
+        {"questionnaire": "Engenharia Civil"}
+        {"all": [...]}, {"any": [...]}, {"not": {...}}
+        {"cohort": "<id>"} (coorte já criada, expandida na sua condição)
+
+    Args:
+        resolve (callable, optional): id de coorte -> condição canônica (ou None)
+
+    Raises:
+        InvalidPredicate: Se a condição for inválida
+    """
+    if not isinstance(predicate, dict) or len(predicate) == 0:
+        raise InvalidPredicate("Condição deve ser um objeto")
+    if "all" in predicate or "any" in predicate:
+        kind = "all" if "all" in predicate else "any"
+        items = predicate[kind]
+        if not isinstance(items, list) or not items:
+            raise InvalidPredicate(f"\"{kind}\" deve ser uma lista não vazia")
+        normalized = sorted((normalize_predicate(item, resolve) for item in items),
+                            key=lambda item: json.dumps(item, sort_keys=True))
+        return normalized[0] if len(normalized) == 1 else {kind: normalized}
+    if "not" in predicate:
+        return {"not": normalize_predicate(predicate["not"], resolve)}
+    if "cohort" in predicate:
+        expanded = resolve(predicate["cohort"]) if resolve else None
+        if expanded is None:
+            raise InvalidPredicate(f"Coorte desconhecida: {predicate['cohort']}")
+        return expanded
+    if "questionnaire" in predicate:
+        if not isinstance(predicate["questionnaire"], str):
+            raise InvalidPredicate("\"questionnaire\" deve ser o título do questionário")
+        return {"questionnaire": predicate["questionnaire"]}
+
+    question = predicate.get("question")
+    if not isinstance(question, int) or isinstance(question, bool):
+        raise InvalidPredicate("\"question\" deve ser o número da questão")
+    op = predicate.get("op", "eq")
+    if op not in OPERATORS:
+        raise InvalidPredicate(f"Operador desconhecido: {op} (use {', '.join(OPERATORS)})")
+    if op in ("answered", "unanswered"):
+        return {"question": question, "op": op}
+    value = predicate.get("value")
+    if op in ("in", "not_in"):
+        if not isinstance(value, list) or not value:
+            raise InvalidPredicate(f"\"{op}\" exige uma lista de alternativas em \"value\"")
+        return {"question": question, "op": op, "value": sorted({str(v) for v in value})}
+    if value is None or isinstance(value, (list, dict)):
+        raise InvalidPredicate(f"\"{op}\" exige uma alternativa em \"value\"")
+    return {"question": question, "op": op, "value": str(value)}
+
+
+def predicate_hash(predicate):
+    return hashlib.sha1(json.dumps(predicate, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def matches(predicate, answers, questionnaire):
+    """
+    Avalia uma condição canônica sobre uma única resposta.
+
+    Args:
+        answers (dict): Número da questão -> conjunto de rótulos marcados
+        questionnaire (str): Título do questionário respondido
+    """
+    if "all" in predicate:
+        return all(matches(item, answers, questionnaire) for item in predicate["all"])
+    if "any" in predicate:
+        return any(matches(item, answers, questionnaire) for item in predicate["any"])
+    if "not" in predicate:
+        return not matches(predicate["not"], answers, questionnaire)
+    if "questionnaire" in predicate:
+        return questionnaire == predicate["questionnaire"]
+    labels = answers.get(predicate["question"])
+    op = predicate["op"]
+    if op == "answered":
+        return bool(labels)
+    if op == "unanswered":
+        return not labels
+    if not labels:
+        return False
+    values = {predicate["value"]} if op in ("eq", "ne") else set(predicate["value"])
+    selected = bool(labels & values)
+    # "ne"/"not_in": respondeu a questão com outra alternativa
+    return selected if op in ("eq", "in") else not selected
+
+
+class _TenantIndex:
+    """
+    Linhas de uma instituição e um bitmap por alternativa marcada, por questão
+    respondida e por questionário.
+    """
+
+    def __init__(self):
+        self.rows = {}  # objectId -> número da linha
+        self.next_row = 0
+        self.all = Bitmap()
+        self.options = {}  # (questão, rótulo) -> Bitmap
+        self.answered = {}  # questão -> Bitmap
+        self.questionnaires = {}  # título -> Bitmap
+
+    def add(self, record, answers):
+        """
+        Returns:
+            tuple | None: (linha, respostas por questão) ou None se a resposta já estava no índice
+        """
+        object_id = record.get("objectId")
+        if object_id and object_id in self.rows:
+            return None
+        row = self.next_row
+        self.next_row += 1
+        if object_id:
+            self.rows[object_id] = row
+        self.all.add(row)
+        by_question = {}
+        for number, label in answers or []:
+            by_question.setdefault(number, set()).add(label)
+            self.options.setdefault((number, label), Bitmap()).add(row)
+        for number in by_question:
+            self.answered.setdefault(number, Bitmap()).add(row)
+        self.questionnaires.setdefault(record.get("questionnaire", ""), Bitmap()).add(row)
+        return row, by_question
+
+    def evaluate(self, predicate):
+        if "all" in predicate:
+            items = [self.evaluate(item) for item in predicate["all"]]
+            result = items[0]
+            for item in sorted(items[1:], key=len):
+                result = result & item
+            return result
+        if "any" in predicate:
+            result = Bitmap()
+            for item in predicate["any"]:
+                result = result | self.evaluate(item)
+            return result
+        if "not" in predicate:
+            return self.all - self.evaluate(predicate["not"])
+        if "questionnaire" in predicate:
+            return self.questionnaires.get(predicate["questionnaire"], Bitmap()).copy()
+
+        question, op = predicate["question"], predicate["op"]
+        answered = self.answered.get(question, Bitmap())
+        if op == "answered":
+            return answered.copy()
+        if op == "unanswered":
+            return self.all - answered
+        values = [predicate["value"]] if op in ("eq", "ne") else predicate["value"]
+        selected = Bitmap()
+        for value in values:
+            selected = selected | self.options.get((question, value), Bitmap())
+        return selected if op in ("eq", "in") else answered - selected
+
+    def distribution(self, bitmap, question):
+        counts = {
+            label: bitmap.intersection_count(rows)
+            for (number, label), rows in self.options.items() if number == question
+        }
+        return {label: count for label, count in sorted(counts.items()) if count}
+
+
+class CohortIndex:
+    """
+    Índice de coortes por instituição.
+
+    As respostas viram linhas numeradas; cada alternativa marcada guarda o
+    bitmap das linhas que a escolheram. Uma coorte é a combinação desses
+    bitmaps segundo a sua condição, guardada em cache pelo hash da condição
+    canônica. Cada resposta nova entra no índice e nas coortes em cache que
+    ela satisfaz, sem recalcular nada. O índice é montado uma vez por
+    instituição (`rebuild`, como as estatísticas Likert) e depois mantido por `add`.
+    """
+
+    def __init__(self, cache_size=COHORT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._cohorts = OrderedDict()  # (instituição, id) -> {"predicate", "bitmap"}
+        self._pending = None
+        self._ready = set()
+        self._rebuilding = set()
+        self.counters = {"responses": 0, "rebuilds": 0, "hits": 0, "misses": 0, "incremental_updates": 0}
+
+    def _apply(self, index, record, answers, tenant):
+        # Chamado com o lock adquirido
+        added = index.add(record, answers)
+        if added is None:
+            return
+        row, by_question = added
+        questionnaire = record.get("questionnaire", "")
+        for (owner, _), cohort in self._cohorts.items():
+            if owner == tenant and matches(cohort["predicate"], by_question, questionnaire):
+                cohort["bitmap"].add(row)
+                self.counters["incremental_updates"] += 1
+
+    def add(self, record, answers, tenant=DEFAULT_TENANT):
+        """
+        Inclui uma resposta recém-gravada no índice e nas coortes em cache.
+
+        Args:
+            answers (list): Pares [número da questão, rótulo] (ver answer_parser)
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((tenant, record, answers))
+            index = self._indexes.get(tenant)
+            if index is not None:
+                self._apply(index, record, answers, tenant)
+            self.counters["responses"] += 1
+
+    def rebuild(self, records, answers_of, tenant=DEFAULT_TENANT):
+        """
+        Monta o índice de uma instituição a partir das respostas gravadas.
+
+        Respostas que chegarem durante a leitura são incluídas no final.
+        """
+        with self._lock:
+            if tenant in self._rebuilding:
+                return
+            self._rebuilding.add(tenant)
+            if self._pending is None:
+                self._pending = []
+
+        start = time.monotonic()
+        index = _TenantIndex()
+        try:
+            for record in records:
+                index.add(record, answers_of(record))
+        except Exception:
+            with self._lock:
+                self._rebuilding.discard(tenant)
+                if not self._rebuilding:
+                    self._pending = None
+            raise
+
+        with self._lock:
+            for pending_tenant, record, answers in self._pending:
+                if pending_tenant == tenant:
+                    index.add(record, answers)  # ignoradas se a leitura já as incluiu
+            self._rebuilding.discard(tenant)
+            if not self._rebuilding:
+                self._pending = None
+            self._indexes[tenant] = index
+            # Números de linha novos: as coortes em cache desta instituição são recalculadas
+            for key in [key for key in self._cohorts if key[0] == tenant]:
+                del self._cohorts[key]
+            self._ready.add(tenant)
+            self.counters["rebuilds"] += 1
+        print(f"Índice de coortes montado em {time.monotonic() - start:.1f}s ({len(index.all)} respostas)")
+
+    def is_ready(self, tenant=DEFAULT_TENANT):
+        return tenant in self._ready
+
+    def is_rebuilding(self, tenant=DEFAULT_TENANT):
+        return tenant in self._rebuilding
+
+    def _resolver(self, tenant):
+        def resolve(cohort_id):
+            cohort = self._cohorts.get((tenant, cohort_id))
+            return cohort["predicate"] if cohort else None
+        return resolve
+
+    def cohort(self, predicate, tenant=DEFAULT_TENANT):
+        """
+        Materializa (ou obtém do cache) a coorte de uma condição.
+
+        Returns:
+            tuple: (id da coorte, condição canônica, Bitmap das linhas)
+
+        Raises:
+            InvalidPredicate: Se a condição for inválida
+        """
+        with self._lock:
+            canonical = normalize_predicate(predicate, self._resolver(tenant))
+            cohort_id = predicate_hash(canonical)
+            key = (tenant, cohort_id)
+            cached = self._cohorts.get(key)
+            if cached is not None:
+                self._cohorts.move_to_end(key)
+                self.counters["hits"] += 1
+                return cohort_id, canonical, cached["bitmap"]
+
+            index = self._indexes.get(tenant) or _TenantIndex()
+            bitmap = index.evaluate(canonical)
+            self.counters["misses"] += 1
+            if tenant in self._indexes:
+                self._cohorts[key] = {"predicate": canonical, "bitmap": bitmap}
+                while len(self._cohorts) > self.cache_size:
+                    self._cohorts.popitem(last=False)
+            return cohort_id, canonical, bitmap
+
+    def get(self, cohort_id, tenant=DEFAULT_TENANT):
+        """
+        Returns:
+            tuple | None: (condição canônica, Bitmap) de uma coorte em cache
+        """
+        with self._lock:
+            cached = self._cohorts.get((tenant, cohort_id))
+            if cached is None:
+                return None
+            self._cohorts.move_to_end((tenant, cohort_id))
+            return cached["predicate"], cached["bitmap"]
+
+    def distribution(self, bitmap, question, tenant=DEFAULT_TENANT):
+        """
+        Returns:
+            dict: Rótulo -> quantidade de linhas da coorte que marcaram a alternativa
+        """
+        with self._lock:
+            index = self._indexes.get(tenant)
+            return index.distribution(bitmap, question) if index else {}
+
+    def answered_count(self, bitmap, question, tenant=DEFAULT_TENANT):
+        with self._lock:
+            index = self._indexes.get(tenant)
+            rows = index.answered.get(question) if index else None
+            return bitmap.intersection_count(rows) if rows else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tenants": len(self._indexes),
+                "rows": sum(len(index.all) for index in self._indexes.values()),
+                "bitmaps": sum(len(index.options) for index in self._indexes.values()),
+                "cached_cohorts": len(self._cohorts),
+                "cached_bytes": sum(cohort["bitmap"].nbytes for cohort in self._cohorts.values()),
+                **self.counters,
+            }
@@ -0,0 +1,350 @@
+import json
+import threading
+import zlib
+from importlib.util import find_spec
+
+from rate_limit import env_int
+
+# Compressão das respostas da API e codificações binárias (msgpack, CBOR) negociadas
+# pelos cabeçalhos Accept-Encoding e Accept. zstd, msgpack e CBOR são opcionais:
+# dependem dos pacotes zstandard, msgpack e cbor2; sem eles, gzip e JSON continuam valendo.
+COMPRESSION_MIN_SIZE = env_int("COMPRESSION_MIN_SIZE", 1024)
+GZIP_LEVEL = env_int("COMPRESSION_GZIP_LEVEL", 6)
+ZSTD_LEVEL = env_int("COMPRESSION_ZSTD_LEVEL", 3)
+
+# Conteúdo que não compensa comprimir (já comprimido) ou que precisa chegar evento a evento
+SKIP_COMPRESSION = ("text/event-stream", "application/zip", "application/gzip", "application/pdf",
+                    "image/", "font/woff")
+
+BINARY_TYPES = {
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/cbor": "cbor",
+}
+
+
+def zstd_available():
+    return find_spec("zstandard") is not None
+
+
+def msgpack_available():
+    return find_spec("msgpack") is not None
+
+
+def cbor_available():
+    return find_spec("cbor2") is not None
+
+
+def _preferences(header):
+    """
+    Valores de um cabeçalho Accept/Accept-Encoding com seus pesos (q), na ordem enviada.
+    """
+    preferences = []
+    for part in (header or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    q = float(field[2:])
+                except ValueError:
+                    q = 0.0
+        preferences.append((fields[0].lower(), q))
+    return preferences
+
+
+def negotiate_compression(accept_encoding):
+    """
+    Returns:
+        str | None: "zstd", "gzip" ou None (sem compressão)
+    """
+    weights = dict(_preferences(accept_encoding))
+    candidates = ["zstd", "gzip"] if zstd_available() else ["gzip"]
+    best = None
+    for name in candidates:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (name, q)
+    return best[0] if best else None
+
+
+def negotiate_media_type(accept):
+    """
+    Returns:
+        tuple | None: (tipo de mídia, codificação) se o cliente preferir msgpack
+            ou CBOR a JSON e o pacote correspondente estiver instalado
+    """
+    available = {"msgpack": msgpack_available(), "cbor": cbor_available()}
+    json_q = 0.0
+    best = None
+    for media_type, q in _preferences(accept):
+        if media_type in ("application/json", "application/*", "*/*"):
+            json_q = max(json_q, q)
+        elif media_type in BINARY_TYPES and available[BINARY_TYPES[media_type]] and q > 0:
+            if best is None or q > best[2]:
+                best = (media_type, BINARY_TYPES[media_type], q)
+    if best is None or best[2] < json_q:
+        return None
+    return best[0], best[1]
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "zstd":
+            import zstandard
+            self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: cabeçalho gzip
+
+    def compress(self, data, final):
+        out = self._obj.compress(data)
+        if final:
+            return out + self._obj.flush()
+        # Cada bloco de uma resposta em streaming sai completo, sem esperar o próximo
+        return out + (self._obj.flush(self._flush_block) if self.encoding == "zstd"
+                      else self._obj.flush(zlib.Z_SYNC_FLUSH))
+
+
+class EncodingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def add(self, name, size_in, size_out):
+        with self._lock:
+            entry = self.counters.setdefault(name, {"responses": 0, "bytes_in": 0, "bytes_out": 0})
+            entry["responses"] += 1
+            entry["bytes_in"] += size_in
+            entry["bytes_out"] += size_out
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min_size": COMPRESSION_MIN_SIZE,
+                "available": {"zstd": zstd_available(), "msgpack": msgpack_available(), "cbor": cbor_available()},
+                **{name: dict(entry) for name, entry in self.counters.items()},
+            }
+
+
+encoding_stats = EncodingStats()
+
+
+def _header(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _replace_headers(headers, updates, remove=()):
+    # Nomes em minúsculas, como o ASGI espera (o Starlette compara sem normalizar)
+    names = {name.lower() for name in list(updates) + list(remove)}
+    kept = [(k, v) for k, v in headers if k.decode("latin-1").lower() not in names]
+    return kept + [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in updates.items()]
+
+
+def _tag_etag(headers, suffix):
+    """
+    Acrescenta ao ETag o sufixo de uma representação (ex.: -gzip"), mantendo-o forte.
+    """
+    etag = _header(headers, b"etag")
+    if etag and etag.endswith("\""):
+        return _replace_headers(headers, {"ETag": etag[:-1] + suffix})
+    return headers
+
+
+def _strip_if_none_match(scope, suffix):
+    """
+    Retira do If-None-Match o sufixo de representação, para a rota comparar o ETag original.
+
+    Returns:
+        tuple: (scope, bool indicando se algum ETag do cliente tinha o sufixo)
+    """
+    if_none_match = _header(scope["headers"], b"if-none-match")
+    if not if_none_match or suffix not in if_none_match:
+        return scope, False
+    headers = _replace_headers(scope["headers"], {"If-None-Match": if_none_match.replace(suffix, "\"")})
+    return dict(scope, headers=headers), True
+
+
+def _add_vary(headers, value):
+    vary = _header(headers, b"vary")
+    if vary and value.lower() in vary.lower():
+        return headers
+    return _replace_headers(headers, {"Vary": f"{vary}, {value}" if vary else value})
+
+
+class CompressionMiddleware:
+    """
+    Comprime as respostas com zstd ou gzip, conforme o Accept-Encoding.
+
+    Respostas menores que `minimum_size` seguem sem compressão; respostas em
+    streaming são comprimidas bloco a bloco. Server-Sent Events e arquivos já
+    comprimidos não passam pelo compressor. Toda resposta que poderia ser
+    comprimida leva "Vary: Accept-Encoding", comprimida ou não, para que um
+    cache compartilhado não entregue uma representação a quem pediu a outra.
+
+    Como em BinaryContentMiddleware, a resposta comprimida recebe um ETag
+    próprio (ex.: "catalog-3f2a-gzip"), e o sufixo é retirado do
+    If-None-Match antes de chegar à rota.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    @staticmethod
+    def _negotiable(message):
+        content_type = (_header(message["headers"], b"content-type") or "").lower()
+        return (message["status"] != 204
+                and _header(message["headers"], b"content-encoding") is None
+                and not content_type.startswith(SKIP_COMPRESSION))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate_compression(_header(scope["headers"], b"accept-encoding"))
+        if encoding is None or scope.get("method") == "HEAD":
+            async def send_plain(message):
+                if message["type"] == "http.response.start" and self._negotiable(message):
+                    message = dict(message, headers=_add_vary(message["headers"], "Accept-Encoding"))
+                await send(message)
+            return await self.app(scope, receive, send_plain)
+
+        suffix = f"-{encoding}\""
+        scope, revalidating_encoded = _strip_if_none_match(scope, suffix)
+        state = {"start": None, "pending": [], "compressor": None, "passthrough": False, "in": 0, "out": 0}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                negotiable = self._negotiable(message)
+                state["passthrough"] = not negotiable or message["status"] == 304
+                if state["passthrough"]:
+                    if negotiable:
+                        headers = _add_vary(message["headers"], "Accept-Encoding")
+                        if message["status"] == 304 and revalidating_encoded:
+                            # O cliente revalidou a cópia comprimida: confirmar o ETag dela
+                            headers = _tag_etag(headers, suffix)
+                        message = dict(message, headers=headers)
+                    return await send(message)
+                state["start"] = message
+                return
+
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                # Respostas que passam pelos middlewares HTTP chegam em blocos: acumular
+                # até saber se a resposta atinge o tamanho mínimo
+                state["pending"].append(body)
+                body = b"".join(state["pending"])
+                if more_body and len(body) < self.minimum_size:
+                    return
+                state["start"], state["pending"] = None, []
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send(dict(start, headers=_add_vary(start["headers"], "Accept-Encoding")))
+                    return await send({"type": "http.response.body", "body": body, "more_body": False})
+                state["compressor"] = _Compressor(encoding)
+                headers = _replace_headers(start["headers"], {"Content-Encoding": encoding}, remove=("content-length",))
+                headers = _tag_etag(headers, suffix)
+                await send(dict(start, headers=_add_vary(headers, "Accept-Encoding")))
+
+            compressed = state["compressor"].compress(body, final=not more_body)
+            state["in"] += len(body)
+            state["out"] += len(compressed)
+            if not more_body:
+                encoding_stats.add(encoding, state["in"], state["out"])
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class BinaryContentMiddleware:
+    """
+    Reenvia as respostas JSON em msgpack ou CBOR quando o cliente as prefere
+    (cabeçalho Accept), sem alterar as rotas.
+
+    O ETag recebe um sufixo por codificação (ex.: "catalog-3f2a-msgpack"); o
+    sufixo é retirado do If-None-Match antes de chegar à rota, então as
+    respostas 304 continuam funcionando. Com msgpack ou CBOR disponível, toda
+    resposta JSON leva "Vary: Accept", mesmo quando enviada em JSON.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        negotiated = negotiate_media_type(_header(scope["headers"], b"accept"))
+        if negotiated is None:
+            if not (msgpack_available() or cbor_available()):
+                return await self.app(scope, receive, send)
+
+            async def send_json(message):
+                if message["type"] == "http.response.start":
+                    content_type = (_header(message["headers"], b"content-type") or "").lower()
+                    if message["status"] == 304 or content_type.startswith("application/json"):
+                        message = dict(message, headers=_add_vary(message["headers"], "Accept"))
+                await send(message)
+            return await self.app(scope, receive, send_json)
+        media_type, codec = negotiated
+        suffix = f"-{codec}\""
+
+        scope, _ = _strip_if_none_match(scope, suffix)
+
+        state = {"start": None, "chunks": [], "passthrough": False}
+
+        def tag(headers):
+            return _add_vary(_tag_etag(headers, suffix), "Accept")
+
+        async def send_binary(message):
+            if message["type"] == "http.response.start":
+                content_type = (_header(message["headers"], b"content-type") or "").lower()
+                if message["status"] in (204, 304):
+                    state["passthrough"] = True
+                    return await send(dict(message, headers=tag(message["headers"])))
+                if not content_type.startswith("application/json"):
+                    state["passthrough"] = True
+                    return await send(message)
+                state["start"] = message
+                return
+
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                return await send(message)
+
+            state["chunks"].append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(state["chunks"])
+            start = state["start"]
+            try:
+                data = json.loads(body)
+                if codec == "msgpack":
+                    import msgpack
+                    encoded = msgpack.packb(data, use_bin_type=True)
+                else:
+                    import cbor2
+                    encoded = cbor2.dumps(data)
+            except Exception as e:
+                print(f"Erro ao converter resposta para {codec}, enviando JSON: {e}")
+                await send(dict(start, headers=_add_vary(start["headers"], "Accept")))
+                return await send({"type": "http.response.body", "body": body, "more_body": False})
+            encoding_stats.add(codec, len(body), len(encoded))
+
+            headers = _replace_headers(start["headers"], {"Content-Type": media_type,
+                                                          "Content-Length": str(len(encoded))})
+            await send(dict(start, headers=tag(headers)))
+            await send({"type": "http.response.body", "body": encoded, "more_body": False})
+
+        await self.app(scope, receive, send_binary)
@@ -0,0 +1,287 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from rate_limit import env_float, env_int
+from tenants import DEFAULT_TENANT
+
+# Rascunhos de questionários em andamento, salvos em pequenos incrementos
+DRAFTS_FILE = os.environ.get("DRAFTS_FILE", os.path.join("data", "drafts.json"))
+DRAFT_TTL_SECONDS = env_int("DRAFT_TTL_SECONDS", 24 * 60 * 60)
+DRAFT_MAX = env_int("DRAFT_MAX", 50000)
+DRAFT_FLUSH_INTERVAL = env_float("DRAFT_FLUSH_INTERVAL", 5.0)
+# Limites de cada rascunho (o questionário do ENADE tem menos de 100 questões)
+DRAFT_MAX_ANSWERS = env_int("DRAFT_MAX_ANSWERS", 200)
+DRAFT_MAX_VALUE_LENGTH = env_int("DRAFT_MAX_VALUE_LENGTH", 2000)
+
+STUDENT_FIELDS = ("studentName", "studentId", "studentEmail")
+
+QUESTION_NUMBER = re.compile(r"^\s*(\d+)\.")
+
+
+class DraftNotFound(Exception):
+    pass
+
+
+class DraftTooLarge(Exception):
+    pass
+
+
+class Draft:
+    __slots__ = ("questionnaire", "student", "answers", "created", "updated", "version", "tenant")
+
+    def __init__(self, questionnaire, student=None, answers=None, created=None, updated=None, version=0,
+                 tenant=DEFAULT_TENANT):
+        now = time.time()
+        self.tenant = tenant
+        self.questionnaire = questionnaire
+        self.student = student or {}
+        self.answers = answers or {}
+        self.created = created or now
+        self.updated = updated or now
+        self.version = version
+
+    def to_dict(self):
+        # Cópias: o dicionário é lido (serializado) fora do lock do store
+        return {
+            "questionnaire": self.questionnaire,
+            "student": dict(self.student),
+            "answers": dict(self.answers),
+            "created": self.created,
+            "updated": self.updated,
+            "version": self.version,
+            "tenant": self.tenant,
+        }
+
+    def ordered_responses(self):
+        """
+        Respostas no formato de `save_response`, na ordem das questões do formulário.
+        """
+        def position(item):
+            match = QUESTION_NUMBER.match(item[0])
+            return int(match.group(1)) if match else float("inf")
+
+        return [{"question": q, "answer": a} for q, a in sorted(self.answers.items(), key=position)]
+
+
+class DraftStore:
+    """
+    Armazena rascunhos em memória, com expiração por inatividade.
+
+    As alterações só marcam o rascunho como modificado; a cada `flush_interval`
+    segundos uma thread acrescenta ao diário (drafts.json.log) apenas os
+    rascunhos alterados desde a última gravação, de modo que dezenas de pequenos
+    patches de um mesmo aluno resultam em uma única linha. Quando o diário fica
+    maior que o número de rascunhos, ele é consolidado em drafts.json.
+
+    Os rascunhos ficam em ordem de última alteração, então expirar ou descartar
+    o mais antigo não percorre o store inteiro.
+    """
+
+    def __init__(self, path=DRAFTS_FILE, ttl=DRAFT_TTL_SECONDS, max_drafts=DRAFT_MAX,
+                 flush_interval=DRAFT_FLUSH_INTERVAL, max_answers=DRAFT_MAX_ANSWERS,
+                 max_value_length=DRAFT_MAX_VALUE_LENGTH):
+        self.path = path
+        self.ttl = ttl
+        self.max_drafts = max_drafts
+        self.flush_interval = flush_interval
+        self.max_answers = max_answers
+        self.max_value_length = max_value_length
+        self.log_path = f"{path}.log"
+        self._drafts = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._changed = set()
+        self._log_entries = 0
+        self._flusher = None
+        self.counters = {"created": 0, "patches": 0, "submitted": 0, "expired": 0, "flushes": 0}
+
+    def load(self):
+        """Recupera os rascunhos gravados e o diário de alterações (chamado no startup)."""
+        stored = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Erro ao carregar rascunhos: {e}")
+                return
+
+        entries = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # última linha incompleta (gravação interrompida)
+                    entries += 1
+                    if entry.get("draft") is None:
+                        stored.pop(entry["id"], None)
+                    else:
+                        stored[entry["id"]] = entry["draft"]
+
+        with self._lock:
+            for session_id, data in sorted(stored.items(), key=lambda item: item[1]["updated"]):
+                self._drafts[session_id] = Draft(**data)
+            self._log_entries = entries
+            self._expire()
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="drafts-flush", daemon=True)
+            self._flusher.start()
+
+    def create(self, questionnaire, student=None, tenant=DEFAULT_TENANT):
+        session_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire()
+            if len(self._drafts) >= self.max_drafts:
+                # Descartar o rascunho parado há mais tempo (o primeiro da ordem)
+                oldest, _ = self._drafts.popitem(last=False)
+                self._changed.add(oldest)
+                self.counters["expired"] += 1
+            self._drafts[session_id] = Draft(questionnaire, self._student_fields(student), tenant=tenant)
+            self._changed.add(session_id)
+            self.counters["created"] += 1
+        return session_id
+
+    def get(self, session_id, tenant=DEFAULT_TENANT):
+        with self._lock:
+            return self._get(session_id, tenant).to_dict()
+
+    def patch(self, session_id, answers=None, student=None, tenant=DEFAULT_TENANT):
+        """
+        Aplica um patch incremental: respostas novas/alteradas e dados do aluno.
+        Uma resposta `None` remove a questão do rascunho.
+
+        Returns:
+            dict: Versão atual e quantidade de questões respondidas
+
+        Raises:
+            DraftNotFound: Se o rascunho não existir ou tiver expirado
+            DraftTooLarge: Se o patch exceder os limites de tamanho do rascunho
+        """
+        answers = answers or {}
+        student = self._student_fields(student)
+        for value in list(answers) + list(answers.values()) + list(student.values()):
+            if value is not None and len(value) > self.max_value_length:
+                raise DraftTooLarge(f"Valores com no máximo {self.max_value_length} caracteres")
+
+        with self._lock:
+            draft = self._get(session_id, tenant)
+            added = sum(1 for q, a in answers.items() if a is not None and q not in draft.answers)
+            if len(draft.answers) + added > self.max_answers:
+                raise DraftTooLarge(f"No máximo {self.max_answers} respostas por rascunho")
+            for question, answer in answers.items():
+                if answer is None:
+                    draft.answers.pop(question, None)
+                else:
+                    draft.answers[question] = answer
+            draft.student.update(student)
+            draft.updated = time.time()
+            draft.version += 1
+            self._drafts.move_to_end(session_id)
+            self._changed.add(session_id)
+            self.counters["patches"] += 1
+            return {"version": draft.version, "answered": len(draft.answers)}
+
+    def pop(self, session_id, tenant=DEFAULT_TENANT):
+        """Remove o rascunho (após o envio definitivo) e o devolve."""
+        with self._lock:
+            draft = self._get(session_id, tenant)
+            del self._drafts[session_id]
+            self._changed.add(session_id)
+            self.counters["submitted"] += 1
+            return draft
+
+    def restore(self, session_id, draft):
+        """Devolve um rascunho ao store se o envio definitivo falhou."""
+        with self._lock:
+            self._drafts[session_id] = draft
+            self._drafts.move_to_end(session_id)
+            self._changed.add(session_id)
+            self.counters["submitted"] -= 1
+
+    def _get(self, session_id, tenant):
+        draft = self._drafts.get(session_id)
+        # Um rascunho só é visível para a instituição em que foi criado
+        if draft is None or draft.tenant != tenant or time.time() - draft.updated > self.ttl:
+            raise DraftNotFound(session_id)
+        return draft
+
+    def _expire(self):
+        # Chamado com o lock adquirido; os mais antigos estão no início
+        limit = time.time() - self.ttl
+        while self._drafts:
+            sid, draft = next(iter(self._drafts.items()))
+            if draft.updated >= limit:
+                break
+            del self._drafts[sid]
+            self._changed.add(sid)
+            self.counters["expired"] += 1
+
+    @staticmethod
+    def _student_fields(student):
+        return {k: v for k, v in (student or {}).items() if k in STUDENT_FIELDS and v is not None}
+
+    def flush(self):
+        """
+        Acrescenta ao diário os rascunhos alterados desde a última gravação
+        (consolidando o diário em drafts.json quando ele cresce demais).
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._expire()
+                if not self._changed:
+                    return
+                changed = self._changed
+                self._changed = set()
+                # Cópias feitas com o lock: a serialização abaixo não vê patches concorrentes
+                entries = [
+                    {"id": sid, "draft": self._drafts[sid].to_dict() if sid in self._drafts else None}
+                    for sid in changed
+                ]
+                compact = self._log_entries + len(entries) > max(1000, len(self._drafts))
+                snapshot = {sid: draft.to_dict() for sid, draft in self._drafts.items()} if compact else None
+
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                if compact:
+                    tmp_path = f"{self.path}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+                    os.replace(tmp_path, self.path)
+                    # O diário antigo já está contido no snapshot
+                    open(self.log_path, "w").close()
+                    self._log_entries = 0
+                else:
+                    lines = "".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+                                    for entry in entries)
+                    with open(self.log_path, "a", encoding="utf-8") as f:
+                        f.write(lines)
+                    self._log_entries += len(entries)
+            except Exception:
+                # Regravados na próxima tentativa
+                with self._lock:
+                    self._changed.update(changed)
+                raise
+            with self._lock:
+                self.counters["flushes"] += 1
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao gravar rascunhos: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"drafts": len(self._drafts), "ttl_seconds": self.ttl, "pending_writes": len(self._changed),
+                    "log_entries": self._log_entries, **self.counters}
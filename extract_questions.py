@@ -1,7 +1,6 @@
 import re
 import json
 import os
-import pdfplumber
 
 def clean_text(text):
     """
@@ -31,6 +30,10 @@ def extract_questions_from_pdf(pdf_path):
     Returns:
         list: Lista de questões extraídas
     """
+    # Importado sob demanda: pdfplumber traz uma árvore de dependências grande
+    # e só é necessário quando um PDF é de fato processado
+    import pdfplumber
+    
     questions = []
     
     try:
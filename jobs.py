@@ -0,0 +1,296 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import env_float, env_int
+
+# Tarefas de manutenção (migração, recarga do catálogo, recálculo de agregados,
+# aquecimento de caches) executadas fora das requisições, com registro em disco
+JOBS_FILE = os.environ.get("JOBS_FILE", os.path.join("data", "jobs.json"))
+JOB_WORKERS = env_int("JOB_WORKERS", 2)
+JOB_MAX_RECORDS = env_int("JOB_MAX_RECORDS", 200)
+# Intervalo mínimo entre gravações do registro causadas só por progresso
+JOB_PERSIST_INTERVAL = env_float("JOB_PERSIST_INTERVAL", 2.0)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class UnknownJobKind(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """
+    Entregue à função do job: informa o progresso e verifica o cancelamento.
+    """
+
+    def __init__(self, scheduler, job):
+        self._scheduler = scheduler
+        self._job = job
+        self.id = job["id"]
+        self.params = dict(job["params"])
+
+    @property
+    def cancelled(self):
+        return self._job["cancel_requested"]
+
+    def check(self):
+        """
+        Raises:
+            JobCancelled: Se o cancelamento foi pedido
+        """
+        if self._job["cancel_requested"]:
+            raise JobCancelled()
+
+    def progress(self, done, total=None, message=None):
+        """Atualiza o progresso (e interrompe o job se o cancelamento foi pedido)."""
+        self._scheduler._progress(self._job, done, total, message)
+        self.check()
+
+
+class JobScheduler:
+    """
+    Fila de jobs em segundo plano, executados por um número limitado de threads.
+
+    Cada tipo de job é registrado com `register`; um job é enfileirado com
+    `submit` e acompanhado por `get`. O cancelamento é cooperativo: jobs na fila
+    são cancelados na hora, jobs em execução param no próximo `progress`/`check`.
+    Os registros são gravados em data/jobs.json; jobs que estavam em andamento
+    quando o processo parou aparecem como "interrupted" ao reiniciar.
+    """
+
+    def __init__(self, path=JOBS_FILE, workers=JOB_WORKERS, max_records=JOB_MAX_RECORDS,
+                 persist_interval=JOB_PERSIST_INTERVAL):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_records = max_records
+        self.persist_interval = persist_interval
+        self._kinds = {}
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._persisted_at = 0.0
+        self._write_lock = threading.Lock()
+        self._persist_seq = 0
+        self._written_seq = 0
+        self.counters = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "deduplicated": 0}
+
+    def register(self, kind, func, exclusive=True):
+        """
+        Args:
+            kind (str): Nome do tipo de job (ex.: "migrate-questions")
+            func (callable): func(context: JobContext) -> dict com o resultado
+            exclusive (bool): Um único job ativo deste tipo por dono; pedidos
+                repetidos devolvem o job já em andamento
+        """
+        self._kinds[kind] = (func, exclusive)
+
+    def kinds(self):
+        return sorted(self._kinds)
+
+    def load(self):
+        """Recupera os registros gravados (chamar no startup)."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao ler registro de jobs: {e}")
+            return
+        with self._lock:
+            for job in records:
+                if job.get("status") in ACTIVE_STATUSES:
+                    job["status"] = "interrupted"
+                    job["finished"] = job.get("finished") or time.time()
+                self._jobs.setdefault(job["id"], job)
+        self._persist(force=True)
+
+    def submit(self, kind, params=None, owner=None):
+        """
+        Enfileira um job.
+
+        Args:
+            kind (str): Tipo registrado
+            params (dict, optional): Parâmetros (serializáveis em JSON)
+            owner (str, optional): Instituição dona do job
+
+        Returns:
+            dict: Registro do job (novo ou o já em andamento, se o tipo for exclusivo)
+
+        Raises:
+            UnknownJobKind: Se o tipo não foi registrado
+        """
+        if kind not in self._kinds:
+            raise UnknownJobKind(kind)
+        func, exclusive = self._kinds[kind]
+
+        with self._lock:
+            if exclusive:
+                for job in self._jobs.values():
+                    if job["kind"] == kind and job["owner"] == owner and job["status"] in ACTIVE_STATUSES:
+                        self.counters["deduplicated"] += 1
+                        return self._public(job)
+
+            job_id = secrets.token_hex(8)
+            job = {
+                "id": job_id,
+                "kind": kind,
+                "owner": owner,
+                "params": params or {},
+                "status": "queued",
+                "progress": {"done": 0, "total": None, "message": None},
+                "result": None,
+                "error": None,
+                "cancel_requested": False,
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+            }
+            self._jobs[job_id] = job
+            self._trim()
+            self.counters["submitted"] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            # O job roda no contexto de quem o pediu (instituição e credenciais)
+            context = contextvars.copy_context()
+            self._futures[job_id] = self._executor.submit(context.run, self._run, job, func)
+
+        self._persist(force=True)
+        return self.get(job_id, owner)
+
+    def _trim(self):
+        # Descartar os registros concluídos mais antigos
+        excess = len(self._jobs) - self.max_records
+        for job_id in [jid for jid, job in self._jobs.items() if job["status"] not in ACTIVE_STATUSES]:
+            if excess <= 0:
+                break
+            del self._jobs[job_id]
+            excess -= 1
+
+    def _run(self, job, func):
+        with self._lock:
+            if job["status"] != "queued":
+                return  # cancelado enquanto esperava na fila
+            job["status"] = "running"
+            job["started"] = time.time()
+        self._persist(force=True)
+
+        status, result, error = "succeeded", None, None
+        try:
+            result = func(JobContext(self, job))
+        except JobCancelled:
+            status = "cancelled"
+        except Exception as e:
+            print(f"Erro no job {job['kind']} ({job['id']}): {e}")
+            traceback.print_exc()
+            status, error = "failed", str(e)
+
+        with self._lock:
+            job["status"] = status
+            job["result"] = result
+            job["error"] = error
+            job["finished"] = time.time()
+            self.counters[status] += 1
+            self._futures.pop(job["id"], None)
+        self._persist(force=True)
+
+    def _progress(self, job, done, total, message):
+        with self._lock:
+            job["progress"] = {"done": done, "total": total, "message": message}
+        self._persist()
+
+    def cancel(self, job_id, owner=None):
+        """
+        Pede o cancelamento de um job.
+
+        Returns:
+            dict | None: Registro atualizado, ou None se o job não existir
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["owner"] != owner:
+                return None
+            if job["status"] in ACTIVE_STATUSES:
+                job["cancel_requested"] = True
+                future = self._futures.get(job_id)
+                if job["status"] == "queued" and (future is None or future.cancel()):
+                    job["status"] = "cancelled"
+                    job["finished"] = time.time()
+                    self.counters["cancelled"] += 1
+                    self._futures.pop(job_id, None)
+        self._persist(force=True)
+        return self.get(job_id, owner)
+
+    def get(self, job_id, owner=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["owner"] != owner:
+                return None
+            return self._public(job)
+
+    def jobs(self, owner=None, kind=None):
+        with self._lock:
+            return [
+                self._public(job) for job in reversed(self._jobs.values())
+                if job["owner"] == owner and (kind is None or job["kind"] == kind)
+            ]
+
+    @staticmethod
+    def _public(job):
+        return dict(job, params=dict(job["params"]), progress=dict(job["progress"]))
+
+    def _persist(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._persisted_at < self.persist_interval:
+                return
+            self._persisted_at = now
+            # Serializado com o lock; a escrita em disco fica fora dele, para que
+            # get/submit não esperem pelo disco
+            self._persist_seq += 1
+            seq = self._persist_seq
+            data = json.dumps([self._public(job) for job in self._jobs.values()], ensure_ascii=False, default=str)
+
+        with self._write_lock:
+            if seq < self._written_seq:
+                return  # um registro mais novo já foi gravado
+            self._written_seq = seq
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Erro ao gravar registro de jobs: {e}")
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] in ACTIVE_STATUSES:
+                    job["cancel_requested"] = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._persist(force=True)
+
+    def stats(self):
+        with self._lock:
+            active = {}
+            for job in self._jobs.values():
+                if job["status"] in ACTIVE_STATUSES:
+                    active[job["status"]] = active.get(job["status"], 0) + 1
+            return {"workers": self.workers, "kinds": sorted(self._kinds), "queued": active.get("queued", 0),
+                    "running": active.get("running", 0), "records": len(self._jobs), **self.counters}
@@ -0,0 +1,217 @@
+import math
+import re
+import threading
+import time
+
+from tenants import DEFAULT_TENANT
+
+# Valores da escala e respostas que ficam fora das estatísticas
+LIKERT_VALUES = {"1": 1, "2": 2, "3": 3, "4": 4, "5": 5, "6": 6}
+EXCLUDED_ANSWERS = {"n", "ns", "na", "não sei responder", "não se aplica"}
+
+QUESTION_PREFIX = re.compile(r"^\s*\d+\.\s*")
+
+
+def question_key(question):
+    """
+    Texto da questão sem a numeração do formulário (que muda de um questionário para outro).
+    """
+    return QUESTION_PREFIX.sub("", question or "", count=1).strip()
+
+
+class LikertAccumulator:
+    """
+    Estatísticas de uma questão Likert, atualizadas uma resposta por vez.
+
+    Média e variância usam o algoritmo de Welford. Como a escala só tem seis
+    valores, o histograma é um sketch de quantis exato: ocupa memória
+    constante e dois acumuladores se combinam somando os histogramas.
+    """
+
+    __slots__ = ("n", "mean", "m2", "histogram", "excluded")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = [0] * 6
+        self.excluded = 0
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        self.histogram[value - 1] += 1
+
+    def merge(self, other):
+        """Combina outro acumulador a este (Chan et al.) e devolve este."""
+        if other.n:
+            n = self.n + other.n
+            delta = other.mean - self.mean
+            self.mean += delta * other.n / n
+            self.m2 += other.m2 + delta * delta * self.n * other.n / n
+            self.n = n
+            for i, count in enumerate(other.histogram):
+                self.histogram[i] += count
+        self.excluded += other.excluded
+        return self
+
+    def quantile(self, p):
+        """Quantil com interpolação linear entre as posições vizinhas."""
+        if not self.n:
+            return None
+        position = (self.n - 1) * p
+        lower = self._value_at(math.floor(position))
+        upper = self._value_at(math.ceil(position))
+        return lower + (upper - lower) * (position - math.floor(position))
+
+    def _value_at(self, rank):
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if rank < seen:
+                return i + 1
+        return 6
+
+    def summary(self):
+        variance = self.m2 / (self.n - 1) if self.n > 1 else None
+        q1, median, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        return {
+            "n": self.n,
+            "excluded": self.excluded,
+            "mean": round(self.mean, 4) if self.n else None,
+            "variance": round(variance, 4) if variance is not None else None,
+            "stddev": round(math.sqrt(variance), 4) if variance is not None else None,
+            "median": median,
+            "q1": q1,
+            "q3": q3,
+            "iqr": q3 - q1 if self.n else None,
+            "histogram": {str(i + 1): count for i, count in enumerate(self.histogram)},
+        }
+
+
+class LikertStats:
+    """
+    Acumuladores por instituição, questionário, dia de envio e questão.
+
+    Cada resposta recebida atualiza os acumuladores do seu dia; consultas por
+    questionário e período apenas combinam os acumuladores dos dias
+    envolvidos, sem reler as respostas gravadas. Os acumuladores são montados
+    uma vez por instituição (`rebuild`) e depois mantidos por `add`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # (instituição, questionário, dia) -> {questão: LikertAccumulator}
+        self._pending = None
+        self._ready = set()
+        self._rebuilding = set()
+        self.counters = {"responses": 0, "answers": 0, "rebuilds": 0}
+
+    @staticmethod
+    def _apply(buckets, record, tenant):
+        day = (record.get("submissionDate") or "")[:10]
+        bucket = buckets.setdefault((tenant, record.get("questionnaire", ""), day), {})
+        added = 0
+        for item in record.get("responses", []):
+            answer = str(item.get("answer", "")).strip()
+            value = LIKERT_VALUES.get(answer)
+            if value is None and answer.lower() not in EXCLUDED_ANSWERS:
+                continue  # não é uma questão Likert
+            key = question_key(item.get("question"))
+            accumulator = bucket.get(key)
+            if accumulator is None:
+                accumulator = bucket[key] = LikertAccumulator()
+            if value is None:
+                accumulator.excluded += 1
+            else:
+                accumulator.add(value)
+            added += 1
+        return added
+
+    def add(self, record, tenant=DEFAULT_TENANT):
+        """Contabiliza uma resposta recém-gravada."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((tenant, record))
+            self.counters["responses"] += 1
+            self.counters["answers"] += self._apply(self._buckets, record, tenant)
+
+    def rebuild(self, records, tenant=DEFAULT_TENANT):
+        """
+        Recalcula os acumuladores de uma instituição a partir das respostas gravadas.
+
+        Respostas que chegarem durante a leitura são reaplicadas no final, a
+        menos que a leitura já as tenha incluído.
+        """
+        with self._lock:
+            if tenant in self._rebuilding:
+                return
+            self._rebuilding.add(tenant)
+            if self._pending is None:
+                self._pending = []
+
+        start = time.monotonic()
+        buckets = {}
+        seen = set()
+        try:
+            for record in records:
+                seen.add(record.get("objectId"))
+                self._apply(buckets, record, tenant)
+        except Exception:
+            with self._lock:
+                self._rebuilding.discard(tenant)
+                if not self._rebuilding:
+                    self._pending = None
+            raise
+
+        with self._lock:
+            for pending_tenant, record in self._pending:
+                if pending_tenant == tenant and record.get("objectId") not in seen:
+                    self._apply(buckets, record, tenant)
+            self._rebuilding.discard(tenant)
+            if not self._rebuilding:
+                self._pending = None
+            # Manter os acumuladores das demais instituições
+            buckets.update((key, bucket) for key, bucket in self._buckets.items() if key[0] != tenant)
+            self._buckets = buckets
+            self._ready.add(tenant)
+            self.counters["rebuilds"] += 1
+        print(f"Estatísticas Likert calculadas em {time.monotonic() - start:.1f}s")
+
+    def is_ready(self, tenant=DEFAULT_TENANT):
+        return tenant in self._ready
+
+    def is_rebuilding(self, tenant=DEFAULT_TENANT):
+        return tenant in self._rebuilding
+
+    def query(self, questionnaire=None, since=None, until=None, tenant=DEFAULT_TENANT):
+        """
+        Combina os acumuladores do questionário e do período pedidos.
+
+        Args:
+            questionnaire (str, optional): Título do questionário (todos se omitido)
+            since (str, optional): Data inicial (AAAA-MM-DD, inclusive)
+            until (str, optional): Data final (AAAA-MM-DD, inclusive)
+            tenant (str): Instituição
+
+        Returns:
+            dict: Questão -> LikertAccumulator combinado
+        """
+        merged = {}
+        with self._lock:
+            for (scope, title, day), bucket in self._buckets.items():
+                if scope != tenant:
+                    continue
+                if questionnaire is not None and title != questionnaire:
+                    continue
+                if (since and day < since) or (until and day > until):
+                    continue
+                for key, accumulator in bucket.items():
+                    merged.setdefault(key, LikertAccumulator()).merge(accumulator)
+        return merged
+
+    def stats(self):
+        with self._lock:
+            return {"ready": sorted(self._ready), "buckets": len(self._buckets), **self.counters}
@@ -1,29 +1,131 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Dict, List, Optional
+import asyncio
 import json
 import os
+import re
 import traceback
 from datetime import datetime
-import requests
 
-app = FastAPI(title="Sistema de Questionários ENADE")
+from answer_parser import PARSE_BATCH_SIZE, PARSER_VERSION, ParsedAnswerCache, backfill_parsed_answers
+from archive import archive_responses, archive_summary, iter_archived, parse_cutoff
+from broadcast import BroadcastHub, ResponseCounters
+from catalog import CATALOG_DIR, TENANT_CATALOG_DIR, CatalogStore
+from catalog_cache import StaleWhileRevalidateCache
+from cohorts import CohortIndex, InvalidPredicate
+from content_encoding import BinaryContentMiddleware, CompressionMiddleware, encoding_stats
+from drafts import DraftNotFound, DraftStore, DraftTooLarge
+from jobs import JobCancelled, JobScheduler, UnknownJobKind
+from likert_stats import LikertStats
+from microdata import EXPORT_FORMATS, EXPORTS_DIR, MicrodataLayout, export_microdata
+from offline_sync import (
+    IDEMPOTENCY_KEY,
+    OFFLINE_BATCH_MAX,
+    IdempotencyLedger,
+    bundle_etag,
+    offline_manifest,
+)
+from parse_client import (
+    PARSE_APP_ID,
+    PARSE_REST_API_KEY,
+    PARSE_SERVER_URL,
+    PARSE_HEADERS,
+    QUESTION_KEYS,
+    QUESTIONNAIRE_KEYS,
+    RESPONSE_ANALYSIS_KEYS,
+    RESPONSE_KEYS,
+    batch_path,
+    count_objects,
+    default_tenant,
+    find_objects,
+    iter_objects,
+    iter_responses,
+    parse_limiter,
+    parse_request,
+    response_from_parse,
+    tenant_breaker,
+)
+from question_search import QuestionIndex
+from reports import ReportFormatUnavailable, ReportRenderer, check_format, report_path
+from rate_limit import LimiterOverloaded, env_int
+from telemetry import TELEMETRY_BATCH_MAX, InvalidTelemetry, TelemetryPipeline, parse_batch
+from traffic_capture import CaptureMiddleware, parse_fixtures, traffic_capture
+from tenants import TENANT_HEADER, TenantCaches, TenantRegistry, UnknownTenant, current_tenant
 
-# Configurações do Parse Server
-PARSE_APP_ID = os.environ.get("PARSE_APP_ID", "s7pKPlnBzfYSLKpV2MvxN6ahLQRreBVjRKGmXhaD")
-PARSE_REST_API_KEY = os.environ.get("PARSE_REST_API_KEY", "BsRIEaRzKtWkIdz70UrddtHaFsHJdLkYHszT4O6Y")
-PARSE_SERVER_URL = os.environ.get("PARSE_SERVER_URL", "https://parseapi.back4app.com")
+app = FastAPI(title="Sistema de Questionários ENADE")
 
-# Headers para requisições ao Parse Server
-PARSE_HEADERS = {
-    "X-Parse-Application-Id": PARSE_APP_ID,
-    "X-Parse-REST-API-Key": PARSE_REST_API_KEY,
-    "Content-Type": "application/json"
+# Limites de taxa por IP e por grupo de rotas: (requisições por minuto, rajada)
+RATE_LIMIT_RULES = {
+    "submit": (env_int("RATE_LIMIT_SUBMIT_PER_MIN", 30), env_int("RATE_LIMIT_SUBMIT_BURST", 10)),
+    "admin": (env_int("RATE_LIMIT_ADMIN_PER_MIN", 60), env_int("RATE_LIMIT_ADMIN_BURST", 20)),
+    "draft": (env_int("RATE_LIMIT_DRAFT_PER_MIN", 120), env_int("RATE_LIMIT_DRAFT_BURST", 60)),
+    # Laboratórios inteiros saem pelo mesmo IP, cada aluno enviando eventos a cada poucos segundos
+    "telemetry": (env_int("RATE_LIMIT_TELEMETRY_PER_MIN", 1200), env_int("RATE_LIMIT_TELEMETRY_BURST", 300)),
 }
 
+# Instituições atendidas (data/tenants.json); cada uma com credenciais e baldes de taxa próprios
+tenant_registry = TenantRegistry(default_tenant, RATE_LIMIT_RULES)
+
+def request_tenant():
+    """Instituição da requisição em andamento"""
+    return current_tenant.get(default_tenant)
+
+# Proxies confiáveis à frente da aplicação (ex.: 1 para o proxy da PaaS). Cada proxy
+# acrescenta à direita de X-Forwarded-For o endereço que recebeu; os valores mais à
+# esquerda são enviados pelo próprio cliente e não servem para o limite de taxa.
+# Com 0 (padrão) o cabeçalho é ignorado e vale o endereço da conexão.
+RATE_LIMIT_TRUSTED_PROXIES = env_int("RATE_LIMIT_TRUSTED_PROXIES", 0)
+
+def rate_limit_rule(method, path):
+    """
+    Determina qual regra de limite de taxa se aplica à rota.
+
+    Returns:
+        str | None: Nome da regra ou None se a rota não é limitada
+    """
+    if path in ("/api/responses", "/api/responses/stream"):
+        return "submit" if method == "POST" else "admin"
+    if path == "/api/responses/batch":
+        return "submit"
+    if path.startswith("/api/responses/"):
+        return "admin"
+    if path.startswith("/api/drafts"):
+        return "submit" if path.endswith("/submit") else "draft"
+    if path == "/api/telemetry":
+        return "telemetry"
+    if path.startswith("/api/telemetry/"):
+        return "admin"
+    if path in ("/api/status", "/api/migrate-questions") or path.startswith(("/api/archive", "/api/reports", "/api/jobs", "/api/exports", "/api/cohorts")):
+        return "admin"
+    if path.startswith("/api/questionnaires") and method in ("POST", "PUT", "DELETE"):
+        return "admin"
+    return None
+
+def client_address(request):
+    if RATE_LIMIT_TRUSTED_PROXIES > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if hops:
+            # Endereço registrado pelo proxy confiável mais externo
+            return hops[-min(RATE_LIMIT_TRUSTED_PROXIES, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+def overloaded_response(exc, status_code):
+    return JSONResponse(
+        status_code=status_code,
+        content={"message": str(exc)},
+        headers={"Retry-After": str(max(1, int(round(exc.retry_after))))}
+    )
+
+@app.exception_handler(LimiterOverloaded)
+async def limiter_overloaded_handler(request: Request, exc: LimiterOverloaded):
+    # Parse Server saturado: descartar a requisição rapidamente em vez de esperar o timeout
+    return overloaded_response(exc, 503)
+
 # Middleware para tratar exceções e imprimir erros detalhados
 @app.middleware("http")
 async def catch_exceptions_middleware(request: Request, call_next):
@@ -38,6 +140,28 @@ async def catch_exceptions_middleware(request: Request, call_next):
             content={"message": f"Erro interno: {str(e)}"}
         )
 
+# Middleware de limite de taxa por instituição, cliente e rota
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    rule = rate_limit_rule(request.method, request.url.path)
+    if rule:
+        try:
+            request_tenant().rate_limiter.check(rule, client_address(request))
+        except LimiterOverloaded as e:
+            return overloaded_response(e, 429)
+    return await call_next(request)
+
+# Middleware que identifica a instituição (cabeçalho X-Tenant-Id ou host);
+# registrado por último para envolver os demais
+@app.middleware("http")
+async def tenant_middleware(request: Request, call_next):
+    try:
+        tenant = tenant_registry.resolve(request.headers.get("host"), request.headers.get(TENANT_HEADER))
+    except UnknownTenant:
+        return JSONResponse(status_code=404, content={"message": "Instituição desconhecida"})
+    current_tenant.set(tenant)
+    return await call_next(request)
+
 # Configuração CORS para permitir requisições do frontend
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +171,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Respostas em msgpack/CBOR para quem pedir no Accept (scripts de análise) e
+# compressão zstd/gzip acima de COMPRESSION_MIN_SIZE; a compressão envolve a conversão
+app.add_middleware(BinaryContentMiddleware)
+app.add_middleware(CompressionMiddleware)
+
+# Captura de tráfego anonimizado para o replay (TRAFFIC_CAPTURE=1); por fora de
+# todos os middlewares, para medir a latência que o cliente percebe
+app.add_middleware(CaptureMiddleware, tenant_var=current_tenant, tenant_header=TENANT_HEADER.encode("latin-1"),
+                   default_tenant=default_tenant.id)
+
 # Modelos de dados
 class QuestionOption(BaseModel):
     label: str
@@ -71,180 +205,141 @@ class Questionnaire(QuestionnaireBase):
     id: int
     questions: List[Question]
     created_at: str
+    catalog_version: Optional[str] = None  # versão do catálogo fixada na criação
+
+class DraftCreate(BaseModel):
+    questionnaire: str
+    studentName: Optional[str] = None
+    studentId: Optional[str] = None
+    studentEmail: Optional[str] = None
 
-# Diretório para armazenar arquivos estáticos
-os.makedirs("static", exist_ok=True)
+class DraftPatch(BaseModel):
+    answers: Dict[str, Optional[str]] = {}  # texto da questão -> resposta (None remove)
+    studentName: Optional[str] = None
+    studentId: Optional[str] = None
+    studentEmail: Optional[str] = None
 
-# Verificar se existe pelo menos um arquivo HTML na pasta static
-index_path = os.path.join("static", "index.html")
-if not os.path.exists(index_path):
-    print("AVISO: index.html não encontrado na pasta static.")
+class ResponseAnswer(BaseModel):
+    question: str
+    answer: str
 
-# Função para extrair questões do PDF do ENADE
-def extract_questions_from_pdf(existing_questions=None):
+class ResponseSubmission(BaseModel):
+    questionnaire: str
+    responses: List[ResponseAnswer]
+    studentName: Optional[str] = None
+    studentId: Optional[str] = None
+    studentEmail: Optional[str] = None
+
+class JobCreate(BaseModel):
+    kind: str
+    params: Dict = {}
+
+class CohortCreate(BaseModel):
+    predicate: Dict  # ver cohorts.normalize_predicate
+
+class CohortCompare(BaseModel):
+    cohorts: Dict[str, Dict]  # nome -> condição
+    questions: List[int] = []  # números das questões a comparar
+
+# Funções CRUD usando Parse REST API
+
+def fetch_questions():
     """
-    Extrai questões do PDF, preservando questões existentes.
-    
-    Args:
-        existing_questions (list, optional): Lista de questões existentes
+    Busca as questões no Parse Server.
+    Se não existirem, agenda a recarga do catálogo (job "reseed-catalog").
     
     Returns:
-        list: Lista atualizada de questões
-    """
-    # Se não houver questões existentes, iniciar com lista vazia
-    questions = existing_questions or []
-    
-    # Verificar se já existem questões com IDs específicos para evitar duplicatas
-    existing_ids = {q.get('id', 0) for q in questions}
-    
-    # Função auxiliar para adicionar questão se ID não existir
-    def add_question_if_not_exists(question):
-        if question['id'] not in existing_ids:
-            questions.append(question)
-            existing_ids.add(question['id'])
-    
-    # Questões de dados pessoais
-    default_personal_questions = []
+        list: Lista de questões
     
-    # Adicionar questões padrão se não existirem
-    for q in default_personal_questions:
-        add_question_if_not_exists(q)
+    Raises:
+        RuntimeError: Se o Parse Server responder com erro
+    """
+    # Buscar todas as questões do Parse Server (em páginas, sem o limite de 1000 por chamada)
+    questions = []
+    for item in iter_objects("Question", keys=QUESTION_KEYS):
+        # Converter para o formato esperado pelo frontend
+        question = {
+            "id": item.get("questionId"),
+            "number": item.get("number"),
+            "text": item.get("text"),
+            "type": item.get("type"),
+            "category": item.get("category"),
+            "options": item.get("options", [])
+        }
+        questions.append(question)
+    # A paginação segue a ordem de criação; o catálogo é servido na ordem do ENADE
+    questions.sort(key=lambda q: q["number"] if q["number"] is not None else float("inf"))
     
-    # Adicionar questões de exemplo para completar o conjunto
-    if len(questions) < 20:
-        for i in range(len(questions) + 1, 21):
-            category = ""
-            question_type = ""
-            
-            if i <= 10:
-                category = "dados-pessoais"
-                question_type = "multiple-choice"
-            elif i <= 19:
-                category = "formacao"
-                question_type = "multiple-choice"
-            else:
-                category = "academico"
-                question_type = "likert"
-            
-            options = []
-            if question_type == "multiple-choice":
-                options = [
-                    {"label": "A", "text": f"Opção A para questão {i}"},
-                    {"label": "B", "text": f"Opção B para questão {i}"},
-                    {"label": "C", "text": f"Opção C para questão {i}"},
-                    {"label": "D", "text": f"Opção D para questão {i}"}
-                ]
-            else:  # likert
-                options = [
-                    {"label": "1", "text": "Discordo totalmente"},
-                    {"label": "2", "text": ""},
-                    {"label": "3", "text": ""},
-                    {"label": "4", "text": ""},
-                    {"label": "5", "text": ""},
-                    {"label": "6", "text": "Concordo totalmente"},
-                    {"label": "N", "text": "Não sei responder"},
-                    {"label": "NA", "text": "Não se aplica"}
-                ]
-            
-            add_question_if_not_exists({
-                "id": i,
-                "number": i,
-                "text": f"Questão exemplo {i}: {['Dados pessoais', 'Formação acadêmica', 'Avaliação'][i % 3]}",
-                "type": question_type,
-                "category": category,
-                "options": options
-            })
-    
-    # Adicionar questões de licenciatura
-    for i in range(50, 55):
-        add_question_if_not_exists({
-            "id": i,
-            "number": i,
-            "text": f"Competência {i-49}: Habilidade para aplicar conhecimentos na prática",
-            "type": "likert",
-            "category": "licenciatura",
-            "options": [
-                {"label": "1", "text": "Discordo totalmente"},
-                {"label": "2", "text": ""},
-                {"label": "3", "text": ""},
-                {"label": "4", "text": ""},
-                {"label": "5", "text": ""},
-                {"label": "6", "text": "Concordo totalmente"},
-                {"label": "N", "text": "Não sei responder"},
-                {"label": "NA", "text": "Não se aplica"}
-            ]
-        })
+    # Se não houver questões, recarregar o catálogo em segundo plano; enquanto isso
+    # o cache continua servindo o último snapshot (ou o data/questions.json empacotado)
+    if not questions:
+        job = job_scheduler.submit("reseed-catalog", owner=request_tenant().id)
+        raise RuntimeError(f"Nenhuma questão no Parse Server; recarga do catálogo agendada (job {job['id']})")
     
     return questions
 
-# Funções CRUD usando Parse REST API
+def current_catalog():
+    """
+    Retorna a versão atual do catálogo (CatalogSnapshot).
+    
+    Raises:
+        LimiterOverloaded: Se o Parse Server estiver indisponível e não houver snapshot local
+    """
+    try:
+        return tenant_catalog().questions.get()
+    except LimiterOverloaded:
+        raise
+    except Exception as e:
+        print(f"Erro ao carregar questões: {e}")
+        raise LimiterOverloaded("Catálogo de questões indisponível", 5.0)
 
 def load_questions():
     """
-    Carrega questões do Parse Server.
-    Se não existirem, cria questões de exemplo.
+    Carrega questões da versão atual do catálogo.
     
     Returns:
         list: Lista de questões
     """
-    try:
-        # Buscar todas as questões do Parse Server
-        url = f"{PARSE_SERVER_URL}/classes/Question"
-        params = {
-            "order": "number",
-            "limit": 1000  # Ajustar conforme necessário
-        }
-        
-        response = requests.get(url, headers=PARSE_HEADERS, params=params)
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Converter para o formato esperado pelo frontend
-            questions = []
-            for item in result.get("results", []):
-                question = {
-                    "id": item.get("questionId"),
-                    "number": item.get("number"),
-                    "text": item.get("text"),
-                    "type": item.get("type"),
-                    "category": item.get("category"),
-                    "options": item.get("options", [])
-                }
-                questions.append(question)
-            
-            # Se não houver questões, criar questões de exemplo
-            if not questions:
-                print("Nenhuma questão encontrada. Criando questões de exemplo...")
-                questions = extract_questions_from_pdf()
-                save_questions(questions)
-            
-            return questions
-        else:
-            print(f"Erro ao carregar questões: {response.status_code} - {response.text}")
-            return extract_questions_from_pdf()
-    except Exception as e:
-        print(f"Erro ao carregar questões: {e}")
-        # Em caso de erro, criar questões de exemplo
-        return extract_questions_from_pdf()
+    return list(current_catalog().questions)
+
+def parsed_answers(record):
+    """
+    Pares [número, rótulo] de uma resposta, na versão do catálogo em que foi enviada
+    """
+    return tenant_catalog().answers.get(record, catalog_for(record.get("catalogVersion")))
+
+def catalog_for(version):
+    """
+    Retorna a versão fixada do catálogo, ou a atual se a versão não for
+    informada (questionários anteriores ao versionamento) ou não existir mais.
+    """
+    snapshot = tenant_catalog().store.get(version) if version is not None else None
+    if snapshot is None and version is not None and version not in missing_catalog_versions:
+        missing_catalog_versions.add(version)
+        print(f"Versão {version} do catálogo não encontrada; usando a versão atual")
+    return snapshot or current_catalog()
 
-def save_questions(questions):
+# Versões fixadas que não existem neste servidor (avisadas uma vez)
+missing_catalog_versions = set()
+
+def save_questions(questions, job=None):
     """
     Salva múltiplas questões no Parse Server
+    
+    Args:
+        questions (list): Questões a criar ou atualizar
+        job (JobContext, optional): Job em execução (progresso e cancelamento)
     """
     try:
-        for question in questions:
-            # Verificar se a questão já existe
-            query_url = f"{PARSE_SERVER_URL}/classes/Question"
-            params = {
-                "where": json.dumps({"questionId": question["id"]})
-            }
-            
-            response = requests.get(query_url, headers=PARSE_HEADERS, params=params)
+        for position, question in enumerate(questions):
+            if job is not None:
+                job.progress(position, len(questions))
+            # Verificar se a questão já existe (só o objectId interessa)
+            existing = find_objects("Question", {"questionId": question["id"]}, keys=("questionId",), limit=1)
             
-            if response.status_code == 200 and len(response.json().get("results", [])) > 0:
+            if existing:
                 # Atualizar questão existente
-                object_id = response.json()["results"][0]["objectId"]
+                object_id = existing[0]["objectId"]
                 update_url = f"{PARSE_SERVER_URL}/classes/Question/{object_id}"
                 
                 update_data = {
@@ -255,7 +350,7 @@ def save_questions(questions):
                     "options": question["options"]
                 }
                 
-                update_response = requests.put(update_url, headers=PARSE_HEADERS, data=json.dumps(update_data))
+                update_response = parse_request("PUT", update_url, data=json.dumps(update_data))
                 
                 if update_response.status_code != 200:
                     print(f"Erro ao atualizar questão: {update_response.status_code} - {update_response.text}")
@@ -272,43 +367,88 @@ def save_questions(questions):
                     "options": question["options"]
                 }
                 
-                create_response = requests.post(create_url, headers=PARSE_HEADERS, data=json.dumps(create_data))
+                create_response = parse_request("POST", create_url, data=json.dumps(create_data))
                 
                 if create_response.status_code != 201:
                     print(f"Erro ao criar questão: {create_response.status_code} - {create_response.text}")
         
+        # Nova versão com as questões alteradas; leitores da versão anterior não são afetados
+        state = tenant_catalog()
+        state.questions.set(state.store.apply(questions))
         return True
+    except (LimiterOverloaded, JobCancelled):
+        raise
     except Exception as e:
         print(f"Erro ao salvar questões: {e}")
         return False
 
+def fetch_questionnaires():
+    """
+    Busca todos os questionários no Parse Server
+    
+    Raises:
+        RuntimeError: Se o Parse Server responder com erro
+    """
+    # Todas as páginas: sem `limit`, o Parse Server devolveria só os 100 primeiros
+    questionnaires = []
+    for item in iter_objects("Questionnaire", keys=QUESTIONNAIRE_KEYS):
+        # Converter para o formato esperado pelo frontend
+        questionnaire = {
+            "id": item.get("questionnaireId"),
+            "title": item.get("title"),
+            "description": item.get("description"),
+            "question_ids": item.get("questionIds", []),
+            "created_at": item.get("createdAt", datetime.now().isoformat()),
+            "catalog_version": item.get("catalogVersion")
+        }
+        questionnaires.append(questionnaire)
+    
+    return questionnaires
+
+# Cache do catálogo: serve a última versão válida enquanto revalida em segundo plano
+# e, com o Parse Server fora do ar, recorre à última versão gravada (nunca a questões fictícias)
+CATALOG_CACHE_TTL = env_int("CATALOG_CACHE_TTL", 60)
+
+class TenantCatalog:
+    """
+    Catálogo, questionários, índice de busca e respostas convertidas de uma instituição
+    """
+    
+    def __init__(self, tenant):
+        catalog_dir = CATALOG_DIR if tenant.is_default else os.path.join(TENANT_CATALOG_DIR, tenant.id, "catalog")
+        # Versões imutáveis do catálogo: cada alteração gera uma nova versão, que
+        # reaproveita as questões inalteradas; questionários e respostas fixam a versão
+        self.store = CatalogStore(catalog_dir, bundled_path=os.path.join("data", "questions.json"))
+        self.questions = StaleWhileRevalidateCache(
+            tenant.storage_name("questions"), fetch_questions, CATALOG_CACHE_TTL, snapshot=self.store
+        )
+        self.questionnaires = StaleWhileRevalidateCache(
+            tenant.storage_name("questionnaires"), fetch_questionnaires, CATALOG_CACHE_TTL,
+            fallback_path=os.path.join("data", "questionnaires.json") if tenant.is_default else None
+        )
+        self.index = QuestionIndex()
+        # Respostas convertidas para (número da questão, rótulo), por objectId
+        self.answers = ParsedAnswerCache(max_entries=env_int("PARSED_ANSWER_CACHE_SIZE", 50000))
+        
+        # Servir o snapshot em disco imediatamente (ex.: após ser descartado do LRU)
+        self.questions.warm()
+        self.questionnaires.warm()
+
+# Estado por instituição, com as menos usadas descartadas da memória
+tenant_catalogs = TenantCaches(TenantCatalog)
+
+def tenant_catalog():
+    return tenant_catalogs.get(request_tenant())
+
 def load_questionnaires():
     """
-    Carrega todos os questionários do Parse Server
+    Carrega todos os questionários do cache do catálogo
     """
     try:
-        url = f"{PARSE_SERVER_URL}/classes/Questionnaire"
-        response = requests.get(url, headers=PARSE_HEADERS)
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Converter para o formato esperado pelo frontend
-            questionnaires = []
-            for item in result.get("results", []):
-                questionnaire = {
-                    "id": item.get("questionnaireId"),
-                    "title": item.get("title"),
-                    "description": item.get("description"),
-                    "question_ids": item.get("questionIds", []),
-                    "created_at": item.get("createdAt", datetime.now().isoformat())
-                }
-                questionnaires.append(questionnaire)
-            
-            return questionnaires
-        else:
-            print(f"Erro ao carregar questionários: {response.status_code} - {response.text}")
-            return []
+        # Cópias rasas: os endpoints expandem e removem campos dos dicionários
+        return [dict(q) for q in tenant_catalog().questionnaires.get()]
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print(f"Erro ao carregar questionários: {e}")
         return []
@@ -319,25 +459,22 @@ def save_questionnaire(questionnaire_data):
     """
     try:
         # Verificar se o questionário já existe
-        query_url = f"{PARSE_SERVER_URL}/classes/Questionnaire"
-        params = {
-            "where": json.dumps({"questionnaireId": questionnaire_data["id"]})
-        }
-        
-        response = requests.get(query_url, headers=PARSE_HEADERS, params=params)
+        existing = find_objects("Questionnaire", {"questionnaireId": questionnaire_data["id"]},
+                                keys=("questionnaireId",), limit=1)
         
-        if response.status_code == 200 and len(response.json().get("results", [])) > 0:
+        if existing:
             # Atualizar questionário existente
-            object_id = response.json()["results"][0]["objectId"]
+            object_id = existing[0]["objectId"]
             update_url = f"{PARSE_SERVER_URL}/classes/Questionnaire/{object_id}"
             
             update_data = {
                 "title": questionnaire_data["title"],
                 "description": questionnaire_data["description"],
-                "questionIds": questionnaire_data["question_ids"]
+                "questionIds": questionnaire_data["question_ids"],
+                "catalogVersion": questionnaire_data.get("catalog_version")
             }
             
-            update_response = requests.put(update_url, headers=PARSE_HEADERS, data=json.dumps(update_data))
+            update_response = parse_request("PUT", update_url, data=json.dumps(update_data))
             
             if update_response.status_code != 200:
                 print(f"Erro ao atualizar questionário: {update_response.status_code} - {update_response.text}")
@@ -351,16 +488,20 @@ def save_questionnaire(questionnaire_data):
                 "title": questionnaire_data["title"],
                 "description": questionnaire_data["description"],
                 "questionIds": questionnaire_data["question_ids"],
+                "catalogVersion": questionnaire_data.get("catalog_version"),
                 "createdAt": questionnaire_data.get("created_at", datetime.now().isoformat())
             }
             
-            create_response = requests.post(create_url, headers=PARSE_HEADERS, data=json.dumps(create_data))
+            create_response = parse_request("POST", create_url, data=json.dumps(create_data))
             
             if create_response.status_code != 201:
                 print(f"Erro ao criar questionário: {create_response.status_code} - {create_response.text}")
                 return False
         
+        tenant_catalog().questionnaires.invalidate()
         return True
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print(f"Erro ao salvar questionário: {e}")
         return False
@@ -371,68 +512,91 @@ def delete_questionnaire(questionnaire_id):
     """
     try:
         # Encontrar o objectId do questionário
-        query_url = f"{PARSE_SERVER_URL}/classes/Questionnaire"
-        params = {
-            "where": json.dumps({"questionnaireId": questionnaire_id})
-        }
-        
-        response = requests.get(query_url, headers=PARSE_HEADERS, params=params)
+        existing = find_objects("Questionnaire", {"questionnaireId": questionnaire_id},
+                                keys=("questionnaireId",), limit=1)
         
-        if response.status_code == 200 and len(response.json().get("results", [])) > 0:
-            object_id = response.json()["results"][0]["objectId"]
+        if existing:
+            object_id = existing[0]["objectId"]
             
             # Excluir o questionário
             delete_url = f"{PARSE_SERVER_URL}/classes/Questionnaire/{object_id}"
-            delete_response = requests.delete(delete_url, headers=PARSE_HEADERS)
+            delete_response = parse_request("DELETE", delete_url)
             
             if delete_response.status_code != 200:
                 print(f"Erro ao excluir questionário: {delete_response.status_code} - {delete_response.text}")
                 return False
             
+            tenant_catalog().questionnaires.invalidate()
             return True
         else:
             print("Questionário não encontrado")
             return False
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print(f"Erro ao excluir questionário: {e}")
         return False
 
-def load_responses():
+def load_responses(include_archived=True, keys=RESPONSE_KEYS, raise_errors=False):
     """
-    Carrega todas as respostas do Parse Server
+    Carrega todas as respostas do Parse Server e, opcionalmente, da camada arquivada
+    
+    Args:
+        include_archived (bool): Incluir respostas de ciclos anteriores já arquivadas
+        keys (tuple): Campos lidos do Parse Server (ex.: RESPONSE_ANALYSIS_KEYS,
+            sem os dados pessoais, para estatísticas e relatórios)
+        raise_errors (bool): Propagar erros do Parse Server em vez de retornar uma
+            lista vazia (jobs que marcam dados como completos)
     """
     try:
-        url = f"{PARSE_SERVER_URL}/classes/Response"
-        params = {
-            "order": "-createdAt",
-            "limit": 1000  # Ajustar conforme necessário
-        }
-        
-        response = requests.get(url, headers=PARSE_HEADERS, params=params)
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Converter para o formato esperado pelo frontend
-            responses = []
-            for item in result.get("results", []):
-                resp = {
-                    "studentName": item.get("studentName", ""),
-                    "studentId": item.get("studentId", ""),
-                    "studentEmail": item.get("studentEmail", ""),
-                    "questionnaire": item.get("questionnaire", ""),
-                    "submissionDate": item.get("createdAt", datetime.now().isoformat()),
-                    "responses": item.get("responses", [])
-                }
-                responses.append(resp)
-            
-            return responses
-        else:
-            print(f"Erro ao carregar respostas: {response.status_code} - {response.text}")
-            return []
+        # Todas as páginas, das mais recentes para as mais antigas
+        responses = list(iter_responses(keys=keys))
+        responses.reverse()
+    except LimiterOverloaded:
+        raise
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Erro ao carregar respostas: {e}")
-        return []
+        responses = []
+    
+    # A camada arquivada (data/archive) pertence à instituição padrão
+    if include_archived and request_tenant().is_default:
+        # As respostas arquivadas são sempre mais antigas que as da camada quente;
+        # o objectId evita duplicatas se um arquivamento foi interrompido
+        hot_ids = {r["objectId"] for r in responses}
+        responses.extend(r for r in iter_archived() if r.get("objectId") not in hot_ids)
+    
+    return responses
+
+def pinned_catalog_version(questionnaire_title):
+    """
+    Versão do catálogo fixada pelo questionário (ou a atual, se ele não fixa nenhuma)
+    """
+    for questionnaire in load_questionnaires():
+        if questionnaire.get("title") == questionnaire_title and questionnaire.get("catalog_version"):
+            return questionnaire["catalog_version"]
+    return current_catalog().version
+
+def response_payload(response_data):
+    """
+    Monta o registro de uma resposta no formato gravado no Parse Server
+    """
+    data = {
+        "studentName": response_data.get("studentName", ""),
+        "studentId": response_data.get("studentId", ""),
+        "studentEmail": response_data.get("studentEmail", ""),
+        "questionnaire": response_data.get("questionnaire", ""),
+        "responses": response_data.get("responses", []),
+        # Versão do catálogo com o enunciado que o aluno efetivamente viu
+        "catalogVersion": pinned_catalog_version(response_data.get("questionnaire", ""))
+    }
+    # Forma estruturada (número da questão, rótulo), para que análises e
+    # exportações não precisem reinterpretar o texto das respostas
+    parser = tenant_catalog().answers.parser_for(catalog_for(data["catalogVersion"]))
+    data["parsedAnswers"] = parser.parse(data["responses"])
+    data["parserVersion"] = PARSER_VERSION
+    return data
 
 def save_response(response_data):
     """
@@ -441,28 +605,335 @@ def save_response(response_data):
     try:
         # Criar nova resposta
         url = f"{PARSE_SERVER_URL}/classes/Response"
+        data = response_payload(response_data)
         
-        data = {
-            "studentName": response_data.get("studentName", ""),
-            "studentId": response_data.get("studentId", ""),
-            "studentEmail": response_data.get("studentEmail", ""),
-            "questionnaire": response_data.get("questionnaire", ""),
-            "responses": response_data.get("responses", [])
-        }
-        
-        response = requests.post(url, headers=PARSE_HEADERS, data=json.dumps(data))
+        response = parse_request("POST", url, data=json.dumps(data))
         
         if response.status_code != 201:
             print(f"Erro ao salvar resposta: {response.status_code} - {response.text}")
             return False
         
+        created = response.json()
+        on_response_saved(response_from_parse(dict(data, **created)))
         return True
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print(f"Erro ao salvar resposta: {e}")
         return False
 
+# Chaves de idempotência das respostas enviadas pelo formulário offline
+idempotency_ledger = IdempotencyLedger()
+
+def saved_idempotency_keys(keys):
+    """
+    Chaves que já têm resposta gravada no Parse Server -> objectId
+    """
+    where = {"idempotencyKey": {"$in": list(keys)}}
+    results = find_objects("Response", where, keys=("idempotencyKey",), limit=len(keys))
+    return {item["idempotencyKey"]: item["objectId"] for item in results}
+
+def save_response_batch(submissions):
+    """
+    Salva um lote de respostas enfileiradas pelo formulário offline.
+    
+    Cada resposta traz uma `idempotencyKey` gerada no navegador; reenvios de
+    uma resposta já gravada (conexão caiu antes da confirmação, por exemplo)
+    são reconhecidos e não geram uma segunda gravação.
+    
+    Args:
+        submissions (list): Respostas no formato de `save_response`, com "idempotencyKey"
+    
+    Returns:
+        list: Um resultado por resposta, na mesma ordem: {"idempotencyKey", "status", ...}
+            com status "created", "duplicate", "pending" (em gravação por outro
+            lote; reenviar depois), "invalid" ou "error"
+    """
+    tenant_id = request_tenant().id
+    results = {}
+    valid = {}
+    keys = []
+    for submission in submissions:
+        key = submission.get("idempotencyKey") if isinstance(submission, dict) else None
+        if not isinstance(key, str) or not IDEMPOTENCY_KEY.match(key) or key in results:
+            continue
+        try:
+            valid[key] = ResponseSubmission.parse_obj(submission).dict(exclude_none=True)
+        except ValidationError:
+            # Uma resposta malformada não pode travar a fila do navegador nem o resto do lote
+            results[key] = {"status": "invalid"}
+            continue
+        keys.append(key)
+        results[key] = None
+    
+    claimed, known = idempotency_ledger.claim(keys, tenant_id)
+    for key, object_id in known.items():
+        results[key] = {"status": "duplicate", "objectId": object_id} if object_id else {"status": "pending"}
+    
+    try:
+        if claimed:
+            # Chaves gravadas por outro processo ou antes de um reinício
+            for key, object_id in saved_idempotency_keys(claimed).items():
+                if key in results and results[key] is None:
+                    idempotency_ledger.remember(key, object_id, tenant_id)
+                    results[key] = {"status": "duplicate", "objectId": object_id}
+        
+        pending = []
+        for submission in submissions:
+            key = submission.get("idempotencyKey") if isinstance(submission, dict) else None
+            if key in results and results[key] is None:
+                # Primeira ocorrência da chave no lote
+                results[key] = {"status": "queued"}
+                pending.append((key, dict(response_payload(valid[key]), idempotencyKey=key)))
+        
+        for i in range(0, len(pending), PARSE_BATCH_SIZE):
+            chunk = pending[i:i + PARSE_BATCH_SIZE]
+            body = {"requests": [
+                {"method": "POST", "path": batch_path("/classes/Response"), "body": data} for _, data in chunk
+            ]}
+            response = parse_request("POST", f"{PARSE_SERVER_URL}/batch", data=json.dumps(body))
+            if response.status_code != 200:
+                print(f"Erro ao salvar lote de respostas: {response.status_code} - {response.text}")
+                outcomes = [{}] * len(chunk)
+            else:
+                outcomes = response.json()
+            for (key, data), outcome in zip(chunk, outcomes):
+                created = outcome.get("success")
+                if created and created.get("objectId"):
+                    idempotency_ledger.remember(key, created["objectId"], tenant_id)
+                    results[key] = {"status": "created", "objectId": created["objectId"]}
+                    on_response_saved(response_from_parse(dict(data, **created)))
+                else:
+                    idempotency_ledger.release(key, tenant_id)
+                    results[key] = {"status": "error"}
+    finally:
+        # Chaves reservadas que não chegaram a ser gravadas (erro ou sobrecarga no meio do lote)
+        for key in claimed:
+            if results.get(key) is None or results[key]["status"] == "queued":
+                idempotency_ledger.release(key, tenant_id)
+    
+    out = []
+    for submission in submissions:
+        key = submission.get("idempotencyKey") if isinstance(submission, dict) else None
+        if key in results:
+            # Uma chave repetida dentro do lote recebe o mesmo resultado da primeira ocorrência
+            out.append(dict(results[key], idempotencyKey=key))
+        else:
+            out.append({"idempotencyKey": key, "status": "invalid"})
+    return out
+
+# Canal de eventos em tempo real para os painéis de acompanhamento
+response_hub = BroadcastHub(
+    buffer_size=env_int("STREAM_BUFFER_SIZE", 100),
+    max_clients=env_int("STREAM_MAX_CLIENTS", 200)
+)
+# Contadores por instituição (desde o início do processo)
+response_counters = {}
+STREAM_MAX_QUESTIONNAIRES = env_int("STREAM_MAX_QUESTIONNAIRES", 1000)
+
+def tenant_counters(tenant_id):
+    counters = response_counters.get(tenant_id)
+    if counters is None:
+        counters = response_counters.setdefault(tenant_id, ResponseCounters(STREAM_MAX_QUESTIONNAIRES))
+    return counters
+
+# Estatísticas das questões Likert, atualizadas a cada resposta recebida
+likert_stats = LikertStats()
+# Bitmaps por alternativa marcada, para recortes por coorte (/api/cohorts)
+cohort_index = CohortIndex()
+
+def on_response_saved(record):
+    """
+    Executado depois que uma resposta é gravada no Parse Server
+    """
+    tenant = request_tenant()
+    answers = parsed_answers(record)
+    counters = tenant_counters(tenant.id).add(record, answers)
+    likert_stats.add(record, tenant.id)
+    cohort_index.add(record, answers, tenant.id)
+    response_hub.publish_threadsafe("response", {"response": record, "counters": counters}, topic=tenant.id)
+
+# Tarefas de manutenção: executadas em segundo plano e acompanhadas por /api/jobs,
+# para que nenhuma requisição faça trabalho em massa
+job_scheduler = JobScheduler()
+
+def migrate_questions_job(job):
+    # Rotina administrativa: carregada apenas no primeiro uso
+    from admin import migrate_questions
+    return migrate_questions(job)
+
+def reseed_catalog(job):
+    """
+    Recria no Parse Server as questões do catálogo empacotado (data/questions.json),
+    apenas quando a classe Question está vazia; caso contrário não altera nada
+    """
+    existing = count_objects("Question")
+    if existing:
+        return {"status": "skipped", "questions": existing}
+    bundled_path = tenant_catalog().store.bundled_path
+    if not os.path.exists(bundled_path):
+        raise RuntimeError(f"Catálogo empacotado não encontrado: {bundled_path}")
+    with open(bundled_path, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    if not save_questions(questions, job):
+        raise RuntimeError("Erro ao salvar questões")
+    return {"status": "success", "questions": len(questions), "catalog_version": current_catalog().version}
+
+def rebuild_likert_stats(job):
+    """
+    Recalcula as estatísticas Likert da instituição a partir das respostas gravadas
+    """
+    tenant_id = request_tenant().id
+    job.progress(0, message="Lendo respostas gravadas")
+    # Um erro do Parse Server falha o job: índice vazio não pode ficar marcado como pronto
+    records = load_responses(keys=("questionnaire", "responses"), raise_errors=True)
+    job.check()
+    likert_stats.rebuild(records, tenant_id)
+    return {"responses": len(records), "ready": likert_stats.is_ready(tenant_id)}
+
+def rebuild_cohort_index(job):
+    """
+    Monta o índice de coortes da instituição a partir das respostas gravadas
+    """
+    tenant_id = request_tenant().id
+    job.progress(0, message="Lendo respostas gravadas")
+    records = load_responses(keys=RESPONSE_ANALYSIS_KEYS, raise_errors=True)
+    job.check()
+    cohort_index.rebuild(records, parsed_answers, tenant_id)
+    return {"responses": len(records), "ready": cohort_index.is_ready(tenant_id)}
+
+def archive_responses_job(job):
+    # Também submetido via POST /api/jobs: a checagem não pode ficar só no endpoint
+    if not request_tenant().is_default:
+        raise RuntimeError("Arquivamento disponível apenas para a instituição padrão")
+    return archive_responses(parse_cutoff(job.params.get("before")), job)
+
+def backfill_parsed_answers_job(job):
+    return backfill_parsed_answers(tenant_catalog().answers, catalog_for, job)
+
+def warm_caches(job):
+    """
+    Carrega catálogo, questionários, índice de busca e parsers das versões fixadas
+    """
+    state = tenant_catalog()
+    job.progress(0, 4, "Catálogo de questões")
+    catalog = state.questions.get()
+    job.progress(1, 4, "Questionários")
+    questionnaires = state.questionnaires.get()
+    job.progress(2, 4, "Índice de busca")
+    state.index.sync(catalog.questions, source=catalog)
+    job.progress(3, 4, "Parsers das versões fixadas")
+    versions = {q.get("catalog_version") for q in questionnaires}
+    for version in versions:
+        state.answers.parser_for(catalog_for(version))
+    return {
+        "catalog_version": catalog.version,
+        "questions": len(catalog.questions),
+        "questionnaires": len(questionnaires),
+        "parsers": len(versions),
+    }
+
+def iter_all_responses(questionnaire=None, keys=RESPONSE_KEYS):
+    """
+    Percorre as respostas da instituição (Parse Server e, na instituição padrão,
+    a camada arquivada) sem carregá-las todas em memória, ao contrário de `load_responses()`
+    """
+    where = {"questionnaire": questionnaire} if questionnaire else None
+    if not request_tenant().is_default:
+        yield from iter_responses(where, keys)
+        return
+    
+    # Uma resposta só aparece nas duas camadas se um arquivamento foi interrompido;
+    # basta lembrar as da camada quente mais antigas que o último segmento arquivado
+    newest_archived = archive_summary()["newest"]
+    overlap = set()
+    for record in iter_responses(where, keys):
+        if newest_archived and record["submissionDate"] <= newest_archived:
+            overlap.add(record["objectId"])
+        yield record
+    for record in iter_archived(questionnaire=questionnaire):
+        if record.get("objectId") not in overlap:
+            yield record
+
+def export_microdata_job(job):
+    """
+    Exporta as respostas no leiaute dos microdados do ENADE (INEP)
+    
+    Parâmetros do job: format ("csv" ou "txt"), partition (um arquivo por curso),
+    questionnaire (título, opcional)
+    """
+    tenant = request_tenant()
+    state = tenant_catalog()
+    layout = MicrodataLayout(current_catalog().questions)
+    # O código do curso é o identificador do questionário respondido
+    courses = {q.get("title"): q.get("id") or 0 for q in load_questionnaires()}
+    
+    def answers_of(record):
+        if record.get("parserVersion") == PARSER_VERSION and record.get("parsedAnswers") is not None:
+            return record["parsedAnswers"]
+        # Sem passar pelo cache de respostas convertidas: cada resposta é lida uma única vez
+        return state.answers.parser_for(catalog_for(record.get("catalogVersion"))).parse(record.get("responses", []))
+    
+    return export_microdata(
+        iter_all_responses(job.params.get("questionnaire"), RESPONSE_ANALYSIS_KEYS),
+        layout,
+        answers_of,
+        lambda record: courses.get(record.get("questionnaire"), 0),
+        fmt=job.params.get("format", "csv"),
+        partition=bool(job.params.get("partition")),
+        name=f"microdados_{tenant.id}_{job.id}",
+        job=job,
+    )
+
+job_scheduler.register("migrate-questions", migrate_questions_job)
+job_scheduler.register("reseed-catalog", reseed_catalog)
+job_scheduler.register("rebuild-likert-stats", rebuild_likert_stats)
+job_scheduler.register("rebuild-cohort-index", rebuild_cohort_index)
+job_scheduler.register("backfill-parsed-answers", backfill_parsed_answers_job)
+job_scheduler.register("archive-responses", archive_responses_job)
+job_scheduler.register("warm-caches", warm_caches)
+job_scheduler.register("export-microdata", export_microdata_job, exclusive=False)
+
+@app.on_event("startup")
+async def startup():
+    response_hub.bind(asyncio.get_running_loop())
+    
+    if traffic_capture.enabled:
+        print(f"Captura de tráfego ativa: {traffic_capture.start()}")
+    if parse_fixtures.active:
+        print(f"Parse Server respondido pelas chamadas gravadas ({parse_fixtures.stats()['calls']} chamadas)")
+    
+    # Recuperar rascunhos gravados e iniciar a gravação periódica
+    await run_in_threadpool(draft_store.load)
+    draft_store.start()
+    
+    # Histogramas de tempo por questão e gravação periódica dos eventos
+    await run_in_threadpool(telemetry.load)
+    telemetry.start()
+    
+    # Diretório para armazenar arquivos estáticos
+    os.makedirs("static", exist_ok=True)
+    
+    # Verificar se existe pelo menos um arquivo HTML na pasta static
+    index_path = os.path.join("static", "index.html")
+    if not os.path.exists(index_path):
+        print("AVISO: index.html não encontrado na pasta static.")
+    
+    # Registro dos jobs anteriores (os interrompidos por um reinício ficam marcados)
+    await run_in_threadpool(job_scheduler.load)
+    
+    # Carregar o catálogo da instituição padrão antes da primeira requisição de um aluno
+    # (snapshot em disco; as demais instituições são carregadas no primeiro acesso)
+    await run_in_threadpool(tenant_catalog)
+    
+    # Estatísticas Likert e aquecimento dos caches em segundo plano, sem segurar o startup
+    owner = request_tenant().id
+    job_scheduler.submit("rebuild-likert-stats", owner=owner)
+    job_scheduler.submit("warm-caches", owner=owner)
+
 # Montar diretório estático - deve vir ANTES das rotas da API para evitar conflitos
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# (o diretório é criado no startup, por isso não é verificado aqui)
+app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
 
 # Rotas da API
 @app.get("/api")
@@ -471,7 +942,8 @@ def read_root():
 
 @app.get("/api/test")
 async def test_api():
-    return {"status": "success", "message": "API está online"}
+    # A instituição é gravada nos formulários exportados (cabeçalho X-Tenant-Id)
+    return {"status": "success", "message": "API está online", "tenant": request_tenant().id}
 
 # Endpoint de status específico
 @app.get("/api/status")
@@ -479,154 +951,77 @@ def get_status():
     """
     Endpoint de status para verificar se a API está funcionando
     """
-    try:
-        # Verificar se as credenciais do Parse Server estão configuradas
-        if not PARSE_APP_ID or not PARSE_REST_API_KEY:
-            return {
-                "status": "warning",
-                "message": "Parse Server credentials not configured",
-                "environment": "back4app"
-            }
-        
-        # Tentar fazer uma requisição simples ao Parse Server
-        test_url = f"{PARSE_SERVER_URL}/classes/Question"
-        params = {"limit": 1}
-        
-        response = requests.get(test_url, headers=PARSE_HEADERS, params=params)
-        
-        if response.status_code == 200:
-            # Contar itens em cada coleção
-            questions_response = requests.get(f"{PARSE_SERVER_URL}/classes/Question", headers=PARSE_HEADERS, params={"count": 1, "limit": 0})
-            questionnaires_response = requests.get(f"{PARSE_SERVER_URL}/classes/Questionnaire", headers=PARSE_HEADERS, params={"count": 1, "limit": 0})
-            responses_response = requests.get(f"{PARSE_SERVER_URL}/classes/Response", headers=PARSE_HEADERS, params={"count": 1, "limit": 0})
-            
-            return {
-                "status": "online",
-                "database": "Parse Server",
-                "counts": {
-                    "questions": questions_response.json().get("count", 0) if questions_response.status_code == 200 else "error",
-                    "questionnaires": questionnaires_response.json().get("count", 0) if questionnaires_response.status_code == 200 else "error",
-                    "responses": responses_response.json().get("count", 0) if responses_response.status_code == 200 else "error"
-                },
-                "version": "1.0.0",
-                "environment": "back4app",
-                "parse_app_id": PARSE_APP_ID[:4] + "..." if PARSE_APP_ID else "not set"
-            }
-        else:
-            return {
-                "status": "error",
-                "message": f"Parse Server connection failed with status {response.status_code}",
-                "error": response.text[:100] + "..." if len(response.text) > 100 else response.text
-            }
-    except Exception as e:
-        return {
-            "status": "error",
-            "error": str(e)
-        }
+    from admin import parse_status
+    return parse_status()
+
+def catalog_response(request, snapshot):
+    """
+    Serve o catálogo já serializado, com ETag derivado da versão
+    (304 se o cliente já tem esta versão)
+    """
+    headers = {"ETag": snapshot.etag, "X-Catalog-Version": str(snapshot.version)}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.json_bytes(), media_type="application/json", headers=headers)
 
 # Rota para servir o arquivo de questões em JSON diretamente
 @app.get("/questions.json")
-def get_questions_json():
-    return load_questions()
+def get_questions_json(request: Request):
+    return catalog_response(request, current_catalog())
 
 @app.get("/api/questions", response_model=List[Question])
-def get_questions():
-    return load_questions()
+def get_questions(request: Request):
+    return catalog_response(request, current_catalog())
+
+@app.get("/api/catalog")
+def get_catalog():
+    """
+    Versão atual do catálogo de questões
+    """
+    return current_catalog().summary()
+
+@app.get("/api/catalog/versions")
+def get_catalog_versions():
+    return tenant_catalog().store.versions()
+
+@app.get("/api/catalog/versions/{version}")
+def get_catalog_version(version: str, request: Request):
+    snapshot = tenant_catalog().store.get(version)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Versão do catálogo não encontrada")
+    return catalog_response(request, snapshot)
+
+@app.get("/api/questions/search")
+def search_questions(q: str = "", category: Optional[str] = None, type: Optional[str] = None,
+                     page: int = 1, page_size: int = 20):
+    """
+    Busca textual no banco de questões, com facetas por categoria e tipo
+    """
+    # O índice só é reconstruído (de forma incremental) quando o catálogo muda
+    catalog = current_catalog()
+    index = tenant_catalog().index
+    index.sync(catalog.questions, source=catalog)
+    return index.search(
+        q,
+        filters={"category": category, "type": type},
+        page=page,
+        page_size=max(1, min(page_size, 1000))
+    )
 
 @app.get("/api/migrate-questions")
 def migrate_questions_endpoint():
-    try:
-        # Definir o caminho do arquivo JSON
-        DATA_DIR = "data"
-        QUESTIONS_FILE = os.path.join(DATA_DIR, "questions.json")
-        
-        # Criar diretório se não existir
-        os.makedirs(DATA_DIR, exist_ok=True)
-        
-        # Verificar quais questões já existem no Parse Server
-        existing_url = f"{PARSE_SERVER_URL}/classes/Question"
-        params = {"limit": 1000}
-        response = requests.get(existing_url, headers=PARSE_HEADERS, params=params)
-        
-        existing_ids = set()
-        if response.status_code == 200:
-            for item in response.json().get("results", []):
-                existing_ids.add(item.get("questionId"))
-        
-        print(f"Encontradas {len(existing_ids)} questões já existentes no Parse Server")
-        
-        # Carregar todas as questões do arquivo JSON
-        if os.path.exists(QUESTIONS_FILE):
-            with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
-                all_questions = json.load(f)
-            
-            print(f"Carregadas {len(all_questions)} questões do arquivo JSON")
-            
-            # Identificar questões faltantes
-            missing_questions = [q for q in all_questions if q["id"] not in existing_ids]
-            print(f"Identificadas {len(missing_questions)} questões faltantes")
-            
-            # Migrar cada questão faltante
-            migrated_count = 0
-            for question in missing_questions:
-                try:
-                    # Preparar dados para o Parse Server
-                    question_data = {
-                        "questionId": question["id"],
-                        "number": question["number"],
-                        "text": question["text"],
-                        "type": question["type"],
-                        "category": question["category"],
-                        "options": question["options"]
-                    }
-                    
-                    # Criar a questão no Parse Server
-                    create_url = f"{PARSE_SERVER_URL}/classes/Question"
-                    create_response = requests.post(create_url, headers=PARSE_HEADERS, data=json.dumps(question_data))
-                    
-                    if create_response.status_code == 201:
-                        migrated_count += 1
-                    else:
-                        print(f"Erro ao migrar questão {question['id']}: {create_response.status_code} - {create_response.text}")
-                except Exception as e:
-                    print(f"Erro ao processar questão {question['id']}: {e}")
-            
-            # Retornar resultados
-            return {
-                "status": "success",
-                "total_in_json": len(all_questions),
-                "existing_in_parse": len(existing_ids),
-                "missing_identified": len(missing_questions),
-                "successfully_migrated": migrated_count,
-                "final_total": len(existing_ids) + migrated_count
-            }
-        else:
-            # Se o arquivo não existir, verificar se o arquivo foi implantado corretamente
-            return {
-                "status": "error",
-                "message": f"Arquivo JSON não encontrado: {QUESTIONS_FILE}",
-                "current_directory": os.getcwd(),
-                "files_in_data_dir": os.listdir(DATA_DIR) if os.path.exists(DATA_DIR) else "data dir not found"
-            }
-    except Exception as e:
-        print(f"Erro na migração: {e}")
-        return {
-            "status": "error",
-            "message": str(e)
-        }
-        
+    """
+    Agenda a migração das questões de data/questions.json (acompanhar em /api/jobs/{id})
+    """
+    return JSONResponse(status_code=202, content=job_scheduler.submit("migrate-questions", owner=request_tenant().id))
+
 @app.get("/api/questions/{question_id}", response_model=Question)
 def get_question(question_id: int):
     try:
-        query_url = f"{PARSE_SERVER_URL}/classes/Question"
-        params = {
-            "where": json.dumps({"questionId": question_id})
-        }
+        results = find_objects("Question", {"questionId": question_id}, keys=QUESTION_KEYS, limit=1)
         
-        response = requests.get(query_url, headers=PARSE_HEADERS, params=params)
-        
-        if response.status_code == 200 and len(response.json().get("results", [])) > 0:
-            item = response.json()["results"][0]
+        if results:
+            item = results[0]
             
             question = {
                 "id": item.get("questionId"),
@@ -640,6 +1035,8 @@ def get_question(question_id: int):
             return question
         else:
             raise HTTPException(status_code=404, detail="Questão não encontrada")
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print(f"Erro ao buscar questão: {e}")
         raise HTTPException(status_code=500, detail="Erro ao buscar questão")
@@ -648,11 +1045,9 @@ def get_question(question_id: int):
 def get_questionnaires():
     questionnaires = load_questionnaires()
     
-    # Expandir as questões em cada questionário
-    questions = load_questions()
-    questions_dict = {q["id"]: q for q in questions}
-    
+    # Expandir as questões em cada questionário, na versão do catálogo que ele fixou
     for q in questionnaires:
+        questions_dict = catalog_for(q.get("catalog_version")).by_id
         expanded_questions = []
         for qid in q.get("question_ids", []):
             if qid in questions_dict:
@@ -667,27 +1062,14 @@ def get_questionnaires():
 @app.get("/api/questionnaires/{questionnaire_id}", response_model=Questionnaire)
 def get_questionnaire(questionnaire_id: int):
     try:
-        query_url = f"{PARSE_SERVER_URL}/classes/Questionnaire"
-        params = {
-            "where": json.dumps({"questionnaireId": questionnaire_id})
-        }
-        
-        response = requests.get(query_url, headers=PARSE_HEADERS, params=params)
+        # Buscar no cache do catálogo (com fallback para o snapshot local)
+        matches = [q for q in load_questionnaires() if q.get("id") == questionnaire_id]
         
-        if response.status_code == 200 and len(response.json().get("results", [])) > 0:
-            item = response.json()["results"][0]
-            
-            questionnaire = {
-                "id": item.get("questionnaireId"),
-                "title": item.get("title"),
-                "description": item.get("description"),
-                "question_ids": item.get("questionIds", []),
-                "created_at": item.get("createdAt", datetime.now().isoformat())
-            }
+        if matches:
+            questionnaire = matches[0]
             
-            # Expandir as questões
-            questions = load_questions()
-            questions_dict = {q["id"]: q for q in questions}
+            # Expandir as questões na versão do catálogo fixada pelo questionário
+            questions_dict = catalog_for(questionnaire.get("catalog_version")).by_id
             
             expanded_questions = []
             for qid in questionnaire.get("question_ids", []):
@@ -703,6 +1085,8 @@ def get_questionnaire(questionnaire_id: int):
             return questionnaire
         else:
             raise HTTPException(status_code=404, detail="Questionário não encontrado")
+    except (HTTPException, LimiterOverloaded):
+        raise
     except Exception as e:
         print(f"Erro ao buscar questionário: {e}")
         raise HTTPException(status_code=500, detail="Erro ao buscar questionário")
@@ -713,24 +1097,14 @@ def create_questionnaire(questionnaire: QuestionnaireCreate):
         # Gerar ID para o novo questionário
         try:
             # Buscar o maior ID existente
-            query_url = f"{PARSE_SERVER_URL}/classes/Questionnaire"
-            params = {
-                "order": "-questionnaireId",
-                "limit": 1
-            }
-            
-            response = requests.get(query_url, headers=PARSE_HEADERS, params=params)
-            
-            if response.status_code == 200 and len(response.json().get("results", [])) > 0:
-                new_id = response.json()["results"][0].get("questionnaireId", 0) + 1
-            else:
-                new_id = 1
+            latest = find_objects("Questionnaire", keys=("questionnaireId",), order="-questionnaireId", limit=1)
+            new_id = latest[0].get("questionnaireId", 0) + 1 if latest else 1
         except Exception:
             new_id = 1
         
-        # Verificar se as questões existem
-        questions = load_questions()
-        questions_dict = {q["id"]: q for q in questions}
+        # Verificar se as questões existem e fixar a versão atual do catálogo
+        catalog = current_catalog()
+        questions_dict = catalog.by_id
         
         valid_question_ids = []
         for qid in questionnaire.questions:
@@ -743,7 +1117,8 @@ def create_questionnaire(questionnaire: QuestionnaireCreate):
             "title": questionnaire.title,
             "description": questionnaire.description,
             "question_ids": valid_question_ids,
-            "created_at": datetime.now().isoformat()
+            "created_at": datetime.now().isoformat(),
+            "catalog_version": catalog.version
         }
         
         # Salvar no Parse Server
@@ -757,8 +1132,11 @@ def create_questionnaire(questionnaire: QuestionnaireCreate):
             "title": questionnaire.title,
             "description": questionnaire.description,
             "questions": expanded_questions,
-            "created_at": new_questionnaire["created_at"]
+            "created_at": new_questionnaire["created_at"],
+            "catalog_version": catalog.version
         }
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print(f"Erro ao criar questionário: {e}")
         raise HTTPException(status_code=500, detail="Erro ao criar questionário")
@@ -771,6 +1149,8 @@ def delete_questionnaire_endpoint(questionnaire_id: int):
             raise HTTPException(status_code=404, detail="Questionário não encontrado")
         
         return {"message": "Questionário removido com sucesso"}
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print(f"Erro ao excluir questionário: {e}")
         raise HTTPException(status_code=500, detail="Erro ao excluir questionário")
@@ -814,22 +1194,568 @@ async def serve_js():
 """)
     return FileResponse(js_path, media_type="application/javascript")
 
+@app.get("/api/limits")
+def get_limits():
+    """
+    Contadores dos limitadores, do circuit breaker, do cache do catálogo
+    e do canal de eventos em tempo real (cotas e caches da instituição atual)
+    """
+    tenant = request_tenant()
+    state = tenant_catalog()
+    return {
+        "tenant": tenant.id,
+        "rate_limits": tenant.rate_limiter.stats(),
+        "tenant_concurrency": tenant.limiter.stats(),
+        "tenant_caches": tenant_catalogs.stats(),
+        "parse_concurrency": parse_limiter.stats(),
+        "parse_circuit": tenant_breaker(tenant).stats(),
+        "response_stream": response_hub.stats(),
+        "drafts": draft_store.stats(),
+        "telemetry": telemetry.stats(),
+        "traffic_capture": traffic_capture.stats(),
+        "parse_replay": parse_fixtures.stats() if parse_fixtures.active else None,
+        "reports": report_renderer.stats(),
+        "jobs": job_scheduler.stats(),
+        "content_encoding": encoding_stats.stats(),
+        "likert_stats": likert_stats.stats(),
+        "cohorts": cohort_index.stats(),
+        "offline_sync": idempotency_ledger.stats(),
+        "parsed_answers": state.answers.stats(),
+        "catalog_cache": {
+            "questions": state.questions.stats(),
+            "questionnaires": state.questionnaires.stats()
+        }
+    }
+
 @app.get("/api/responses")
-def get_all_responses():
-    return load_responses()
+def get_all_responses(include_archived: bool = True):
+    return load_responses(include_archived)
+
+@app.get("/api/stats/likert")
+def get_likert_stats(questionnaire: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None, category: Optional[str] = None):
+    """
+    Média, variância, mediana e IQR por questão Likert, sem "Não sei responder"
+    e "Não se aplica", por questionário e período (datas AAAA-MM-DD)
+    """
+    tenant = request_tenant()
+    if not likert_stats.is_ready(tenant.id) and not likert_stats.is_rebuilding(tenant.id):
+        # Primeiro acesso desta instituição: leitura única das respostas gravadas, em
+        # segundo plano ("ready" indica quando os números estão completos)
+        job_scheduler.submit("rebuild-likert-stats", owner=tenant.id)
+    
+    catalog = current_catalog()
+    by_text = {q["text"]: q for q in catalog.questions}
+    
+    questions = []
+    for text, accumulator in likert_stats.query(questionnaire, since, until, tenant.id).items():
+        question = by_text.get(text, {})
+        if category and question.get("category") != category:
+            continue
+        questions.append(dict(
+            accumulator.summary(),
+            question=text,
+            id=question.get("id"),
+            number=question.get("number"),
+            category=question.get("category")
+        ))
+    questions.sort(key=lambda q: (q["number"] is None, q["number"] or 0, q["question"]))
+    
+    return {
+        "ready": likert_stats.is_ready(tenant.id),
+        "questionnaire": questionnaire,
+        "since": since,
+        "until": until,
+        "questions": questions
+    }
+
+def ensure_cohort_index(tenant):
+    if not cohort_index.is_ready(tenant.id) and not cohort_index.is_rebuilding(tenant.id):
+        # Primeiro acesso desta instituição: o índice é montado em segundo plano
+        # ("ready" indica quando as contagens estão completas)
+        job_scheduler.submit("rebuild-cohort-index", owner=tenant.id)
+
+def cohort_summary(cohort_id, predicate, bitmap, questions, tenant):
+    """
+    Tamanho da coorte e distribuição das respostas em cada questão pedida
+    """
+    try:
+        by_number = {q["number"]: q for q in current_catalog().questions}
+    except LimiterOverloaded:
+        by_number = {}
+    distributions = []
+    for number in questions:
+        counts = cohort_index.distribution(bitmap, number, tenant.id)
+        answered = cohort_index.answered_count(bitmap, number, tenant.id)
+        question = by_number.get(number, {})
+        texts = {o.get("label"): o.get("text") for o in question.get("options") or []}
+        distributions.append({
+            "number": number,
+            "question": question.get("text"),
+            "answered": answered,
+            "options": [
+                {"label": label, "text": texts.get(label), "count": count,
+                 "percent": round(count / answered * 100, 1) if answered else None}
+                for label, count in counts.items()
+            ]
+        })
+    return {"id": cohort_id, "predicate": predicate, "size": len(bitmap), "distributions": distributions}
+
+@app.post("/api/cohorts", status_code=201)
+def create_cohort(cohort: CohortCreate, question: List[int] = Query([])):
+    """
+    Materializa a coorte de uma condição (ex.: questão 2 diferente de "A") e
+    retorna o id com que ela pode ser reutilizada em outras condições
+    """
+    tenant = request_tenant()
+    ensure_cohort_index(tenant)
+    try:
+        cohort_id, predicate, bitmap = cohort_index.cohort(cohort.predicate, tenant.id)
+    except InvalidPredicate as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return dict(cohort_summary(cohort_id, predicate, bitmap, question, tenant), ready=cohort_index.is_ready(tenant.id))
+
+@app.get("/api/cohorts/{cohort_id}")
+def get_cohort(cohort_id: str, question: List[int] = Query([])):
+    """
+    Distribuição das respostas de uma coorte já criada nas questões pedidas (?question=5&question=7)
+    """
+    tenant = request_tenant()
+    cached = cohort_index.get(cohort_id, tenant.id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Coorte não encontrada")
+    predicate, bitmap = cached
+    return dict(cohort_summary(cohort_id, predicate, bitmap, question, tenant), ready=cohort_index.is_ready(tenant.id))
+
+@app.post("/api/cohorts/compare")
+def compare_cohorts(comparison: CohortCompare):
+    """
+    Compara coortes lado a lado: tamanho, distribuição nas questões pedidas e
+    sobreposição (interseção e união) de cada par
+    """
+    tenant = request_tenant()
+    ensure_cohort_index(tenant)
+    if not comparison.cohorts:
+        raise HTTPException(status_code=400, detail="Informe ao menos uma coorte em \"cohorts\"")
+    materialized = {}
+    for name, predicate in comparison.cohorts.items():
+        try:
+            materialized[name] = cohort_index.cohort(predicate, tenant.id)
+        except InvalidPredicate as e:
+            raise HTTPException(status_code=400, detail=f"{name}: {e}")
+    
+    names = list(materialized)
+    overlaps = []
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            a, b = materialized[first][2], materialized[second][2]
+            intersection = a.intersection_count(b)
+            overlaps.append({"cohorts": [first, second], "intersection": intersection,
+                             "union": len(a) + len(b) - intersection})
+    return {
+        "ready": cohort_index.is_ready(tenant.id),
+        "cohorts": {
+            name: cohort_summary(cohort_id, predicate, bitmap, comparison.questions, tenant)
+            for name, (cohort_id, predicate, bitmap) in materialized.items()
+        },
+        "overlaps": overlaps
+    }
+
+def require_default_tenant():
+    # A camada arquivada é local e pertence à instituição padrão
+    if not request_tenant().is_default:
+        raise HTTPException(status_code=400, detail="Arquivamento disponível apenas para a instituição padrão")
+
+@app.get("/api/archive")
+def get_archive():
+    """
+    Resumo da camada arquivada de respostas
+    """
+    require_default_tenant()
+    return archive_summary()
+
+@app.post("/api/archive/responses", status_code=202)
+def archive_responses_endpoint(before: Optional[str] = None):
+    """
+    Agenda o arquivamento das respostas anteriores a `before` (padrão:
+    ARCHIVE_CYCLE_DAYS atrás); acompanhar em /api/jobs/{id}
+    """
+    require_default_tenant()
+    try:
+        cutoff = parse_cutoff(before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job_scheduler.submit("archive-responses", {"before": cutoff}, owner=request_tenant().id)
+
+@app.post("/api/responses/parsed/backfill", status_code=202)
+def backfill_parsed_answers_endpoint():
+    """
+    Agenda a gravação da forma estruturada das respostas antigas
+    (executar uma vez por versão do parser; acompanhar em /api/jobs/{id})
+    """
+    return job_scheduler.submit("backfill-parsed-answers", owner=request_tenant().id)
+
+@app.get("/api/responses/stream")
+async def stream_responses(request: Request):
+    """
+    Server-Sent Events com cada nova resposta e os contadores das questões
+    respondidas (por número e rótulo, contados a partir de "since")
+    """
+    tenant = request_tenant()
+    subscription = response_hub.subscribe(topic=tenant.id)
+    if subscription is None:
+        raise LimiterOverloaded("Limite de painéis conectados atingido", 30.0)
+    
+    counters = tenant_counters(tenant.id).snapshot()
+    return StreamingResponse(
+        response_hub.stream(subscription, request.is_disconnected, initial=("hello", counters)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Rascunhos: o aluno envia só as respostas alteradas e retoma o preenchimento depois
+draft_store = DraftStore()
+
+@app.on_event("shutdown")
+def flush_drafts():
+    draft_store.flush()
+
+# Relatórios por questionário: gerados pelo job "generate-reports" e renderizados
+# em um pool de processos
+report_renderer = ReportRenderer()
+
+@app.on_event("shutdown")
+def stop_report_workers():
+    report_renderer.shutdown()
+
+def report_payloads(questionnaire_id=None):
+    """
+    Reúne os dados de cada questionário para a geração dos relatórios
+    (executado na thread do job, fora do caminho da requisição)
+    
+    Returns:
+        list: Um payload por questionário, com as questões na versão fixada
+    """
+    questionnaires = [
+        q for q in load_questionnaires()
+        if questionnaire_id is None or q.get("id") == questionnaire_id
+    ]
+    by_title = {}
+    for record in load_responses(include_archived=False, keys=RESPONSE_ANALYSIS_KEYS):
+        by_title.setdefault(record.get("questionnaire", ""), []).append({"answers": parsed_answers(record)})
+    
+    payloads = []
+    for questionnaire in questionnaires:
+        catalog = catalog_for(questionnaire.get("catalog_version"))
+        payloads.append({
+            "questionnaire": {
+                "id": questionnaire.get("id"),
+                "title": questionnaire.get("title"),
+                "description": questionnaire.get("description"),
+                "catalog_version": catalog.version
+            },
+            "questions": [catalog.by_id[qid] for qid in questionnaire.get("question_ids", []) if qid in catalog.by_id],
+            "responses": by_title.get(questionnaire.get("title"), [])
+        })
+    return payloads
+
+def generate_reports_job(job):
+    """
+    Gera os relatórios de um questionário (questionnaire_id) ou de todos, no formato `format`
+    """
+    fmt = job.params.get("format", "html")
+    check_format(fmt)
+    job.progress(0, message="Reunindo respostas")
+    payloads = report_payloads(job.params.get("questionnaire_id"))
+    job.check()
+    return report_renderer.render_all(payloads, fmt, job, request_tenant().id)
+
+job_scheduler.register("generate-reports", generate_reports_job, exclusive=False)
+
+@app.post("/api/reports", status_code=202)
+def create_reports(questionnaire_id: Optional[int] = None, format: str = "html"):
+    """
+    Enfileira a geração dos relatórios (de um questionário ou de todos);
+    os arquivos gerados ficam em "result" do job
+    """
+    try:
+        check_format(format)
+    except ReportFormatUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    params = {"questionnaire_id": questionnaire_id, "format": format}
+    return job_scheduler.submit("generate-reports", params, owner=request_tenant().id)
+
+@app.get("/api/reports/jobs")
+def get_report_jobs():
+    return job_scheduler.jobs(request_tenant().id, kind="generate-reports")
+
+@app.get("/api/reports/jobs/{job_id}")
+def get_report_job(job_id: str):
+    job = job_scheduler.get(job_id, request_tenant().id)
+    if job is None or job["kind"] != "generate-reports":
+        raise HTTPException(status_code=404, detail="Job de relatórios não encontrado")
+    return job
+
+@app.get("/api/reports/files/{key}.{fmt}")
+def get_report_file(key: str, fmt: str):
+    if fmt not in ("html", "pdf") or len(key) != 64 or any(c not in "0123456789abcdef" for c in key):
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    path = report_path(key, fmt, request_tenant().id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    return FileResponse(path, media_type="text/html" if fmt == "html" else "application/pdf")
+
+@app.get("/api/jobs")
+def get_jobs(kind: Optional[str] = None):
+    return {"kinds": job_scheduler.kinds(), "jobs": job_scheduler.jobs(request_tenant().id, kind)}
+
+@app.post("/api/jobs", status_code=202)
+def create_job(job: JobCreate):
+    """
+    Agenda uma tarefa de manutenção (ver "kinds" em GET /api/jobs)
+    """
+    try:
+        return job_scheduler.submit(job.kind, job.params, request_tenant().id)
+    except UnknownJobKind:
+        raise HTTPException(status_code=400, detail=f"Tipo de job desconhecido: {job.kind}")
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_scheduler.get(job_id, request_tenant().id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = job_scheduler.cancel(job_id, request_tenant().id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.post("/api/exports/microdata", status_code=202)
+def create_microdata_export(format: str = "csv", partition: bool = False, questionnaire: Optional[str] = None):
+    """
+    Agenda a exportação das respostas no leiaute dos microdados do ENADE
+    (csv separado por ";" ou txt de largura fixa; `partition` gera um .zip com um arquivo por curso)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato desconhecido: {format}")
+    params = {"format": format, "partition": partition, "questionnaire": questionnaire}
+    return job_scheduler.submit("export-microdata", params, request_tenant().id)
+
+@app.get("/api/exports/microdata/layout")
+def get_microdata_layout():
+    """
+    Dicionário das colunas exportadas (posição inicial e tamanho no formato de largura fixa)
+    """
+    return MicrodataLayout(current_catalog().questions).dictionary()
+
+# microdados_{instituição}_{job}.{extensão}
+EXPORT_FILENAME = re.compile(r"^microdados_([a-z0-9][a-z0-9_-]*)_([0-9a-f]{16})\.[a-z]+$")
+
+@app.get("/api/exports/{filename}")
+def get_export_file(filename: str):
+    # Somente arquivos gerados para a instituição atual: o id da instituição pode conter
+    # "_", então ele é comparado inteiro (o id do job, no final, é hexadecimal)
+    match = EXPORT_FILENAME.match(filename)
+    path = os.path.join(EXPORTS_DIR, filename)
+    if match is None or match.group(1) != request_tenant().id or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Exportação não encontrada")
+    media_type = "application/zip" if filename.endswith(".zip") else "text/csv"
+    return FileResponse(path, media_type=media_type, filename=filename)
+
+@app.on_event("shutdown")
+def stop_jobs():
+    job_scheduler.shutdown()
+
+@app.exception_handler(DraftNotFound)
+async def draft_not_found_handler(request: Request, exc: DraftNotFound):
+    return JSONResponse(status_code=404, content={"detail": "Rascunho não encontrado ou expirado"})
+
+@app.exception_handler(DraftTooLarge)
+async def draft_too_large_handler(request: Request, exc: DraftTooLarge):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+@app.post("/api/drafts")
+def create_draft(draft: DraftCreate):
+    session_id = draft_store.create(draft.questionnaire, draft.dict(exclude={"questionnaire"}), request_tenant().id)
+    return {"sessionId": session_id, "ttl_seconds": draft_store.ttl}
+
+@app.get("/api/drafts/{session_id}")
+def get_draft(session_id: str):
+    return draft_store.get(session_id, request_tenant().id)
+
+@app.patch("/api/drafts/{session_id}")
+def patch_draft(session_id: str, patch: DraftPatch):
+    return draft_store.patch(session_id, patch.answers, patch.dict(exclude={"answers"}), request_tenant().id)
+
+@app.post("/api/drafts/{session_id}/submit")
+async def submit_draft(session_id: str, patch: Optional[DraftPatch] = None):
+    """
+    Finaliza o rascunho como uma resposta normal (aceita um último patch opcional)
+    """
+    tenant_id = request_tenant().id
+    if patch is not None:
+        draft_store.patch(session_id, patch.answers, patch.dict(exclude={"answers"}), tenant_id)
+    
+    draft = draft_store.pop(session_id, tenant_id)
+    submission = dict(draft.student, questionnaire=draft.questionnaire, responses=draft.ordered_responses())
+    
+    try:
+        success = await run_in_threadpool(save_response, submission)
+    except LimiterOverloaded:
+        # O rascunho continua disponível para uma nova tentativa
+        draft_store.restore(session_id, draft)
+        raise
+    
+    if not success:
+        draft_store.restore(session_id, draft)
+        raise HTTPException(status_code=500, detail="Erro ao salvar resposta")
+    return {"message": "Resposta recebida com sucesso!"}
 
 @app.post("/api/responses")
 async def receive_response(request: Request):
     try:
         data = await request.json()
-        success = save_response(data)
+        # Executar fora do event loop para que uma rajada de envios não bloqueie o servidor
+        success = await run_in_threadpool(save_response, data)
         if not success:
             raise HTTPException(status_code=500, detail="Erro ao salvar resposta")
         return {"message": "Resposta recebida com sucesso!"}
+    except LimiterOverloaded:
+        raise
     except Exception as e:
         print("Erro ao salvar resposta:", e)
         raise HTTPException(status_code=400, detail="Erro ao processar os dados.")
 
+@app.post("/api/responses/batch")
+async def receive_response_batch(request: Request):
+    """
+    Sincronização do formulário offline: grava um lote de respostas enfileiradas
+    no navegador, ignorando as que já foram recebidas (pela `idempotencyKey`)
+    """
+    try:
+        data = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Erro ao processar os dados.")
+    submissions = data.get("responses") if isinstance(data, dict) else None
+    if not isinstance(submissions, list):
+        raise HTTPException(status_code=400, detail="Informe a lista de respostas em \"responses\"")
+    if len(submissions) > OFFLINE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"No máximo {OFFLINE_BATCH_MAX} respostas por lote")
+    
+    results = await run_in_threadpool(save_response_batch, submissions)
+    return {"results": results}
+
+@app.get("/api/questionnaires/{questionnaire_id}/bundle")
+def get_questionnaire_bundle(questionnaire_id: int, request: Request):
+    """
+    Pacote autocontido de um questionário para o formulário offline: questões
+    expandidas na versão fixada do catálogo e endereço de sincronização.
+    
+    Revalidado a cada acesso pelo ETag (304 sem corpo se nada mudou); o
+    service worker usa a cópia guardada quando não há conexão.
+    """
+    questionnaire = get_questionnaire(questionnaire_id)
+    bundle = {
+        "questionnaire": questionnaire,
+        "catalog_version": questionnaire.get("catalog_version") or current_catalog().version,
+        "submit_url": "/api/responses/batch",
+        "max_batch": OFFLINE_BATCH_MAX,
+        "telemetry_url": "/api/telemetry",
+    }
+    etag = bundle_etag(bundle)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=bundle, headers=headers)
+
+telemetry = TelemetryPipeline()
+
+def questionnaire_question_ids(questionnaire_id):
+    """
+    Ids das questões de um questionário da instituição (None se ele não existir)
+    """
+    for questionnaire in load_questionnaires():
+        if questionnaire.get("id") == questionnaire_id:
+            return set(questionnaire.get("question_ids", []))
+    return None
+
+@app.on_event("shutdown")
+def flush_telemetry():
+    telemetry.flush()
+
+@app.on_event("shutdown")
+def flush_traffic_capture():
+    traffic_capture.flush()
+
+@app.post("/api/telemetry", status_code=202)
+async def receive_telemetry(request: Request):
+    """
+    Eventos de exibição e resposta das questões, enviados em lotes pelo formulário.
+    
+    Os eventos só entram no buffer em memória (sem Parse Server); a gravação e
+    os histogramas são feitos em segundo plano.
+    """
+    try:
+        data = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Erro ao processar os dados.")
+    try:
+        session, questionnaire, events, rejected = parse_batch(data)
+    except InvalidTelemetry as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(events) + rejected > TELEMETRY_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"No máximo {TELEMETRY_BATCH_MAX} eventos por lote")
+    
+    # Só questões do questionário: os histogramas ficam limitados pelo catálogo
+    question_ids = await run_in_threadpool(questionnaire_question_ids, questionnaire)
+    if question_ids is None:
+        raise HTTPException(status_code=400, detail="Questionário desconhecido")
+    known = [event for event in events if event[0] in question_ids]
+    rejected += len(events) - len(known)
+    events = known
+    
+    dropped = telemetry.ingest(session, questionnaire, events, rejected, request_tenant().id)
+    return {"accepted": len(events), "rejected": rejected, "dropped": dropped}
+
+@app.get("/api/telemetry/dwell")
+def get_dwell_times(questionnaire: Optional[int] = None):
+    """
+    Tempo que os alunos levam em cada questão (mediana, p90 e histograma),
+    das questões mais demoradas para as mais rápidas
+    """
+    items = telemetry.dwell_times(request_tenant().id, questionnaire)
+    try:
+        questions = current_catalog().by_id
+    except LimiterOverloaded:
+        questions = {}
+    for item in items:
+        question = questions.get(item["question"])
+        item["number"] = question.get("number") if question else None
+        item["text"] = question.get("text") if question else None
+    return {"questions": items}
+
+@app.get("/api/offline/manifest")
+def get_offline_manifest():
+    """
+    URLs que o service worker guarda na instalação (formulários e pacotes de cada questionário)
+    """
+    return JSONResponse(content=offline_manifest(load_questionnaires()), headers={"Cache-Control": "no-cache"})
+
+@app.get("/sw.js")
+async def serve_service_worker():
+    # Sempre revalidado, para que uma nova versão do service worker seja instalada logo
+    return FileResponse(os.path.join("static", "sw.js"), media_type="application/javascript",
+                        headers={"Cache-Control": "no-cache", "Service-Worker-Allowed": "/"})
+
+@app.get("/forms/{questionnaire_id}")
+async def serve_offline_form(questionnaire_id: int):
+    # Página genérica: o questionário é carregado pelo pacote (/api/questionnaires/{id}/bundle)
+    return FileResponse(os.path.join("static", "form.html"), media_type="text/html",
+                        headers={"Cache-Control": "no-cache"})
+
 # Rota para servir o frontend (SPA)
 @app.get("/{path:path}")
 async def serve_spa(path: str):
@@ -0,0 +1,205 @@
+import csv
+import os
+import shutil
+import tempfile
+import zipfile
+
+from rate_limit import env_int
+
+# Exportação das respostas no leiaute dos microdados do ENADE publicados pelo INEP:
+# uma linha por participante, uma coluna QE_Ixx por questão do Questionário do Estudante
+EXPORTS_DIR = os.environ.get("EXPORTS_DIR", os.path.join("data", "exports"))
+# Linhas acumuladas antes de cada escrita no arquivo
+EXPORT_CHUNK_ROWS = env_int("EXPORT_CHUNK_ROWS", 1000)
+
+EXPORT_FORMATS = ("csv", "txt")
+
+# Escala Likert nos microdados: 1 a 6, 7 = "Não sei responder", 8 = "Não se aplica"
+LIKERT_CODES = {"1": "1", "2": "2", "3": "3", "4": "4", "5": "5", "6": "6", "N": "7", "NS": "7", "NA": "8"}
+
+# Separador dos arquivos CSV do INEP
+CSV_DELIMITER = ";"
+
+
+def column_name(number):
+    return f"QE_I{number:02d}"
+
+
+class MicrodataLayout:
+    """
+    Colunas do arquivo exportado: NU_ANO, CO_CURSO e uma coluna QE_Ixx por
+    questão do catálogo, na ordem do número da questão no ENADE.
+
+    No formato de largura fixa (.txt) cada coluna ocupa sempre as mesmas
+    posições; o dicionário (`dictionary`) informa início e tamanho de cada uma.
+    """
+
+    def __init__(self, questions):
+        self.questions = sorted((q for q in questions if q.get("number") is not None), key=lambda q: q["number"])
+        self.by_number = {q["number"]: q for q in self.questions}
+        self.columns = [
+            ("NU_ANO", 4, "Ano de envio da resposta"),
+            ("CO_CURSO", 8, "Código do curso (identificador do questionário)"),
+        ]
+        self._codes = {}
+        for question in self.questions:
+            codes = {}
+            for option in question.get("options") or []:
+                label = option.get("label")
+                if label:
+                    codes[label] = LIKERT_CODES.get(label, label) if question.get("type") == "likert" else label
+            self._codes[question["number"]] = codes
+            width = max((len(code) for code in codes.values()), default=1)
+            self.columns.append((column_name(question["number"]), width, question.get("text") or ""))
+        self.header = [name for name, _, _ in self.columns]
+
+    def row(self, year, course, answers):
+        """
+        Args:
+            year (str): Ano de envio
+            course (int): Código do curso
+            answers (list): Pares [número da questão, rótulo] (ver answer_parser)
+
+        Returns:
+            list: Valores na ordem de `header` (vazio se a questão não foi respondida)
+        """
+        values = {}
+        for number, label in answers:
+            # Respostas com mais de uma alternativa: os microdados têm um único código por questão
+            if number in values:
+                continue
+            code = self._codes.get(number, {}).get(label)
+            if code is not None:
+                values[number] = code
+        return [year, str(course)] + [values.get(q["number"], "") for q in self.questions]
+
+    def fixed_width(self, row):
+        # Números alinhados à direita (como no INEP); códigos das questões à esquerda
+        parts = [row[0].rjust(4)[:4], row[1].rjust(8)[:8]]
+        for (_, width, _), value in zip(self.columns[2:], row[2:]):
+            parts.append(value.ljust(width)[:width])
+        return "".join(parts)
+
+    def dictionary(self):
+        entries = []
+        start = 1
+        for name, width, description in self.columns:
+            entries.append({"column": name, "start": start, "width": width, "description": description})
+            start += width
+        return entries
+
+
+class _ChunkedWriter:
+    """
+    Acumula linhas de um arquivo e as grava em blocos.
+
+    O arquivo só fica aberto durante a gravação de cada bloco, então a
+    exportação por curso não mantém um descritor aberto por curso.
+    """
+
+    def __init__(self, path, layout, fmt):
+        self.path = path
+        self.layout = layout
+        self.fmt = fmt
+        self.rows = []
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                csv.writer(f, delimiter=CSV_DELIMITER, lineterminator="\n").writerow(layout.header)
+
+    def add(self, row):
+        self.rows.append(row)
+
+    def flush(self):
+        if not self.rows:
+            return
+        with open(self.path, "a", encoding="utf-8", newline="") as f:
+            if self.fmt == "csv":
+                csv.writer(f, delimiter=CSV_DELIMITER, lineterminator="\n").writerows(self.rows)
+            else:
+                f.write("".join(self.layout.fixed_width(row) + "\n" for row in self.rows))
+        self.rows = []
+
+
+def _dictionary_csv(layout, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=CSV_DELIMITER, lineterminator="\n")
+        writer.writerow(["COLUNA", "INICIO", "TAMANHO", "DESCRICAO"])
+        for entry in layout.dictionary():
+            writer.writerow([entry["column"], entry["start"], entry["width"], entry["description"]])
+
+
+def export_microdata(records, layout, answers_of, course_of, fmt="csv", partition=False, name="microdados",
+                     job=None):
+    """
+    Grava as respostas no leiaute dos microdados, lendo-as uma a uma.
+
+    Somente o bloco de linhas em escrita fica em memória. Com `partition`, cada
+    curso vai para um arquivo próprio (gravado em um diretório temporário) e o
+    resultado é um .zip com um arquivo por curso e o dicionário das colunas.
+
+    Args:
+        records (iterable): Respostas no formato de `response_from_parse`
+        layout (MicrodataLayout): Colunas do arquivo
+        answers_of (callable): Resposta -> pares [número, rótulo]
+        course_of (callable): Resposta -> código do curso
+        fmt (str): "csv" (separado por ";") ou "txt" (largura fixa)
+        partition (bool): Um arquivo por curso, compactados em .zip
+        name (str): Nome base do arquivo gerado
+        job (JobContext, optional): Job em execução (progresso e cancelamento)
+
+    Returns:
+        dict: Arquivo gerado, quantidade de linhas e de cursos
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato desconhecido: {fmt}")
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix="export-", dir=EXPORTS_DIR)
+    writers = {}
+    rows = 0
+    try:
+        for record in records:
+            course = course_of(record)
+            key = course if partition else None
+            writer = writers.get(key)
+            if writer is None:
+                filename = f"{name}_{course}.{fmt}" if partition else f"{name}.{fmt}"
+                writer = writers[key] = _ChunkedWriter(os.path.join(workdir, filename), layout, fmt)
+            writer.add(layout.row((record.get("submissionDate") or "")[:4], course, answers_of(record)))
+            rows += 1
+            # Um bloco por vez em memória, somando todos os cursos
+            if rows % EXPORT_CHUNK_ROWS == 0:
+                for pending in writers.values():
+                    pending.flush()
+                if job is not None:
+                    job.progress(rows, None, f"{rows} linhas exportadas")
+
+        if not writers:
+            # Nenhuma resposta: arquivo só com o cabeçalho
+            writers[None] = _ChunkedWriter(os.path.join(workdir, f"{name}.{fmt}"), layout, fmt)
+        for writer in writers.values():
+            writer.flush()
+
+        if partition or fmt == "txt":
+            # O leiaute de largura fixa não tem cabeçalho: o dicionário acompanha o arquivo
+            _dictionary_csv(layout, os.path.join(workdir, f"dicionario_{name}.csv"))
+            filename = f"{name}.zip"
+            tmp_path = os.path.join(workdir, filename)
+            with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for entry in sorted(os.listdir(workdir)):
+                    if entry != filename:
+                        archive.write(os.path.join(workdir, entry), arcname=entry)
+        else:
+            filename = f"{name}.{fmt}"
+            tmp_path = os.path.join(workdir, filename)
+        os.replace(tmp_path, os.path.join(EXPORTS_DIR, filename))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "file": filename,
+        "url": f"/api/exports/{filename}",
+        "format": fmt,
+        "rows": rows,
+        "courses": len([key for key in writers if key is not None]) if partition else None,
+        "columns": len(layout.columns),
+    }
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+
+from rate_limit import env_int
+from tenants import DEFAULT_TENANT
+
+# Respostas aceitas por lote de sincronização (o /batch do Parse Server grava até 50 por chamada)
+OFFLINE_BATCH_MAX = env_int("OFFLINE_BATCH_MAX", 50)
+# Chaves de idempotência lembradas em memória, evitando consultar o Parse Server a cada reenvio
+OFFLINE_RECENT_KEYS = env_int("OFFLINE_RECENT_KEYS", 20000)
+
+# Gerada pelo navegador para cada resposta enfileirada (ex.: UUID)
+IDEMPOTENCY_KEY = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Arquivos do formulário offline, guardados pelo service worker na instalação
+OFFLINE_SHELL = ("/offline-form.js",)
+
+
+def bundle_etag(bundle):
+    """
+    ETag do pacote de um questionário (muda se o questionário ou a versão do catálogo mudar).
+    """
+    content = json.dumps(bundle, ensure_ascii=False, sort_keys=True)
+    return '"bundle-' + hashlib.sha1(content.encode("utf-8")).hexdigest()[:16] + '"'
+
+
+def offline_manifest(questionnaires):
+    """
+    Lista de URLs que o service worker deve manter em cache.
+
+    Args:
+        questionnaires (list): Questionários com "id" e "catalog_version"
+
+    Returns:
+        dict: {"version": ..., "precache": [...]}
+    """
+    precache = list(OFFLINE_SHELL)
+    versions = []
+    for questionnaire in sorted(questionnaires, key=lambda q: q.get("id") or 0):
+        precache.append(f"/forms/{questionnaire['id']}")
+        precache.append(f"/api/questionnaires/{questionnaire['id']}/bundle")
+        versions.append([questionnaire["id"], questionnaire.get("catalog_version")])
+    # Um manifesto diferente faz o service worker baixar tudo de novo e descartar o cache antigo
+    version = hashlib.sha1(json.dumps([precache, versions]).encode("utf-8")).hexdigest()[:12]
+    return {"version": version, "precache": precache}
+
+
+class IdempotencyLedger:
+    """
+    Chaves de idempotência já gravadas e em gravação, por instituição.
+
+    O Parse Server continua sendo a referência (as respostas guardam a chave em
+    `idempotencyKey`); o ledger só evita a consulta para reenvios recentes e
+    impede que dois lotes simultâneos com a mesma resposta a gravem duas vezes
+    neste processo.
+    """
+
+    def __init__(self, max_keys=OFFLINE_RECENT_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()  # (instituição, chave) -> objectId
+        self._inflight = set()
+        self.counters = {"claimed": 0, "duplicates": 0, "released": 0}
+
+    def claim(self, keys, tenant=DEFAULT_TENANT):
+        """
+        Reserva as chaves que ainda não foram gravadas nem estão em gravação.
+
+        Returns:
+            tuple: (chaves reservadas, {chave: objectId ou None para as já conhecidas})
+        """
+        claimed = []
+        known = {}
+        with self._lock:
+            for key in keys:
+                entry = (tenant, key)
+                if entry in self._recent:
+                    self._recent.move_to_end(entry)
+                    known[key] = self._recent[entry]
+                elif entry in self._inflight:
+                    known[key] = None
+                else:
+                    self._inflight.add(entry)
+                    claimed.append(key)
+            self.counters["claimed"] += len(claimed)
+            self.counters["duplicates"] += len(known)
+        return claimed, known
+
+    def remember(self, key, object_id, tenant=DEFAULT_TENANT):
+        """Marca a chave como gravada (e libera a reserva)."""
+        with self._lock:
+            self._inflight.discard((tenant, key))
+            self._recent[(tenant, key)] = object_id
+            self._recent.move_to_end((tenant, key))
+            while len(self._recent) > self.max_keys:
+                self._recent.popitem(last=False)
+
+    def release(self, key, tenant=DEFAULT_TENANT):
+        """Libera a reserva de uma chave que não foi gravada, para que o cliente tente de novo."""
+        with self._lock:
+            self._inflight.discard((tenant, key))
+            self.counters["released"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {"recent": len(self._recent), "inflight": len(self._inflight), **self.counters}
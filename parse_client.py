@@ -0,0 +1,298 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+from circuit_breaker import CircuitBreaker
+from rate_limit import ConcurrencyLimiter, env_float, env_int
+from tenants import DEFAULT_TENANT, Tenant, current_tenant
+from traffic_capture import parse_fixtures, traffic_capture
+
+# Configurações do Parse Server
+PARSE_APP_ID = os.environ.get("PARSE_APP_ID", "s7pKPlnBzfYSLKpV2MvxN6ahLQRreBVjRKGmXhaD")
+PARSE_REST_API_KEY = os.environ.get("PARSE_REST_API_KEY", "BsRIEaRzKtWkIdz70UrddtHaFsHJdLkYHszT4O6Y")
+PARSE_SERVER_URL = os.environ.get("PARSE_SERVER_URL", "https://parseapi.back4app.com")
+
+# Headers para requisições ao Parse Server
+PARSE_HEADERS = {
+    "X-Parse-Application-Id": PARSE_APP_ID,
+    "X-Parse-REST-API-Key": PARSE_REST_API_KEY,
+    "Content-Type": "application/json"
+}
+
+# Limite global de chamadas simultâneas ao Parse Server, compartilhado por todas as rotas
+parse_limiter = ConcurrencyLimiter(
+    max_concurrent=env_int("PARSE_MAX_CONCURRENCY", 8),
+    max_queue=env_int("PARSE_MAX_QUEUE", 32),
+    queue_timeout=env_float("PARSE_QUEUE_TIMEOUT", 5.0),
+)
+
+# Instituição padrão: credenciais acima, usada quando a requisição não indica outra.
+# Sua cota própria é o próprio limite global, para não mudar o comportamento de um único campus
+default_tenant = Tenant(
+    DEFAULT_TENANT, PARSE_APP_ID, PARSE_REST_API_KEY, PARSE_SERVER_URL,
+    max_concurrency=parse_limiter.max_concurrent,
+    max_queue=parse_limiter.max_queue,
+)
+
+# Tempo máximo de cada chamada ao Parse Server (segundos)
+PARSE_TIMEOUT = env_float("PARSE_TIMEOUT", 10.0)
+
+# Objetos por chamada nas consultas paginadas (o Parse Server aceita até 1000 por padrão)
+PARSE_PAGE_SIZE = env_int("PARSE_PAGE_SIZE", 1000)
+# Conexões HTTP mantidas abertas por servidor, reaproveitadas entre as chamadas
+PARSE_POOL_SIZE = env_int("PARSE_POOL_SIZE", parse_limiter.max_concurrent)
+
+# Campos lidos de cada classe (projeção `keys`): ACL, updatedAt e campos que o
+# chamador não usa não trafegam. objectId e createdAt sempre vêm na resposta.
+QUESTION_KEYS = ("questionId", "number", "text", "type", "category", "options")
+QUESTIONNAIRE_KEYS = ("questionnaireId", "title", "description", "questionIds", "catalogVersion")
+RESPONSE_KEYS = ("studentName", "studentId", "studentEmail", "questionnaire", "responses",
+                 "catalogVersion", "parsedAnswers", "parserVersion")
+# Análises (estatísticas, relatórios, microdados): sem os dados pessoais do aluno
+RESPONSE_ANALYSIS_KEYS = ("questionnaire", "responses", "catalogVersion", "parsedAnswers", "parserVersion")
+
+def probe_parse_server(tenant):
+    """
+    Verifica se o Parse Server da instituição voltou a responder (usado com o circuito aberto).
+    """
+    import requests
+    response = requests.get(
+        f"{tenant.server_url}/classes/Question",
+        headers=tenant.headers,
+        params={"limit": 1},
+        timeout=PARSE_TIMEOUT
+    )
+    return response.status_code < 500
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def tenant_breaker(tenant):
+    """
+    Circuit breaker do Parse Server de uma instituição: abre com muitas falhas ou
+    lentidão e deixa de esperar por timeouts. Cada instituição tem o seu, para que
+    a queda do servidor de um campus não bloqueie os outros.
+    """
+    breaker = _breakers.get(tenant.id)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(tenant.id)
+            if breaker is None:
+                breaker = _breakers[tenant.id] = CircuitBreaker(
+                    "Parse Server" if tenant.is_default else f"Parse Server ({tenant.id})",
+                    probe=lambda: probe_parse_server(tenant),
+                    failure_threshold=env_float("PARSE_BREAKER_FAILURE_RATE", 0.5),
+                    min_calls=env_int("PARSE_BREAKER_MIN_CALLS", 5),
+                    window=env_float("PARSE_BREAKER_WINDOW", 30.0),
+                    slow_call_threshold=env_float("PARSE_BREAKER_SLOW_CALL", 5.0),
+                    probe_interval=env_float("PARSE_BREAKER_PROBE_INTERVAL", 10.0),
+                )
+    return breaker
+
+def batch_path(path):
+    """
+    Caminho de uma operação do /batch (ex.: "/classes/Response/abc") no Parse
+    Server da instituição atual, que pode ter um prefixo próprio (ex.: "/parse").
+    """
+    tenant = current_tenant.get(default_tenant)
+    return urlparse(tenant.server_url).path.rstrip("/") + path
+
+_session = None
+_session_lock = threading.Lock()
+
+def http_session():
+    """
+    Sessão HTTP compartilhada com o Parse Server: mantém as conexões abertas
+    (keep-alive), evitando um novo handshake TLS a cada chamada.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=PARSE_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def parse_request(method, url, **kwargs):
+    """
+    Executa uma requisição ao Parse Server da instituição atual, respeitando a
+    cota da instituição, o limite de concorrência global e o circuit breaker.
+
+    Args:
+        method (str): Método HTTP ("GET", "POST", "PUT", "DELETE")
+        url (str): URL completa do recurso no Parse Server
+        **kwargs: Argumentos repassados para `requests.request`
+
+    Returns:
+        requests.Response: Resposta do Parse Server
+
+    Raises:
+        LimiterOverloaded: Se a fila de chamadas estiver cheia
+        CircuitOpenError: Se o circuito estiver aberto
+    """
+    tenant = current_tenant.get(default_tenant)
+    path = url[len(PARSE_SERVER_URL):] if url.startswith(PARSE_SERVER_URL) else url
+    if not tenant.is_default and url.startswith(PARSE_SERVER_URL):
+        url = tenant.server_url + path
+    kwargs.setdefault("headers", tenant.headers)
+    kwargs.setdefault("timeout", PARSE_TIMEOUT)
+
+    if parse_fixtures.active:
+        # Replay (PARSE_REPLAY_FIXTURES): respostas gravadas em vez do Parse Server
+        def call():
+            return parse_fixtures.respond(tenant.id, method, path, kwargs)
+    else:
+        def call():
+            return http_session().request(method, url, **kwargs)
+
+    # Falhar antes de ocupar uma vaga na fila se o Parse Server estiver fora
+    breaker = tenant_breaker(tenant)
+    breaker.check()
+    with tenant.limiter, parse_limiter:
+        start = time.perf_counter()
+        response = breaker.call(call, is_failure=lambda response: response.status_code >= 500)
+        if traffic_capture.enabled:
+            traffic_capture.record_parse(tenant.id, method, path, kwargs, response, time.perf_counter() - start)
+        return response
+
+def response_from_parse(item):
+    """
+    Converte um objeto Response do Parse Server para o formato esperado pelo frontend
+    """
+    return {
+        "objectId": item.get("objectId"),
+        "studentName": item.get("studentName", ""),
+        "studentId": item.get("studentId", ""),
+        "studentEmail": item.get("studentEmail", ""),
+        "questionnaire": item.get("questionnaire", ""),
+        "submissionDate": item.get("createdAt", datetime.now().isoformat()),
+        "responses": item.get("responses", []),
+        "catalogVersion": item.get("catalogVersion"),
+        "parsedAnswers": item.get("parsedAnswers"),
+        "parserVersion": item.get("parserVersion")
+    }
+
+def class_url(class_name):
+    return f"{PARSE_SERVER_URL}/classes/{class_name}"
+
+def query_params(where=None, keys=None, order=None, limit=None):
+    """
+    Parâmetros de uma consulta ao Parse Server.
+
+    Args:
+        where (dict, optional): Filtro
+        keys (iterable, optional): Campos a retornar (None = objeto inteiro)
+        order (str, optional): Ordenação (ex.: "-createdAt")
+        limit (int, optional): Máximo de objetos
+    """
+    params = {}
+    if where:
+        params["where"] = json.dumps(where)
+    if keys is not None:
+        params["keys"] = ",".join(keys)
+    if order:
+        params["order"] = order
+    if limit is not None:
+        params["limit"] = limit
+    return params
+
+def find_objects(class_name, where=None, keys=None, order=None, limit=PARSE_PAGE_SIZE):
+    """
+    Uma única página de objetos de uma classe.
+
+    Returns:
+        list: Objetos como retornados pelo Parse Server
+
+    Raises:
+        RuntimeError: Se o Parse Server responder com erro
+    """
+    response = parse_request("GET", class_url(class_name), params=query_params(where, keys, order, limit))
+    if response.status_code != 200:
+        raise RuntimeError(f"Erro ao consultar {class_name}: {response.status_code} - {response.text}")
+    return response.json().get("results", [])
+
+def count_objects(class_name, where=None):
+    """
+    Quantidade de objetos (sem trazer nenhum objeto).
+
+    Raises:
+        RuntimeError: Se o Parse Server responder com erro
+    """
+    params = query_params(where, limit=0)
+    params["count"] = 1
+    response = parse_request("GET", class_url(class_name), params=params)
+    if response.status_code != 200:
+        raise RuntimeError(f"Erro ao contar {class_name}: {response.status_code} - {response.text}")
+    return response.json().get("count", 0)
+
+def iter_pages(class_name, where=None, keys=None, page_size=PARSE_PAGE_SIZE):
+    """
+    Percorre todos os objetos de uma classe, página por página, em ordem de criação.
+
+    A paginação usa a última posição lida (createdAt, objectId) em vez de `skip`,
+    então o custo de cada página não cresce com o número de objetos, e objetos
+    criados no mesmo milissegundo não são pulados.
+
+    Args:
+        class_name (str): Classe do Parse Server
+        where (dict, optional): Filtro adicional
+        keys (iterable, optional): Campos a retornar (None = objeto inteiro)
+        page_size (int): Objetos por chamada
+
+    Yields:
+        list: Objetos de cada página
+
+    Raises:
+        RuntimeError: Se o Parse Server responder com erro
+    """
+    if keys is not None:
+        keys = tuple(keys) + ("createdAt",)
+    last = None
+    while True:
+        conditions = [where] if where else []
+        if last is not None:
+            created = {"__type": "Date", "iso": last[0]}
+            conditions.append({"$or": [
+                {"createdAt": {"$gt": created}},
+                {"createdAt": created, "objectId": {"$gt": last[1]}},
+            ]})
+        condition = None
+        if conditions:
+            condition = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+        results = find_objects(class_name, condition, keys, order="createdAt,objectId", limit=page_size)
+        if results:
+            yield results
+        if len(results) < page_size:
+            return
+        last = (results[-1]["createdAt"], results[-1]["objectId"])
+
+def iter_objects(class_name, where=None, keys=None, page_size=PARSE_PAGE_SIZE):
+    """
+    Como `iter_pages`, objeto por objeto.
+    """
+    for page in iter_pages(class_name, where, keys, page_size):
+        yield from page
+
+def iter_responses(where=None, keys=RESPONSE_KEYS, page_size=PARSE_PAGE_SIZE):
+    """
+    Percorre as respostas do Parse Server (em ordem de envio), sem manter mais
+    de uma página em memória.
+
+    Args:
+        where (dict, optional): Filtro adicional do Parse Server
+        keys (iterable, optional): Campos a retornar
+        page_size (int): Respostas por chamada
+
+    Yields:
+        dict: Resposta no formato de `response_from_parse`
+    """
+    for item in iter_objects("Response", where, keys, page_size):
+        yield response_from_parse(item)
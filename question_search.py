@@ -0,0 +1,237 @@
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+
+from catalog import fingerprint
+
+# Palavras muito frequentes em português que não ajudam a ordenar os resultados
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e",
+    "em", "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelo",
+    "por", "que", "se", "sua", "seu", "um", "uma", "voce",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Peso de cada campo na pontuação: o enunciado vale mais que o texto das alternativas
+FIELD_WEIGHTS = {"text": 2.0, "options": 1.0}
+
+# Parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+FACETS = ("category", "type")
+
+
+def fold(text):
+    """
+    Normaliza texto para busca: minúsculas e sem acentos ("formação" -> "formacao").
+    """
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(fold(text)) if t not in STOPWORDS]
+
+
+class QuestionIndex:
+    """
+    Índice invertido em memória sobre o enunciado e as alternativas das questões.
+
+    O índice é sincronizado com o catálogo por `sync()`, que compara a impressão
+    digital de cada questão e só reindexa as que foram incluídas, alteradas ou
+    removidas. As consultas não fazem nenhuma varredura do catálogo: os termos
+    levam direto às questões por meio das listas invertidas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.source = None
+        self.docs = {}           # id -> questão
+        self.fingerprints = {}   # id -> impressão digital do conteúdo indexado
+        self.lengths = {}        # id -> tamanho ponderado do documento
+        self.doc_terms = {}      # id -> termos do documento (para remoção)
+        self.postings = {}       # termo -> {id: frequência ponderada}
+        self.vocabulary = []     # termos ordenados, para busca por prefixo
+        self.facets = {name: {} for name in FACETS}  # faceta -> valor -> {ids}
+        self.total_length = 0.0
+
+    def sync(self, questions, source=None):
+        """
+        Atualiza o índice para refletir `questions`.
+
+        Args:
+            questions (list): Catálogo atual
+            source: Identifica a versão do catálogo; se for a mesma da última
+                sincronização nada é feito
+
+        Returns:
+            int: Quantidade de questões (re)indexadas ou removidas
+        """
+        if source is not None and source is self.source:
+            return 0
+
+        with self._lock:
+            if source is not None and source is self.source:
+                return 0
+
+            current = {q["id"]: q for q in questions}
+            changed = 0
+
+            for qid in list(self.docs):
+                if qid not in current:
+                    self._remove(qid)
+                    changed += 1
+
+            for qid, question in current.items():
+                digest = fingerprint(question)
+                if self.fingerprints.get(qid) == digest:
+                    # Conteúdo igual: só atualizar a referência
+                    self.docs[qid] = question
+                    continue
+                if qid in self.docs:
+                    self._remove(qid)
+                self._add(question, digest)
+                changed += 1
+
+            if changed:
+                self.vocabulary = sorted(self.postings)
+            self.source = source
+            return changed
+
+    def _add(self, question, digest):
+        qid = question["id"]
+        frequencies = {}
+        for field, text in (("text", question.get("text")),
+                            ("options", " ".join(o.get("text", "") for o in question.get("options") or []))):
+            for token in tokenize(text):
+                frequencies[token] = frequencies.get(token, 0.0) + FIELD_WEIGHTS[field]
+
+        for token, frequency in frequencies.items():
+            self.postings.setdefault(token, {})[qid] = frequency
+
+        for name in FACETS:
+            self.facets[name].setdefault(question.get(name) or "", set()).add(qid)
+
+        length = sum(frequencies.values())
+        self.docs[qid] = question
+        self.fingerprints[qid] = digest
+        self.lengths[qid] = length
+        self.doc_terms[qid] = list(frequencies)
+        self.total_length += length
+
+    def _remove(self, qid):
+        question = self.docs.pop(qid)
+        self.fingerprints.pop(qid, None)
+        self.total_length -= self.lengths.pop(qid, 0.0)
+
+        for token in self.doc_terms.pop(qid, []):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(qid, None)
+                if not posting:
+                    del self.postings[token]
+
+        for name in FACETS:
+            ids = self.facets[name].get(question.get(name) or "")
+            if ids is not None:
+                ids.discard(qid)
+                if not ids:
+                    del self.facets[name][question.get(name) or ""]
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self.postings else []
+        start = bisect.bisect_left(self.vocabulary, token)
+        terms = []
+        for term in self.vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query="", filters=None, page=1, page_size=20):
+        """
+        Busca questões por texto, com filtros por faceta e paginação.
+
+        O último termo da consulta também casa como prefixo ("forma" encontra
+        "formacao"), para uso em campos de busca enquanto o usuário digita.
+
+        Args:
+            query (str): Texto buscado
+            filters (dict, optional): {"category": ..., "type": ...}
+            page (int): Página, a partir de 1
+            page_size (int): Resultados por página
+
+        Returns:
+            dict: Resultados da página, total e contagem por faceta
+        """
+        start = time.perf_counter()
+        filters = {k: v for k, v in (filters or {}).items() if v}
+        tokens = tokenize(query)
+
+        with self._lock:
+            doc_count = len(self.docs) or 1
+            average_length = (self.total_length / doc_count) or 1.0
+
+            if tokens:
+                scores = None
+                for i, token in enumerate(tokens):
+                    # Todos os termos precisam aparecer (AND); prefixo só no último
+                    term_scores = {}
+                    for term in self._expand(token, prefix=(i == len(tokens) - 1)):
+                        posting = self.postings[term]
+                        idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                        for qid, frequency in posting.items():
+                            norm = 1 - BM25_B + BM25_B * self.lengths[qid] / average_length
+                            score = idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+                            term_scores[qid] = term_scores.get(qid, 0.0) + score
+                    if scores is None:
+                        scores = term_scores
+                    else:
+                        scores = {qid: s + term_scores[qid] for qid, s in scores.items() if qid in term_scores}
+                    if not scores:
+                        break
+                scores = scores or {}
+            else:
+                scores = {qid: 0.0 for qid in self.docs}
+
+            # Contagem por faceta: cada faceta considera os filtros das demais
+            facet_counts = {}
+            for name in FACETS:
+                candidates = set(scores)
+                for other, value in filters.items():
+                    if other != name and other in self.facets:
+                        candidates &= self.facets[other].get(value, set())
+                facet_counts[name] = {
+                    value: len(ids & candidates)
+                    for value, ids in self.facets[name].items()
+                    if ids & candidates
+                }
+
+            matched = set(scores)
+            for name, value in filters.items():
+                if name in self.facets:
+                    matched &= self.facets[name].get(value, set())
+
+            ranked = sorted(matched, key=lambda qid: (-scores[qid], self.docs[qid].get("number") or 0))
+            page = max(page, 1)
+            offset = (page - 1) * page_size
+            results = [
+                dict(self.docs[qid], score=round(scores[qid], 4))
+                for qid in ranked[offset:offset + page_size]
+            ]
+
+        return {
+            "query": query,
+            "total": len(ranked),
+            "page": page,
+            "page_size": page_size,
+            "results": results,
+            "facets": facet_counts,
+            "took_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
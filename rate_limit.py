@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def env_int(name, default):
+    """Lê um inteiro de variável de ambiente, usando o padrão se inválido."""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    """Lê um float de variável de ambiente, usando o padrão se inválido."""
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class LimiterOverloaded(Exception):
+    """
+    Indica que a requisição foi rejeitada para proteger o serviço.
+
+    Attributes:
+        retry_after (float): Sugestão de espera, em segundos, antes de tentar novamente
+    """
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Balde de tokens clássico: `rate` tokens por segundo, até `capacity` acumulados.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def consume(self, amount=1):
+        """
+        Tenta consumir tokens do balde.
+
+        Returns:
+            tuple: (permitido, segundos até haver tokens suficientes)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True, 0.0
+
+        missing = amount - self.tokens
+        return False, missing / self.rate if self.rate > 0 else 60.0
+
+
+class RateLimiter:
+    """
+    Limitador por chave (IP do cliente + regra de rota) baseado em token buckets.
+
+    O número de baldes é limitado para que uma varredura de IPs não consuma
+    memória indefinidamente: os baldes menos usados recentemente são descartados.
+    """
+
+    def __init__(self, rules, max_keys=10000):
+        # rules: {nome_da_regra: (tokens_por_minuto, rajada)}
+        self.rules = rules
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {name: {"allowed": 0, "rejected": 0} for name in rules}
+
+    def check(self, rule, client_key):
+        """
+        Consome um token da regra para o cliente.
+
+        Raises:
+            LimiterOverloaded: Se o cliente excedeu a taxa permitida
+        """
+        per_minute, burst = self.rules[rule]
+        if per_minute <= 0:
+            return
+
+        key = (rule, client_key)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(per_minute / 60.0, max(burst, 1))
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+
+            allowed, retry_after = bucket.consume()
+            self.counters[rule]["allowed" if allowed else "rejected"] += 1
+
+        if not allowed:
+            raise LimiterOverloaded("Limite de requisições excedido", retry_after)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rules": {
+                    name: {"per_minute": rate, "burst": burst, **self.counters[name]}
+                    for name, (rate, burst) in self.rules.items()
+                },
+                "tracked_clients": len(self._buckets),
+            }
+
+
+class ConcurrencyLimiter:
+    """
+    Limita o número de chamadas simultâneas a um recurso, com fila limitada.
+
+    Quando todas as vagas estão ocupadas a chamada espera na fila por até
+    `queue_timeout` segundos; se a fila já estiver cheia, a chamada é rejeitada
+    imediatamente (load shedding) em vez de acumular threads bloqueadas.
+    """
+
+    def __init__(self, max_concurrent, max_queue, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.counters = {"completed": 0, "shed": 0, "timed_out": 0}
+
+    def acquire(self):
+        """
+        Obtém uma vaga, aguardando na fila se necessário.
+
+        Raises:
+            LimiterOverloaded: Se a fila estiver cheia ou a espera expirar
+        """
+        if self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.active += 1
+            return
+
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.counters["shed"] += 1
+                raise LimiterOverloaded("Fila de chamadas ao Parse Server cheia", 1.0)
+            self.waiting += 1
+
+        acquired = self._semaphore.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.counters["timed_out"] += 1
+            else:
+                self.active += 1
+
+        if not acquired:
+            raise LimiterOverloaded("Tempo de espera pelo Parse Server esgotado", self.queue_timeout)
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            self.counters["completed"] += 1
+        self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "active": self.active,
+                "waiting": self.waiting,
+                **self.counters,
+            }
@@ -0,0 +1,262 @@
+import argparse
+import base64
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from tenants import TENANT_HEADER
+from traffic_capture import read_capture
+
+# Reproduz o tráfego gravado (TRAFFIC_CAPTURE=1) contra uma versão local do servidor,
+# com o Parse Server respondido pelas chamadas gravadas, e compara as latências.
+# Uso:
+#   python replay.py data/captures/capture-X.jsonl.gz --speed 4 --output nova.json
+#   python replay.py data/captures/capture-X.jsonl.gz --app-dir ../versao-anterior --output anterior.json
+#   python replay.py data/captures/capture-X.jsonl.gz --baseline anterior.json
+
+# Arquivos e diretórios gravados pelo servidor; no replay apontam para um diretório
+# temporário, para que os envios reproduzidos não alterem os dados de trabalho
+DATA_PATHS = {
+    "JOBS_FILE": "jobs.json",
+    "DRAFTS_FILE": "drafts.json",
+    "ARCHIVE_DIR": os.path.join("archive", "responses"),
+    "TELEMETRY_DIR": "telemetry",
+    "EXPORTS_DIR": "exports",
+    "REPORTS_DIR": "reports",
+    "CATALOG_DIR": "catalog",
+    "TENANT_CATALOG_DIR": "tenants",
+    "SNAPSHOT_DIR": "snapshots",
+    "CAPTURE_DIR": "captures",
+}
+
+# Segmentos variáveis das rotas (ids numéricos, tokens), agrupados no relatório
+VARIABLE_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8,}|[A-Za-z0-9_-]{16,})$")
+
+def route_of(method, path):
+    segments = ["{id}" if VARIABLE_SEGMENT.match(s) else s for s in path.split("/")]
+    return f"{method} {'/'.join(segments)}"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(app_dir, capture, parse_latency, timeout, data_dir):
+    """
+    Sobe o uvicorn a partir de `app_dir`, com o Parse Server respondido pela captura
+    e os dados gravados pelo servidor em `data_dir`.
+
+    Returns:
+        tuple: (processo, URL base)
+    """
+    port = free_port()
+    env = dict(os.environ, PARSE_REPLAY_FIXTURES=os.path.abspath(capture),
+               PARSE_REPLAY_LATENCY=str(parse_latency), TRAFFIC_CAPTURE="0",
+               RATE_LIMIT_TRUSTED_PROXIES="1")
+    env.update({name: os.path.join(data_dir, path) for name, path in DATA_PATHS.items()})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/test", timeout=timeout) as response:
+                response.read()
+                return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"Servidor não respondeu em {timeout}s")
+
+def send(session, base_url, record):
+    """
+    Reenvia uma requisição gravada.
+
+    Returns:
+        dict: Rota, status e latência (gravados e medidos)
+    """
+    headers = dict(record.get("headers") or {})
+    # O limite de taxa continua separado por cliente (pseudônimo gravado)
+    headers["X-Forwarded-For"] = f"replay-{record['client']}"
+    # Instituição resolvida na gravação (inclusive as escolhidas pelo Host)
+    if record.get("tenant"):
+        headers[TENANT_HEADER] = record["tenant"]
+    body = record.get("body")
+    if body is not None:
+        body = base64.b64decode(body) if record.get("body_encoding") == "base64" else body.encode("utf-8")
+    url = base_url + record["path"] + (f"?{record['query']}" if record.get("query") else "")
+
+    start = time.perf_counter()
+    try:
+        response = session.request(record["method"], url, headers=headers, data=body, timeout=60)
+        size = len(response.content)
+        status = response.status_code
+    except Exception as e:
+        print(f"Erro ao reenviar {record['method']} {record['path']}: {e}")
+        size, status = 0, None
+    return {
+        "route": route_of(record["method"], record["path"]),
+        "status": status,
+        "captured_status": record.get("status"),
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+        "captured_latency_ms": record.get("latency_ms"),
+        "size": size,
+    }
+
+def replay(records, base_url, speed, concurrency):
+    """
+    Reenvia as requisições respeitando os intervalos gravados, divididos por
+    `speed` (0 = sem espera, limitado só por `concurrency`).
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=concurrency))
+    results = []
+    lock = threading.Lock()
+
+    def run(record):
+        result = send(session, base_url, record)
+        with lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    first = records[0]["t"] if records else 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            if speed > 0:
+                wait = (record["t"] - first) / speed - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+            executor.submit(run, record)
+    return results, time.perf_counter() - start
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+
+def summarize(results, latency_key="latency_ms"):
+    """
+    Returns:
+        dict: Por rota: requisições, p50/p95 da latência e status diferentes do gravado
+    """
+    by_route = {}
+    for result in results:
+        by_route.setdefault(result["route"], []).append(result)
+    summary = {}
+    for route, items in sorted(by_route.items()):
+        latencies = [item[latency_key] for item in items if item.get(latency_key) is not None]
+        summary[route] = {
+            "requests": len(items),
+            "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+            "p95_ms": percentile(latencies, 0.95),
+            "status_mismatches": sum(1 for item in items if item["status"] != item["captured_status"]),
+        }
+    return summary
+
+def compare(current, baseline):
+    """
+    Diferença de latência por rota entre duas execuções (ou contra a captura).
+    """
+    deltas = {}
+    for route, stats in current.items():
+        before = baseline.get(route)
+        if not before or before["p50_ms"] is None or stats["p50_ms"] is None:
+            continue
+        deltas[route] = {
+            "p50_before_ms": before["p50_ms"],
+            "p50_after_ms": stats["p50_ms"],
+            "p50_delta_pct": round((stats["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100, 1)
+            if before["p50_ms"] else None,
+            "p95_before_ms": before["p95_ms"],
+            "p95_after_ms": stats["p95_ms"],
+        }
+    return deltas
+
+def print_deltas(deltas, label):
+    print(f"\nLatência por rota ({label}):")
+    print(f"{'rota':<50} {'p50 antes':>10} {'p50 agora':>10} {'Δ%':>8} {'p95 antes':>10} {'p95 agora':>10}")
+    for route, d in sorted(deltas.items(), key=lambda item: -(item[1]["p50_delta_pct"] or 0)):
+        delta = f"{d['p50_delta_pct']:+.1f}" if d["p50_delta_pct"] is not None else "-"
+        print(f"{route[:50]:<50} {d['p50_before_ms']:>10} {d['p50_after_ms']:>10} {delta:>8} "
+              f"{d['p95_before_ms']:>10} {d['p95_after_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay do tráfego gravado contra uma versão local do servidor")
+    parser.add_argument("capture", help="Arquivo de captura (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Aceleração em relação ao ritmo gravado (0 = sem espera)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--app-dir", default=".", help="Diretório da versão do servidor a testar")
+    parser.add_argument("--base-url", help="Servidor já em execução (com PARSE_REPLAY_FIXTURES)")
+    parser.add_argument("--parse-latency", type=float, default=1.0,
+                        help="Fração da latência gravada do Parse Server simulada no replay")
+    parser.add_argument("--limit", type=int, help="Reenviar só as primeiras N requisições")
+    parser.add_argument("--baseline", help="Resultado de uma execução anterior (--output) para comparar")
+    parser.add_argument("--output", help="Gravar o resumo desta execução em JSON")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    records = sorted((r for r in read_capture(args.capture) if r["kind"] == "http"), key=lambda r: r["t"])
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("Nenhuma requisição na captura")
+        return
+
+    process = None
+    data_dir = None
+    base_url = args.base_url
+    try:
+        if base_url is None:
+            data_dir = tempfile.mkdtemp(prefix="replay-data-")
+            process, base_url = start_server(args.app_dir, args.capture, args.parse_latency, args.timeout, data_dir)
+        results, elapsed = replay(records, base_url.rstrip("/"), args.speed, args.concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    summary = summarize(results)
+    report = {
+        "capture": args.capture,
+        "app_dir": os.path.abspath(args.app_dir) if args.base_url is None else args.base_url,
+        "requests": len(results),
+        "elapsed_seconds": round(elapsed, 2),
+        "speed": args.speed,
+        "errors": sum(1 for r in results if r["status"] is None),
+        "status_mismatches": sum(1 for r in results if r["status"] != r["captured_status"]),
+        "routes": summary,
+    }
+    print(json.dumps({k: v for k, v in report.items() if k != "routes"}, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["routes"]
+        print_deltas(compare(summary, baseline), f"comparado a {args.baseline}")
+    else:
+        print_deltas(compare(summary, summarize(results, "captured_latency_ms")), "comparado à captura")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
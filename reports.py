@@ -0,0 +1,311 @@
+import hashlib
+import html
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from importlib.util import find_spec
+
+from rate_limit import env_int
+from tenants import DEFAULT_TENANT
+
+# Relatórios prontos, endereçados pelo hash do conteúdo que os gerou:
+# se nem as respostas nem o catálogo mudaram, o relatório não é renderizado de novo
+REPORTS_DIR = os.environ.get("REPORTS_DIR", os.path.join("data", "reports"))
+REPORT_WORKERS = env_int("REPORT_WORKERS", os.cpu_count() or 2)
+
+# Alterar sempre que o layout mudar, para invalidar os relatórios em cache
+RENDERER_VERSION = "1"
+
+# Categorias cujas questões usam a escala Likert de 1 a 6
+LIKERT_CATEGORIES = ("academico", "licenciatura")
+LIKERT_VALUES = ("1", "2", "3", "4", "5", "6")
+
+
+class ReportFormatUnavailable(Exception):
+    pass
+
+
+def pdf_available():
+    # A geração de PDF é opcional e depende do weasyprint
+    return find_spec("weasyprint") is not None
+
+
+def report_key(payload, fmt):
+    """
+    Hash do conteúdo usado no relatório (questionário, questões e respostas).
+    """
+    content = json.dumps([RENDERER_VERSION, fmt, payload], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def report_path(key, fmt, tenant=DEFAULT_TENANT):
+    # Um diretório por instituição: a chave de um relatório não dá acesso aos de outra
+    return os.path.join(REPORTS_DIR, tenant, f"{key}.{fmt}")
+
+
+def _median(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return None
+    # Mediana a partir do histograma (média dos dois centrais se o total for par)
+    middle = [(total - 1) // 2, total // 2]
+    values = []
+    seen = 0
+    for value in sorted(histogram):
+        count = histogram[value]
+        for position in middle:
+            if seen <= position < seen + count:
+                values.append(value)
+        seen += count
+    return sum(values) / len(values)
+
+
+def _likert_summary(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return {"n": 0, "mean": None, "median": None}
+    mean = sum(value * count for value, count in histogram.items()) / total
+    return {"n": total, "mean": round(mean, 2), "median": _median(histogram)}
+
+
+def summarize(payload):
+    """
+    Calcula as distribuições de respostas de um questionário.
+
+    Args:
+        payload (dict): {"questionnaire": {...}, "questions": [...], "responses": [{"answers": [...]}]}
+
+    Returns:
+        dict: Resumo por questão e por categoria
+    """
+    questions = payload["questions"]
+    by_number = {q["number"]: q for q in questions}
+    counts = {q["id"]: {} for q in questions}
+
+    # Respostas já convertidas para pares [número, rótulo] (ver answer_parser)
+    for record in payload["responses"]:
+        for number, label in record.get("answers", []):
+            question = by_number.get(number)
+            if question is not None:
+                counts[question["id"]][label] = counts[question["id"]].get(label, 0) + 1
+
+    items = []
+    categories = OrderedDict()
+    for question in questions:
+        distribution = counts[question["id"]]
+        item = {
+            "number": question.get("number"),
+            "text": question.get("text"),
+            "category": question.get("category"),
+            "type": question.get("type"),
+            "options": question.get("options") or [],
+            "distribution": distribution,
+            "answered": sum(distribution.values()),
+        }
+        category = categories.setdefault(question.get("category") or "", {"questions": 0, "histogram": {}})
+        category["questions"] += 1
+
+        if question.get("type") == "likert" and question.get("category") in LIKERT_CATEGORIES:
+            # "Não sei responder" e "Não se aplica" ficam fora da média e da mediana
+            histogram = {int(v): distribution[v] for v in LIKERT_VALUES if v in distribution}
+            item["likert"] = _likert_summary(histogram)
+            for value, count in histogram.items():
+                category["histogram"][value] = category["histogram"].get(value, 0) + count
+        items.append(item)
+
+    return {
+        "questionnaire": payload["questionnaire"],
+        "responses": len(payload["responses"]),
+        "questions": items,
+        "categories": [
+            dict({"category": name, "questions": data["questions"]},
+                 **({"likert": _likert_summary(data["histogram"])} if data["histogram"] else {}))
+            for name, data in categories.items()
+        ],
+    }
+
+
+def render_html(summary):
+    """
+    Monta o relatório em HTML (autocontido, sem arquivos externos).
+    """
+    e = html.escape
+    questionnaire = summary["questionnaire"]
+    parts = [
+        "<!DOCTYPE html><html lang='pt-BR'><head><meta charset='utf-8'>",
+        f"<title>Relatório - {e(questionnaire.get('title') or '')}</title>",
+        "<style>body{font-family:Arial,sans-serif;margin:24px;color:#2c3e50}"
+        "table{border-collapse:collapse;width:100%;margin-bottom:16px}"
+        "td,th{border:1px solid #ddd;padding:4px 8px;text-align:left;font-size:13px}"
+        ".bar{background:#3498db;height:10px}h3{margin-bottom:4px}</style></head><body>",
+        f"<h1>{e(questionnaire.get('title') or '')}</h1>",
+        f"<p>{e(questionnaire.get('description') or '')}</p>",
+        f"<p>Respostas: <strong>{summary['responses']}</strong>"
+        f" &middot; Versão do catálogo: {e(str(questionnaire.get('catalog_version') or '-'))}</p>",
+        "<h2>Resumo por categoria</h2><table><tr><th>Categoria</th><th>Questões</th>"
+        "<th>Respostas (1-6)</th><th>Média</th><th>Mediana</th></tr>",
+    ]
+    for category in summary["categories"]:
+        likert = category.get("likert") or {}
+        parts.append(
+            f"<tr><td>{e(category['category'])}</td><td>{category['questions']}</td>"
+            f"<td>{likert.get('n', '-')}</td><td>{_fmt(likert.get('mean'))}</td>"
+            f"<td>{_fmt(likert.get('median'))}</td></tr>"
+        )
+    parts.append("</table><h2>Questões</h2>")
+
+    for item in summary["questions"]:
+        parts.append(f"<h3>{e(str(item['number']))}. {e(item['text'] or '')}</h3>")
+        likert = item.get("likert")
+        if likert:
+            parts.append(f"<p>Média: {_fmt(likert['mean'])} &middot; Mediana: {_fmt(likert['median'])}"
+                         f" &middot; n = {likert['n']}</p>")
+        parts.append("<table><tr><th>Alternativa</th><th>Respostas</th><th>%</th><th></th></tr>")
+        answered = item["answered"] or 1
+        for option in item["options"]:
+            label, text = option.get("label"), option.get("text")
+            count = item["distribution"].get(label, 0)
+            percent = 100.0 * count / answered
+            parts.append(
+                f"<tr><td>{e(label or '')} {e(text or '')}</td><td>{count}</td>"
+                f"<td>{percent:.1f}</td><td style='width:30%'><div class='bar' style='width:{percent:.1f}%'>"
+                f"</div></td></tr>"
+            )
+        parts.append("</table>")
+
+    parts.append(f"<p><small>Gerado em {time.strftime('%d/%m/%Y %H:%M')}</small></p></body></html>")
+    return "".join(parts)
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}".replace(".", ",")
+
+
+def render_report(payload, fmt, path):
+    """
+    Gera um relatório e grava em `path` (executado nos processos do pool).
+
+    Returns:
+        str: Caminho do arquivo gerado
+    """
+    document = render_html(summarize(payload))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if fmt == "pdf":
+        from weasyprint import HTML
+        HTML(string=document).write_pdf(tmp_path)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(document)
+    os.replace(tmp_path, path)
+    return path
+
+
+def check_format(fmt):
+    """
+    Raises:
+        ReportFormatUnavailable: Se o formato não existir ou não puder ser gerado aqui
+    """
+    if fmt not in ("html", "pdf"):
+        raise ReportFormatUnavailable(f"Formato desconhecido: {fmt}")
+    if fmt == "pdf" and not pdf_available():
+        raise ReportFormatUnavailable("Geração de PDF indisponível (instale o weasyprint)")
+
+
+class ReportRenderer:
+    """
+    Renderização dos relatórios em um pool de processos.
+
+    A geração é um job do JobScheduler ("generate-reports"): a thread do job
+    reúne os dados (acesso ao Parse Server fica no processo principal) e chama
+    `render_all`, que distribui a renderização entre os processos do pool.
+    Relatórios cujo conteúdo já foi renderizado são reaproveitados do disco
+    sem passar pelo pool.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS):
+        self.workers = max(1, workers)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.counters = {"rendered": 0, "cached": 0, "failed": 0}
+
+    def _executor(self):
+        # O pool só é criado no primeiro job (não pesa no startup)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def render_all(self, payloads, fmt, job=None, tenant=DEFAULT_TENANT):
+        """
+        Gera um relatório por payload.
+
+        Args:
+            payloads (list): Um payload por questionário
+            fmt (str): "html" ou "pdf"
+            job (JobContext, optional): Job em execução (progresso e cancelamento)
+            tenant (str): Instituição dona dos relatórios
+
+        Returns:
+            dict: Formato, totais e a lista de relatórios (questionário, chave, URL, status)
+        """
+        os.makedirs(os.path.join(REPORTS_DIR, tenant), exist_ok=True)
+        reports = []
+        futures = {}
+        for payload in payloads:
+            key = report_key(payload, fmt)
+            entry = {
+                "questionnaire": payload["questionnaire"].get("title"),
+                "key": key,
+                "url": f"/api/reports/files/{key}.{fmt}",
+                "status": "cached",
+            }
+            reports.append(entry)
+            path = report_path(key, fmt, tenant)
+            if not os.path.exists(path):
+                entry["status"] = "pending"
+                futures[self._executor().submit(render_report, payload, fmt, path)] = entry
+
+        done = len(reports) - len(futures)
+        if job is not None:
+            job.progress(done, len(reports), message="Renderizando relatórios")
+        pending = set(futures)
+        try:
+            while pending:
+                finished, pending = wait(pending, timeout=1.0)
+                for future in finished:
+                    entry = futures[future]
+                    error = future.exception()
+                    entry["status"] = "failed" if error else "rendered"
+                    if error:
+                        entry["error"] = str(error)
+                    done += 1
+                if job is not None and finished:
+                    job.progress(done, len(reports), message="Renderizando relatórios")
+                elif job is not None:
+                    job.check()
+        finally:
+            # Cancelamento: descartar o que ainda não começou a renderizar
+            for future in pending:
+                future.cancel()
+
+        counts = {status: sum(1 for r in reports if r["status"] == status) for status in ("cached", "rendered", "failed")}
+        with self._lock:
+            for status, count in counts.items():
+                self.counters[status] += count
+        if reports and counts["failed"] == len(reports):
+            raise RuntimeError(f"Nenhum relatório gerado: {reports[0].get('error')}")
+        return dict(format=fmt, total=len(reports), reports=reports, **counts)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "pool_started": self._pool is not None,
+                    "pdf_available": pdf_available(), **self.counters}
@@ -3,18 +3,16 @@ import shutil
 import json
 import subprocess
 import sys
+from importlib.util import find_spec
 
 def check_dependencies():
     """Verifica se as dependências necessárias estão instaladas."""
-    try:
-        import fastapi
-        import uvicorn
-        import pydantic
+    # find_spec localiza os pacotes sem importá-los (importar o fastapi é lento)
+    if all(find_spec(name) is not None for name in ("fastapi", "uvicorn", "pydantic")):
         print("✅ Dependências já instaladas.")
         return True
-    except ImportError:
-        print("⚠️ Algumas dependências estão faltando.")
-        return False
+    print("⚠️ Algumas dependências estão faltando.")
+    return False
 
 def install_dependencies():
     """Instala as dependências necessárias."""
@@ -108,10 +106,13 @@ def start_server():
         return
     
     try:
-        import uvicorn
         print("🚀 Iniciando servidor...")
         print("📊 Acesse o sistema em: http://localhost:8000")
-        os.system("uvicorn main:app --reload")
+        # O modo --reload mantém um processo extra observando arquivos; usar só em desenvolvimento
+        command = [sys.executable, "-m", "uvicorn", "main:app"]
+        if "--reload" in sys.argv or os.environ.get("RELOAD") == "1":
+            command.append("--reload")
+        subprocess.call(command)
     except Exception as e:
         print(f"⚠️ Erro ao iniciar o servidor: {e}")
 
@@ -0,0 +1,357 @@
+// Formulário do aluno com suporte offline (/forms/{id})
+//
+// O questionário vem do pacote /api/questionnaires/{id}/bundle, guardado pelo
+// service worker (sw.js). As respostas enviadas entram em uma fila local
+// (localStorage), cada uma com uma chave de idempotência, e são sincronizadas
+// em lotes por /api/responses/batch assim que houver conexão. Reenviar um
+// lote já gravado não duplica respostas: o servidor reconhece as chaves.
+
+const OUTBOX_KEY = 'enadeOutbox';
+const SYNC_INTERVAL = 30000;
+const TELEMETRY_INTERVAL = 10000;
+const TELEMETRY_MAX = 500;
+
+const questionnaireId = (window.location.pathname.match(/\/forms\/(\d+)/) || [])[1];
+const DRAFT_KEY = 'enadeOfflineDraft_' + questionnaireId;
+const BUNDLE_KEY = 'enadeOfflineBundle_' + questionnaireId;
+
+let bundle = null;
+let syncing = false;
+
+// Eventos de tempo por questão ainda não enviados (perdidos se a página fechar sem conexão)
+const telemetrySession = newIdempotencyKey().replace(/[^A-Za-z0-9_-]/g, '');
+let telemetryEvents = [];
+
+// ----- Fila de respostas -----
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+}
+
+function readOutbox() {
+    try {
+        return JSON.parse(localStorage.getItem(OUTBOX_KEY)) || [];
+    } catch (e) {
+        return [];
+    }
+}
+
+function writeOutbox(items) {
+    localStorage.setItem(OUTBOX_KEY, JSON.stringify(items));
+}
+
+function enqueue(submission) {
+    const items = readOutbox();
+    items.push(Object.assign({ idempotencyKey: newIdempotencyKey() }, submission));
+    writeOutbox(items);
+}
+
+// Envia a fila em lotes; respostas gravadas (ou já conhecidas pelo servidor) saem da fila
+async function syncOutbox() {
+    if (syncing || !navigator.onLine) return readOutbox().length;
+    syncing = true;
+    try {
+        const submitUrl = (bundle && bundle.submit_url) || '/api/responses/batch';
+        const batchSize = (bundle && bundle.max_batch) || 50;
+        let items = readOutbox();
+        while (items.length > 0) {
+            const batch = items.slice(0, batchSize);
+            const res = await fetch(submitUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ responses: batch })
+            });
+            if (!res.ok) break;  // servidor ocupado (429/503): tentar no próximo ciclo
+
+            const data = await res.json();
+            const done = {};
+            let progressed = false;
+            data.results.forEach(result => {
+                if (['created', 'duplicate', 'invalid'].indexOf(result.status) !== -1) {
+                    done[result.idempotencyKey] = true;
+                    progressed = true;
+                }
+            });
+            // Reler a fila: outra aba pode ter acrescentado respostas durante o envio
+            items = readOutbox().filter(item => !done[item.idempotencyKey]);
+            writeOutbox(items);
+            if (!progressed) break;
+        }
+    } catch (e) {
+        console.warn('Sincronização adiada:', e);
+    } finally {
+        syncing = false;
+        updateConnectionBar();
+    }
+    return readOutbox().length;
+}
+
+// ----- Tempo por questão -----
+
+function recordEvent(questionId, type) {
+    if (telemetryEvents.length >= TELEMETRY_MAX) return;
+    telemetryEvents.push({ question: questionId, type: type, t: Date.now() });
+}
+
+function flushTelemetry() {
+    if (!bundle || telemetryEvents.length === 0 || !navigator.onLine) return;
+    const body = JSON.stringify({
+        session: telemetrySession,
+        questionnaire: bundle.questionnaire.id,
+        events: telemetryEvents
+    });
+    telemetryEvents = [];
+    const url = bundle.telemetry_url || '/api/telemetry';
+    // sendBeacon continua funcionando quando a aba está sendo fechada
+    if (navigator.sendBeacon && navigator.sendBeacon(url, new Blob([body], { type: 'application/json' }))) return;
+    fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: body, keepalive: true })
+        .catch(() => {});
+}
+
+function observeQuestions() {
+    if (!('IntersectionObserver' in window)) return;
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (!entry.isIntersecting) return;
+            recordEvent(Number(entry.target.dataset.questionId), 'shown');
+            observer.unobserve(entry.target);
+        });
+    }, { threshold: 0.6 });
+    document.querySelectorAll('#questions .question').forEach(question => observer.observe(question));
+}
+
+// ----- Estado da conexão -----
+
+function updateConnectionBar() {
+    const bar = document.getElementById('connection-bar');
+    const pending = readOutbox().length;
+    let text = navigator.onLine ? 'Conectado.' : 'Sem conexão: você pode continuar respondendo normalmente.';
+    if (pending > 0) {
+        text += ' ' + pending + (pending === 1 ? ' resposta aguardando envio.' : ' respostas aguardando envio.');
+    }
+    bar.textContent = text;
+    bar.className = navigator.onLine ? '' : 'offline';
+}
+
+// ----- Formulário -----
+
+function optionsFor(question) {
+    if (question.type === 'multiple-choice') {
+        return (question.options || []).map(option => ({
+            value: option.label,
+            text: option.label + ') ' + option.text
+        }));
+    }
+    const values = ['1', '2', '3', '4', '5', '6'].map(v => ({ value: v, text: v }));
+    return values.concat([
+        { value: 'N', text: 'Não sei responder' },
+        { value: 'NA', text: 'Não se aplica' }
+    ]);
+}
+
+function renderForm() {
+    const questionnaire = bundle.questionnaire;
+    document.title = questionnaire.title;
+    document.getElementById('questionnaire-title').textContent = questionnaire.title;
+    document.getElementById('questionnaire-description').textContent = questionnaire.description || '';
+
+    const container = document.getElementById('questions');
+    container.innerHTML = '';
+    questionnaire.questions.forEach((question, index) => {
+        const questionDiv = document.createElement('div');
+        questionDiv.className = 'question';
+        questionDiv.dataset.questionId = question.id;
+
+        const text = document.createElement('div');
+        text.className = 'question-text';
+        text.textContent = (index + 1) + '. ' + question.text;
+        questionDiv.appendChild(text);
+
+        const options = document.createElement('div');
+        options.className = 'options';
+        let group = options;
+        if (question.type === 'likert') {
+            const scale = document.createElement('div');
+            scale.textContent = 'Escala: 1 (Discordo totalmente) a 6 (Concordo totalmente)';
+            options.appendChild(scale);
+            group = document.createElement('div');
+            group.className = 'likert-options';
+            options.appendChild(group);
+        }
+        optionsFor(question).forEach(option => {
+            const wrapper = document.createElement('div');
+            wrapper.className = 'option';
+            const input = document.createElement('input');
+            input.type = 'radio';
+            input.name = 'q' + index;
+            input.id = 'q' + index + 'opt' + option.value;
+            input.value = option.value;
+            const label = document.createElement('label');
+            label.htmlFor = input.id;
+            label.textContent = option.text;
+            wrapper.appendChild(input);
+            wrapper.appendChild(label);
+            group.appendChild(wrapper);
+        });
+        questionDiv.appendChild(options);
+        container.appendChild(questionDiv);
+    });
+
+    restoreDraft();
+    document.getElementById('questionnaire-form').style.display = 'block';
+    observeQuestions();
+}
+
+// Progresso salvo neste navegador, para retomar o preenchimento após fechar a página
+function saveDraft() {
+    const answers = {};
+    document.querySelectorAll('#questions input[type="radio"]:checked').forEach(input => {
+        answers[input.name] = input.value;
+    });
+    localStorage.setItem(DRAFT_KEY, JSON.stringify({
+        catalogVersion: bundle.catalog_version,
+        answers: answers,
+        studentName: document.getElementById('student-name').value,
+        studentId: document.getElementById('student-id').value,
+        studentEmail: document.getElementById('student-email').value
+    }));
+}
+
+function restoreDraft() {
+    let draft = null;
+    try {
+        draft = JSON.parse(localStorage.getItem(DRAFT_KEY));
+    } catch (e) {
+        draft = null;
+    }
+    if (!draft) return;
+    [['studentName', 'student-name'], ['studentId', 'student-id'], ['studentEmail', 'student-email']]
+        .forEach(([field, id]) => {
+            document.getElementById(id).value = draft[field] || '';
+        });
+    // Respostas de outra versão do questionário não são reaproveitadas
+    if (draft.catalogVersion !== bundle.catalog_version) return;
+    Object.keys(draft.answers || {}).forEach(name => {
+        const input = document.querySelector('#questions input[name="' + name + '"][value="' + draft.answers[name] + '"]');
+        if (input) input.checked = true;
+    });
+}
+
+function collectSubmission() {
+    const studentName = document.getElementById('student-name').value.trim();
+    const studentId = document.getElementById('student-id').value.trim();
+    const studentEmail = document.getElementById('student-email').value.trim();
+
+    if (!studentName || !studentId) {
+        alert('Por favor, preencha o nome e a matrícula.');
+        return null;
+    }
+
+    const responses = [];
+    const unanswered = [];
+    document.querySelectorAll('#questions .question').forEach((question, index) => {
+        const checked = question.querySelector('input[type="radio"]:checked');
+        if (!checked) {
+            unanswered.push(index + 1);
+            return;
+        }
+        responses.push({
+            question: question.querySelector('.question-text').textContent,
+            answer: checked.nextElementSibling.textContent
+        });
+    });
+
+    if (unanswered.length > 0) {
+        alert('Por favor, responda a todas as questões. Questões não respondidas: ' + unanswered.join(', '));
+        return null;
+    }
+
+    return {
+        studentName: studentName,
+        studentId: studentId,
+        studentEmail: studentEmail,
+        questionnaire: bundle.questionnaire.title,
+        submissionDate: new Date().toISOString(),
+        responses: responses
+    };
+}
+
+async function handleSubmit(event) {
+    event.preventDefault();
+    const submission = collectSubmission();
+    if (!submission) return;
+
+    const submitBtn = document.getElementById('submit-btn');
+    submitBtn.disabled = true;
+
+    // A resposta fica na fila local antes de qualquer tentativa de envio
+    enqueue(submission);
+    localStorage.removeItem(DRAFT_KEY);
+
+    const pending = await syncOutbox();
+    const resultMessage = document.getElementById('result-message');
+    if (pending === 0) {
+        resultMessage.className = 'success';
+        resultMessage.innerHTML = '<strong>Respostas enviadas com sucesso!</strong><br>Obrigado por completar o questionário.';
+    } else {
+        resultMessage.className = 'queued';
+        resultMessage.innerHTML = '<strong>Respostas guardadas neste dispositivo.</strong><br>' +
+            'Elas serão enviadas automaticamente quando a conexão voltar; mantenha esta página ou volte a abri-la mais tarde.';
+    }
+}
+
+// ----- Inicialização -----
+
+async function loadBundle() {
+    try {
+        const res = await fetch('/api/questionnaires/' + questionnaireId + '/bundle');
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        const data = await res.json();
+        localStorage.setItem(BUNDLE_KEY, JSON.stringify(data));
+        return data;
+    } catch (e) {
+        // Sem service worker (ou antes da primeira instalação): última cópia conhecida
+        const cached = localStorage.getItem(BUNDLE_KEY);
+        if (cached) return JSON.parse(cached);
+        throw e;
+    }
+}
+
+document.addEventListener('DOMContentLoaded', async function() {
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js')
+            .then(registration => {
+                if (navigator.onLine && registration.active) registration.active.postMessage('refresh');
+            })
+            .catch(error => console.warn('Service worker indisponível:', error));
+    }
+
+    try {
+        bundle = await loadBundle();
+    } catch (e) {
+        document.getElementById('connection-bar').textContent =
+            'Não foi possível carregar o questionário. Conecte-se à internet e abra esta página novamente.';
+        return;
+    }
+
+    renderForm();
+    updateConnectionBar();
+
+    document.getElementById('questionnaire-form').addEventListener('change', saveDraft);
+    document.getElementById('questions').addEventListener('change', event => {
+        const question = event.target.closest('.question');
+        if (question) recordEvent(Number(question.dataset.questionId), 'answered');
+    });
+    document.getElementById('questionnaire-form').addEventListener('input', saveDraft);
+    document.getElementById('questionnaire-form').addEventListener('submit', handleSubmit);
+
+    window.addEventListener('online', () => { updateConnectionBar(); syncOutbox(); });
+    window.addEventListener('offline', updateConnectionBar);
+    setInterval(syncOutbox, SYNC_INTERVAL);
+    setInterval(flushTelemetry, TELEMETRY_INTERVAL);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flushTelemetry();
+    });
+    syncOutbox();
+});
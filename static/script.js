@@ -50,10 +50,16 @@ function openTab(tabElement, tabId) {
 
 // Função para renderizar todas as questões
 function renderAllQuestions() {
+    renderQuestionList(allQuestions);
+    document.getElementById('questions-pager').style.display = 'none';
+}
+
+// Renderizar uma lista de questões no banco de questões
+function renderQuestionList(questions) {
     const container = document.getElementById('all-questions-container');
     container.innerHTML = '';
     
-    allQuestions.forEach(question => {
+    questions.forEach(question => {
         const questionDiv = document.createElement('div');
         questionDiv.className = 'question-item';
         questionDiv.dataset.id = question.id;
@@ -276,6 +282,17 @@ function deleteQuestionnaire(id) {
     renderSavedQuestionnaires();
 }
 
+// Instituição atendida por este servidor, gravada no formulário exportado
+let serverTenant = null;
+
+function loadServerTenant() {
+    if (serverTenant !== null) return Promise.resolve(serverTenant);
+    return fetch('/api/test')
+        .then(response => response.json())
+        .then(data => (serverTenant = data.tenant || ''))
+        .catch(() => (serverTenant = ''));
+}
+
 // Função para exportar questionário
 function exportQuestionnaire(id, format) {
     const questionnaire = savedQuestionnaires.find(q => q.id === id);
@@ -288,6 +305,15 @@ function exportQuestionnaire(id, format) {
     }
     
     if (format === 'html') {
+        if (serverTenant === null) {
+            loadServerTenant().then(() => exportQuestionnaire(id, format));
+            return;
+        }
+        // O formulário é aberto fora do servidor (arquivo local): as chamadas vão para a
+        // origem que o exportou, com a instituição no cabeçalho X-Tenant-Id
+        const apiHeaders = { 'Content-Type': 'application/json' };
+        if (serverTenant) apiHeaders['X-Tenant-Id'] = serverTenant;
+        
         let htmlContent = `
         <!DOCTYPE html>
         <html>
@@ -313,6 +339,7 @@ function exportQuestionnaire(id, format) {
                 <div id="connection-loader" style="border: 5px solid #f3f3f3; border-top: 5px solid #3498db; border-radius: 50%; width: 50px; height: 50px; animation: spin 2s linear infinite; margin: 20px auto;"></div>
                 <p id="connection-message">Por favor, aguarde. Isso pode levar alguns segundos.</p>
                 <button id="connection-retry" style="display: none; padding: 10px 20px; background-color: #3498db; color: white; border: none; border-radius: 4px; cursor: pointer; margin-top: 15px;">Tentar novamente</button>
+                <button id="connection-offline" style="display: none; padding: 10px 20px; background-color: #95a5a6; color: white; border: none; border-radius: 4px; cursor: pointer; margin-top: 10px; margin-left: auto; margin-right: auto;">Responder sem conexão</button>
               </div>
             </div>
 
@@ -404,6 +431,9 @@ function exportQuestionnaire(id, format) {
             <div id="result-message" style="display: none; margin-top: 20px; padding: 15px; border-radius: 5px;"></div>
             
             <script>
+                const API_BASE = ${JSON.stringify(window.location.origin)};
+                const API_HEADERS = ${JSON.stringify(apiHeaders)};
+                
                 // Código para verificar a conexão com o servidor antes de liberar o questionário
                 document.addEventListener('DOMContentLoaded', function() {
                   const connectionModal = document.getElementById('connection-modal');
@@ -411,6 +441,7 @@ function exportQuestionnaire(id, format) {
                   const connectionMessage = document.getElementById('connection-message');
                   const connectionRetry = document.getElementById('connection-retry');
                   const connectionLoader = document.getElementById('connection-loader');
+                  const connectionOffline = document.getElementById('connection-offline');
                   
                   // Desabilitar formulário até verificar conexão
                   const questionForm = document.getElementById('questions');
@@ -426,13 +457,12 @@ function exportQuestionnaire(id, format) {
                     connectionStatus.textContent = 'Verificando se o serviço está disponível...';
                     connectionLoader.style.display = 'block';
                     connectionRetry.style.display = 'none';
+                    connectionOffline.style.display = 'none';
                     
                     // Ping o servidor para verificar se está online
-                    fetch('https://enade-g7tqs52e.b4a.run/api/test', {
+                    fetch(API_BASE + '/api/test', {
                       method: 'GET',
-                      headers: {
-                        'Content-Type': 'application/json'
-                      }
+                      headers: API_HEADERS
                     })
                     .then(response => {
                       if (response.ok) {
@@ -458,19 +488,172 @@ function exportQuestionnaire(id, format) {
                     .catch(error => {
                       console.error('Erro ao verificar conexão:', error);
                       connectionStatus.textContent = 'Não foi possível conectar ao servidor';
-                      connectionMessage.innerHTML = 'O serviço parece estar inativo. Isso pode acontecer se o servidor estiver em modo de hibernação.<br><strong>Sugestão:</strong> Acesse <a href="https://enade-g7tqs52e.b4a.run" target="_blank">https://enade-g7tqs52e.b4a.run</a> para "acordar" o servidor antes de continuar.';
+                      connectionMessage.innerHTML = 'O serviço parece estar inativo. Isso pode acontecer se o servidor estiver em modo de hibernação.<br><strong>Sugestão:</strong> Acesse <a href="' + API_BASE + '" target="_blank">' + API_BASE + '</a> para "acordar" o servidor antes de continuar.';
                       connectionLoader.style.display = 'none';
                       connectionRetry.style.display = 'block';
+                      connectionOffline.style.display = 'block';
                     });
                   }
                   
                   // Configurar botão de retry
                   connectionRetry.addEventListener('click', checkConnection);
                   
+                  // As respostas ficam na fila local até a conexão voltar
+                  connectionOffline.addEventListener('click', function() {
+                    connectionModal.style.display = 'none';
+                    if (questionForm) questionForm.style.pointerEvents = 'auto';
+                    if (studentInfo) studentInfo.style.pointerEvents = 'auto';
+                    if (submitBtn) submitBtn.style.pointerEvents = 'auto';
+                  });
+                  
                   // Iniciar verificação
                   checkConnection();
                 });
 
+                // Rascunho no servidor: cada resposta marcada é enviada em pequenos patches,
+                // permitindo retomar o preenchimento se a conexão cair
+                const DRAFT_KEY = "enadeDraft_${questionnaire.title}";
+                let draftSessionId = localStorage.getItem(DRAFT_KEY);
+                let pendingAnswers = {};
+                let draftTimer = null;
+                
+                function questionTextOf(input) {
+                    return input.closest('.question').querySelector('.question-text').textContent;
+                }
+                
+                function ensureDraft() {
+                    if (draftSessionId) return Promise.resolve(draftSessionId);
+                    return fetch(API_BASE + "/api/drafts", {
+                        method: "POST",
+                        headers: API_HEADERS,
+                        body: JSON.stringify({ questionnaire: "${questionnaire.title}" })
+                    })
+                    .then(res => res.json())
+                    .then(data => {
+                        draftSessionId = data.sessionId;
+                        localStorage.setItem(DRAFT_KEY, draftSessionId);
+                        return draftSessionId;
+                    });
+                }
+                
+                function flushDraft() {
+                    if (Object.keys(pendingAnswers).length === 0) return;
+                    const answers = pendingAnswers;
+                    pendingAnswers = {};
+                    
+                    ensureDraft()
+                        .then(sessionId => fetch(API_BASE + "/api/drafts/" + sessionId, {
+                            method: "PATCH",
+                            headers: API_HEADERS,
+                            body: JSON.stringify({ answers: answers })
+                        }))
+                        .then(res => {
+                            if (res.status === 404) {
+                                // Rascunho expirou: criar outro com tudo que já foi respondido
+                                draftSessionId = null;
+                                localStorage.removeItem(DRAFT_KEY);
+                                document.querySelectorAll('#questions input[type="radio"]:checked').forEach(input => {
+                                    pendingAnswers[questionTextOf(input)] = input.nextElementSibling.textContent;
+                                });
+                                scheduleDraftSave();
+                            }
+                        })
+                        .catch(() => {
+                            // Sem conexão: manter as respostas para o próximo envio
+                            pendingAnswers = Object.assign(answers, pendingAnswers);
+                        });
+                }
+                
+                function scheduleDraftSave() {
+                    clearTimeout(draftTimer);
+                    draftTimer = setTimeout(flushDraft, 1500);
+                }
+                
+                document.querySelectorAll('#questions input[type="radio"]').forEach(input => {
+                    input.addEventListener('change', function() {
+                        pendingAnswers[questionTextOf(this)] = this.nextElementSibling.textContent;
+                        scheduleDraftSave();
+                    });
+                });
+                
+                // Retomar um rascunho existente
+                if (draftSessionId) {
+                    fetch(API_BASE + "/api/drafts/" + draftSessionId, { headers: API_HEADERS })
+                        .then(res => {
+                            if (!res.ok) throw new Error('Rascunho expirado');
+                            return res.json();
+                        })
+                        .then(draft => {
+                            document.querySelectorAll('#questions input[type="radio"]').forEach(input => {
+                                if (draft.answers[questionTextOf(input)] === input.nextElementSibling.textContent) {
+                                    input.checked = true;
+                                }
+                            });
+                        })
+                        .catch(() => {
+                            draftSessionId = null;
+                            localStorage.removeItem(DRAFT_KEY);
+                        });
+                }
+                
+                // Fila local de respostas: cada envio recebe uma chave de idempotência e é
+                // sincronizado em lotes, sem duplicar respostas se o lote for reenviado
+                const OUTBOX_KEY = "enadeOutbox";
+                let syncing = false;
+                
+                function readOutbox() {
+                    try {
+                        return JSON.parse(localStorage.getItem(OUTBOX_KEY)) || [];
+                    } catch (e) {
+                        return [];
+                    }
+                }
+                
+                function enqueueResponse(submission) {
+                    const key = (window.crypto && crypto.randomUUID)
+                        ? crypto.randomUUID()
+                        : Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 12);
+                    const items = readOutbox();
+                    items.push(Object.assign({ idempotencyKey: key }, submission));
+                    localStorage.setItem(OUTBOX_KEY, JSON.stringify(items));
+                }
+                
+                function syncOutbox() {
+                    const batch = readOutbox().slice(0, 50);
+                    if (syncing || batch.length === 0) return Promise.resolve(readOutbox().length);
+                    syncing = true;
+                    return fetch(API_BASE + "/api/responses/batch", {
+                        method: "POST",
+                        headers: API_HEADERS,
+                        body: JSON.stringify({ responses: batch })
+                    })
+                    .then(res => {
+                        if (!res.ok) throw new Error("Erro " + res.status);
+                        return res.json();
+                    })
+                    .then(data => {
+                        const done = {};
+                        data.results.forEach(result => {
+                            if (result.status === "created" || result.status === "duplicate" || result.status === "invalid") {
+                                done[result.idempotencyKey] = true;
+                            }
+                        });
+                        const remaining = readOutbox().filter(item => !done[item.idempotencyKey]);
+                        localStorage.setItem(OUTBOX_KEY, JSON.stringify(remaining));
+                        syncing = false;
+                        // Próximo lote, se houver
+                        return Object.keys(done).length > 0 && remaining.length > 0 ? syncOutbox() : remaining.length;
+                    })
+                    .catch(() => {
+                        syncing = false;
+                        return readOutbox().length;
+                    });
+                }
+                
+                window.addEventListener("online", syncOutbox);
+                setInterval(syncOutbox, 30000);
+                syncOutbox();
+                
                 // Validar o formulário antes de enviar
                 document.getElementById('submit-btn').addEventListener('click', function() {
                     const studentName = document.getElementById('student-name').value.trim();
@@ -548,16 +731,44 @@ function exportQuestionnaire(id, format) {
                     // Desabilitar o botão de envio para evitar múltiplos envios
                     document.getElementById('submit-btn').disabled = true;
                     
-                    // Em um sistema real, você enviaria os dados para um servidor
-                    // Enviar ao servidor FastAPI
-                    fetch("https://enade-g7tqs52e.b4a.run/api/responses", {
-                        method: "POST",
-                        headers: {
-                            "Content-Type": "application/json"
-                        },
-                        body: JSON.stringify(submission)
-                    })
-                    .then(res => res.json())
+                    // Enviar ao servidor FastAPI: se houver rascunho, basta finalizá-lo com as
+                    // respostas ainda não sincronizadas; senão, enviar o formulário completo
+                    clearTimeout(draftTimer);
+                    
+                    // Sem rascunho (ou rascunho expirado, ou sem conexão): a resposta entra na
+                    // fila local e é sincronizada em lote assim que possível
+                    function submitFull() {
+                        enqueueResponse(submission);
+                        localStorage.removeItem(DRAFT_KEY);
+                        return syncOutbox().then(pending => ({
+                            message: pending === 0
+                                ? "Resposta recebida com sucesso!"
+                                : "Sem conexão: as respostas ficaram guardadas neste navegador e serão enviadas automaticamente. Não feche esta página até a confirmação."
+                        }));
+                    }
+                    
+                    let request;
+                    if (draftSessionId) {
+                        request = fetch(API_BASE + "/api/drafts/" + draftSessionId + "/submit", {
+                            method: "POST",
+                            headers: API_HEADERS,
+                            body: JSON.stringify({
+                                answers: pendingAnswers,
+                                studentName: studentName,
+                                studentId: studentId,
+                                studentEmail: studentEmail
+                            })
+                        }).then(res => {
+                            if (res.status === 404) return submitFull();
+                            if (!res.ok) throw new Error("Erro " + res.status);
+                            localStorage.removeItem(DRAFT_KEY);
+                            return res.json();
+                        }, () => submitFull());
+                    } else {
+                        request = submitFull();
+                    }
+                    
+                    request
                     .then(data => {
                         resultMessage.innerHTML += "<br><em>" + data.message + "</em>";
                     })
@@ -610,7 +821,55 @@ function exportQuestionnaire(id, format) {
 }
 
 // Funções para manipular respostas dos alunos
+
+// Respostas já carregadas no painel; novas chegam pelo canal de eventos
+let currentResponses = [];
+let responsesStream = null;
+
 function loadResponses() {
+    fetch("/api/responses")
+        .then(res => res.json())
+        .then(responses => {
+            currentResponses = responses;
+            renderResponses();
+            connectResponsesStream();
+        })
+        .catch(err => {
+            console.error("Erro ao carregar respostas do servidor:", err);
+            document.getElementById('no-responses').style.display = 'block';
+        });
+}
+
+// Recebe apenas as respostas novas (Server-Sent Events) em vez de baixar a lista inteira de novo
+function connectResponsesStream() {
+    if (responsesStream || !window.EventSource) return;
+    
+    responsesStream = new EventSource("/api/responses/stream");
+    
+    responsesStream.addEventListener('response', event => {
+        const data = JSON.parse(event.data);
+        currentResponses.unshift(data.response);
+        renderResponses();
+    });
+    
+    // O servidor desconecta painéis que ficaram para trás: recarregar a lista completa
+    responsesStream.addEventListener('dropped', () => {
+        responsesStream.close();
+        responsesStream = null;
+        loadResponses();
+    });
+    
+    responsesStream.onerror = () => {
+        // O EventSource reconecta sozinho; eventos perdidos nesse intervalo
+        // são recuperados recarregando a lista quando a conexão volta
+        responsesStream.onopen = () => {
+            responsesStream.onopen = null;
+            loadResponses();
+        };
+    };
+}
+
+function renderResponses() {
     const questionnairesFilter = document.getElementById('filter-questionnaire').value;
     const studentSearch = document.getElementById('search-student').value.toLowerCase();
     
@@ -618,49 +877,42 @@ function loadResponses() {
     responsesContainer.innerHTML = '';
 
     const template = document.getElementById('response-template');
+    let responses = currentResponses;
 
-    fetch("/api/responses")
-        .then(res => res.json())
-        .then(responses => {
-            // Filtro por questionário
-            if (questionnairesFilter) {
-                responses = responses.filter(r => r.questionnaire === questionnairesFilter);
-            }
+    // Filtro por questionário
+    if (questionnairesFilter) {
+        responses = responses.filter(r => r.questionnaire === questionnairesFilter);
+    }
 
-            // Filtro por nome/matrícula
-            if (studentSearch) {
-                responses = responses.filter(r => 
-                    (r.studentName && r.studentName.toLowerCase().includes(studentSearch)) ||
-                    (r.studentId && r.studentId.toLowerCase().includes(studentSearch))
-                );
-            }
+    // Filtro por nome/matrícula
+    if (studentSearch) {
+        responses = responses.filter(r => 
+            (r.studentName && r.studentName.toLowerCase().includes(studentSearch)) ||
+            (r.studentId && r.studentId.toLowerCase().includes(studentSearch))
+        );
+    }
 
-            if (responses.length === 0) {
-                document.getElementById('no-responses').style.display = 'block';
-                return;
-            } else {
-                document.getElementById('no-responses').style.display = 'none';
-            }
+    if (responses.length === 0) {
+        document.getElementById('no-responses').style.display = 'block';
+        return;
+    } else {
+        document.getElementById('no-responses').style.display = 'none';
+    }
 
-            responses.forEach((response, index) => {
-                const clone = document.importNode(template.content, true);
-                
-                clone.querySelector('.student-name').textContent = response.studentName;
-                clone.querySelector('.student-id').textContent = response.studentId;
-                clone.querySelector('.questionnaire-name').textContent = response.questionnaire;
-                clone.querySelector('.submission-date').textContent = new Date(response.submissionDate).toLocaleString();
-                
-                const viewButton = clone.querySelector('.btn');
-                viewButton.setAttribute('data-index', index);
-                viewButton.onclick = () => showResponseDetails(response);
+    responses.forEach((response, index) => {
+        const clone = document.importNode(template.content, true);
+        
+        clone.querySelector('.student-name').textContent = response.studentName;
+        clone.querySelector('.student-id').textContent = response.studentId;
+        clone.querySelector('.questionnaire-name').textContent = response.questionnaire;
+        clone.querySelector('.submission-date').textContent = new Date(response.submissionDate).toLocaleString();
+        
+        const viewButton = clone.querySelector('.btn');
+        viewButton.setAttribute('data-index', index);
+        viewButton.onclick = () => showResponseDetails(response);
 
-                responsesContainer.appendChild(clone);
-            });
-        })
-        .catch(err => {
-            console.error("Erro ao carregar respostas do servidor:", err);
-            document.getElementById('no-responses').style.display = 'block';
-        });
+        responsesContainer.appendChild(clone);
+    });
 }
 
 function showResponseDetails(responseData) {
@@ -774,29 +1026,72 @@ function populateQuestionnaireFilter() {
     });
 }
 
-// Filtrar questões
+// Filtrar questões usando a busca do servidor (índice com acentos normalizados e facetas)
+const QUESTION_SEARCH_PAGE_SIZE = 20;
+let filterQuestionsTimer = null;
+let questionSearchSeq = 0;
+
 function filterQuestions() {
-    const searchText = document.getElementById('search-questions').value.toLowerCase();
+    clearTimeout(filterQuestionsTimer);
+    filterQuestionsTimer = setTimeout(() => runQuestionSearch(1), 150);
+}
+
+function runQuestionSearch(page) {
+    const searchText = document.getElementById('search-questions').value;
     const categoryFilter = document.getElementById('filter-category').value;
     const typeFilter = document.getElementById('filter-type').value;
     
-    const questions = document.querySelectorAll('#all-questions-container .question-item');
+    // Sem busca nem filtros, o banco completo já carregado é exibido
+    if (!searchText.trim() && !categoryFilter && !typeFilter) {
+        questionSearchSeq++;
+        renderAllQuestions();
+        return;
+    }
     
-    questions.forEach(question => {
-        const text = question.querySelector('.question-text').textContent.toLowerCase();
-        const category = question.dataset.category;
-        const type = question.dataset.type;
-        
-        const matchesSearch = searchText === '' || text.includes(searchText);
-        const matchesCategory = categoryFilter === '' || category === categoryFilter;
-        const matchesType = typeFilter === '' || type === typeFilter;
-        
-        if (matchesSearch && matchesCategory && matchesType) {
-            question.style.display = '';
-        } else {
-            question.style.display = 'none';
-        }
-    });
+    const params = new URLSearchParams({ q: searchText, page: page, page_size: QUESTION_SEARCH_PAGE_SIZE });
+    if (categoryFilter) params.set('category', categoryFilter);
+    if (typeFilter) params.set('type', typeFilter);
+    
+    // Respostas de buscas anteriores que chegarem atrasadas são descartadas
+    const seq = ++questionSearchSeq;
+    fetch('/api/questions/search?' + params.toString())
+        .then(response => response.json())
+        .then(data => {
+            if (seq !== questionSearchSeq) return;
+            renderQuestionList(data.results);
+            renderQuestionsPager(data);
+        })
+        .catch(error => {
+            console.error('Erro ao buscar questões:', error);
+        });
+}
+
+// Navegação entre as páginas de resultados da busca
+function renderQuestionsPager(data) {
+    const pager = document.getElementById('questions-pager');
+    const pages = Math.max(1, Math.ceil(data.total / data.page_size));
+    pager.innerHTML = '';
+    
+    const prev = document.createElement('button');
+    prev.className = 'btn btn-secondary';
+    prev.textContent = 'Anterior';
+    prev.disabled = data.page <= 1;
+    prev.onclick = () => runQuestionSearch(data.page - 1);
+    
+    const info = document.createElement('span');
+    info.style.margin = '0 10px';
+    info.textContent = `Página ${Math.min(data.page, pages)} de ${pages} (${data.total} questões)`;
+    
+    const next = document.createElement('button');
+    next.className = 'btn btn-secondary';
+    next.textContent = 'Próxima';
+    next.disabled = data.page >= pages;
+    next.onclick = () => runQuestionSearch(data.page + 1);
+    
+    pager.appendChild(prev);
+    pager.appendChild(info);
+    pager.appendChild(next);
+    pager.style.display = '';
 }
 
 // Filtrar questões para adicionar
@@ -1009,5 +1304,6 @@ window.viewQuestionnaire = viewQuestionnaire;
 window.removeQuestionFromCurrentQuestionnaire = removeQuestionFromCurrentQuestionnaire;
 window.viewResponse = viewResponse;
 window.loadResponses = loadResponses;
+window.renderResponses = renderResponses;
 window.selectQuestionsLicenciaturas = selectQuestionsLicenciaturas;
 window.selectQuestionsOutrosCursos = selectQuestionsOutrosCursos;
@@ -0,0 +1,94 @@
+// Service worker do formulário offline (/forms/{id})
+// Guarda os formulários e os pacotes dos questionários listados em /api/offline/manifest,
+// para que o aluno possa abrir e preencher o questionário sem conexão.
+const CACHE_NAME = 'enade-offline-v1';
+const MANIFEST_URL = '/api/offline/manifest';
+
+// Atualiza o cache a partir do manifesto, removendo o que não está mais listado
+function refreshCache() {
+    return fetch(MANIFEST_URL, { cache: 'no-store' })
+        .then(res => {
+            if (!res.ok) throw new Error('Manifesto indisponível');
+            return res.json();
+        })
+        .then(manifest => caches.open(CACHE_NAME).then(cache => {
+            return cache.match(MANIFEST_URL)
+                .then(cached => cached ? cached.json() : null)
+                .then(previous => {
+                    if (previous && previous.version === manifest.version) return;
+                    return cache.addAll(manifest.precache)
+                        .then(() => cache.keys())
+                        .then(keys => Promise.all(keys.map(request => {
+                            const path = new URL(request.url).pathname;
+                            if (path !== MANIFEST_URL && manifest.precache.indexOf(path) === -1) {
+                                return cache.delete(request);
+                            }
+                        })))
+                        .then(() => cache.put(MANIFEST_URL, new Response(JSON.stringify(manifest), {
+                            headers: { 'Content-Type': 'application/json' }
+                        })));
+                });
+        }));
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(refreshCache().then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(names.filter(name => name !== CACHE_NAME).map(name => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+// A página pede uma atualização sempre que abre com conexão
+self.addEventListener('message', event => {
+    if (event.data === 'refresh') {
+        event.waitUntil(refreshCache().catch(() => {}));
+    }
+});
+
+// Rede primeiro, guardando a resposta; sem conexão, a cópia em cache
+function networkFirst(request) {
+    return caches.open(CACHE_NAME).then(cache => fetch(request)
+        .then(res => {
+            if (res.ok) cache.put(request, res.clone());
+            return res;
+        })
+        .catch(() => cache.match(request).then(cached => {
+            if (cached) return cached;
+            throw new Error('Sem conexão e sem cópia local');
+        })));
+}
+
+// Cópia em cache imediatamente, atualizada em segundo plano
+function staleWhileRevalidate(request) {
+    return caches.open(CACHE_NAME).then(cache => cache.match(request).then(cached => {
+        const update = fetch(request)
+            .then(res => {
+                if (res.ok) cache.put(request, res.clone());
+                return res;
+            });
+        if (cached) {
+            update.catch(() => {});
+            return cached;
+        }
+        return update;
+    }));
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (/^\/api\/questionnaires\/\d+\/bundle$/.test(url.pathname)) {
+        event.respondWith(networkFirst(request));
+    } else if (/^\/forms\/\d+$/.test(url.pathname) || url.pathname === '/offline-form.js') {
+        event.respondWith(staleWhileRevalidate(request));
+    }
+});
@@ -0,0 +1,329 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from rate_limit import env_float, env_int
+from tenants import DEFAULT_TENANT
+
+# Tempo de resposta por questão: o formulário envia em lotes os eventos "shown"
+# (questão exibida) e "answered" (questão respondida). A ingestão só acumula os
+# eventos em memória; uma thread os grava em um log gzip e calcula os histogramas.
+TELEMETRY_DIR = os.environ.get("TELEMETRY_DIR", os.path.join("data", "telemetry"))
+TELEMETRY_BATCH_MAX = env_int("TELEMETRY_BATCH_MAX", 500)
+# Eventos em memória por instituição; com o buffer cheio, os mais antigos são descartados
+TELEMETRY_BUFFER_SIZE = env_int("TELEMETRY_BUFFER_SIZE", 200000)
+TELEMETRY_FLUSH_INTERVAL = env_float("TELEMETRY_FLUSH_INTERVAL", 5.0)
+# Questões exibidas e ainda não respondidas, aguardando o evento "answered"
+TELEMETRY_OPEN_MAX = env_int("TELEMETRY_OPEN_MAX", 100000)
+# Tempos acima disso (aba esquecida aberta) não entram no histograma
+TELEMETRY_MAX_DWELL = env_float("TELEMETRY_MAX_DWELL", 30 * 60.0)
+# Histogramas (questionário, questão) por instituição; pares novos além disso são descartados
+TELEMETRY_HISTOGRAMS_MAX = env_int("TELEMETRY_HISTOGRAMS_MAX", 20000)
+
+EVENT_TYPES = ("shown", "answered")
+
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Limites superiores (segundos) das faixas do histograma; a última faixa é aberta
+DWELL_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+
+
+class InvalidTelemetry(Exception):
+    pass
+
+
+def parse_batch(data):
+    """
+    Valida um lote de eventos enviado pelo formulário.
+
+    Formato: {"session": "...", "questionnaire": 3,
+              "events": [{"question": 12, "type": "shown", "t": 1718000000000}, ...]}
+    onde `question` é o id da questão no catálogo e `t` o instante em milissegundos.
+
+    Returns:
+        tuple: (sessão, questionário, lista de (questão, tipo, t), eventos rejeitados)
+
+    Raises:
+        InvalidTelemetry: Se o lote não tiver sessão, questionário ou lista de eventos
+    """
+    if not isinstance(data, dict):
+        raise InvalidTelemetry("Lote de eventos inválido")
+    session = data.get("session")
+    if not isinstance(session, str) or not SESSION_ID.match(session):
+        raise InvalidTelemetry("Sessão inválida")
+    questionnaire = data.get("questionnaire")
+    if isinstance(questionnaire, str) and questionnaire.isdigit():
+        questionnaire = int(questionnaire)
+    if not isinstance(questionnaire, int) or isinstance(questionnaire, bool):
+        raise InvalidTelemetry("Questionário inválido")
+    events = data.get("events")
+    if not isinstance(events, list):
+        raise InvalidTelemetry("Informe a lista de eventos em \"events\"")
+
+    accepted = []
+    rejected = 0
+    for event in events:
+        try:
+            question, kind, t = event["question"], event["type"], event["t"]
+        except (TypeError, KeyError):
+            rejected += 1
+            continue
+        if (kind not in EVENT_TYPES or not isinstance(question, int) or isinstance(question, bool)
+                or not isinstance(t, (int, float)) or t <= 0):
+            rejected += 1
+            continue
+        accepted.append((question, kind, int(t)))
+    return session, questionnaire, accepted, rejected
+
+
+class DwellHistogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self, counts=None, total=0.0, n=0):
+        self.counts = counts or [0] * (len(DWELL_BUCKETS) + 1)
+        self.total = total
+        self.n = n
+
+    def add(self, seconds):
+        index = len(DWELL_BUCKETS)
+        for i, bound in enumerate(DWELL_BUCKETS):
+            if seconds <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total += seconds
+        self.n += 1
+
+    def quantile(self, q):
+        """
+        Quantil aproximado, interpolando dentro da faixa em que ele cai
+        (a faixa aberta usa o limite da última faixa fechada).
+        """
+        if self.n == 0:
+            return None
+        target = q * self.n
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                lower = DWELL_BUCKETS[i - 1] if i > 0 else 0
+                upper = DWELL_BUCKETS[i] if i < len(DWELL_BUCKETS) else DWELL_BUCKETS[-1]
+                return round(lower + (upper - lower) * (target - seen) / count, 2)
+            seen += count
+        return float(DWELL_BUCKETS[-1])
+
+    def to_dict(self):
+        return {"counts": self.counts, "total": self.total, "n": self.n}
+
+    def summary(self):
+        return {
+            "count": self.n,
+            "mean_seconds": round(self.total / self.n, 2) if self.n else None,
+            "p50_seconds": self.quantile(0.5),
+            "p90_seconds": self.quantile(0.9),
+            "buckets": [
+                {"le": DWELL_BUCKETS[i] if i < len(DWELL_BUCKETS) else None, "count": count}
+                for i, count in enumerate(self.counts)
+            ],
+        }
+
+
+class TelemetryPipeline:
+    """
+    Ingestão dos eventos de tempo de resposta, sem acesso ao Parse Server.
+
+    `ingest` apenas acrescenta os eventos ao buffer circular da instituição
+    (um deque com tamanho máximo), o que mantém a rota barata mesmo com
+    milhares de eventos por segundo. A cada `flush_interval` segundos uma
+    thread esvazia os buffers, grava os eventos em
+    data/telemetry/{instituição}/events-AAAA-MM-DD.jsonl.gz (um membro gzip
+    por gravação, só acrescentando ao arquivo) e atualiza os histogramas de
+    tempo por questão, gravados em dwell.json. Cada instituição tem no máximo
+    `max_histograms` histogramas.
+    """
+
+    def __init__(self, directory=TELEMETRY_DIR, buffer_size=TELEMETRY_BUFFER_SIZE,
+                 flush_interval=TELEMETRY_FLUSH_INTERVAL, max_open=TELEMETRY_OPEN_MAX,
+                 max_dwell=TELEMETRY_MAX_DWELL, max_histograms=TELEMETRY_HISTOGRAMS_MAX):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_open = max_open
+        self.max_dwell = max_dwell
+        self.max_histograms = max_histograms
+        self._buffers = {}
+        self._open = OrderedDict()
+        self._histograms = {}
+        self._histogram_counts = {}  # instituição -> quantidade de histogramas
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self.counters = {"received": 0, "rejected": 0, "dropped": 0, "written": 0, "paired": 0,
+                         "discarded_dwell": 0, "discarded_histograms": 0, "flushes": 0}
+
+    def _tenant_dir(self, tenant):
+        return os.path.join(self.directory, tenant)
+
+    def load(self):
+        """Recupera os histogramas gravados (chamado no startup)."""
+        if not os.path.isdir(self.directory):
+            return
+        for tenant in os.listdir(self.directory):
+            path = os.path.join(self._tenant_dir(tenant), "dwell.json")
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Erro ao carregar histogramas de {tenant}: {e}")
+                continue
+            with self._lock:
+                for entry in stored:
+                    key = (tenant, entry["questionnaire"], entry["question"])
+                    if key not in self._histograms:
+                        self._histogram_counts[tenant] = self._histogram_counts.get(tenant, 0) + 1
+                    self._histograms[key] = DwellHistogram(entry["counts"], entry["total"], entry["n"])
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="telemetry-flush", daemon=True)
+            self._flusher.start()
+
+    def ingest(self, session, questionnaire, events, rejected=0, tenant=DEFAULT_TENANT):
+        """
+        Acrescenta um lote validado (ver `parse_batch`) ao buffer da instituição.
+
+        Returns:
+            int: Eventos descartados por falta de espaço no buffer
+        """
+        buffer = self._buffers.get(tenant)
+        if buffer is None:
+            buffer = self._buffers.setdefault(tenant, deque(maxlen=self.buffer_size))
+        dropped = max(0, len(buffer) + len(events) - self.buffer_size)
+        buffer.extend((session, questionnaire, question, kind, t) for question, kind, t in events)
+        with self._lock:
+            self.counters["received"] += len(events)
+            self.counters["rejected"] += rejected
+            self.counters["dropped"] += dropped
+        return dropped
+
+    def flush(self):
+        """Grava os eventos acumulados e atualiza os histogramas."""
+        with self._flush_lock:
+            for tenant, buffer in list(self._buffers.items()):
+                events = []
+                # popleft é atômico: eventos que chegam durante a gravação ficam para a próxima
+                for _ in range(len(buffer)):
+                    events.append(buffer.popleft())
+                if not events:
+                    continue
+                self._append_log(tenant, events)
+                if self._aggregate(tenant, events):
+                    self._save_histograms(tenant)
+                with self._lock:
+                    self.counters["written"] += len(events)
+            with self._lock:
+                self.counters["flushes"] += 1
+
+    def _append_log(self, tenant, events):
+        directory = self._tenant_dir(tenant)
+        os.makedirs(directory, exist_ok=True)
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        lines = "".join(
+            json.dumps({"session": s, "questionnaire": qn, "question": q, "type": kind, "t": t},
+                       separators=(",", ":")) + "\n"
+            for s, qn, q, kind, t in events
+        )
+        # Cada gravação é um membro gzip completo; o arquivo pode ser lido com gzip.open
+        with open(os.path.join(directory, f"events-{day}.jsonl.gz"), "ab") as f:
+            f.write(gzip.compress(lines.encode("utf-8")))
+
+    def _aggregate(self, tenant, events):
+        """
+        Forma os pares "shown" -> "answered" de cada sessão e questão.
+
+        Returns:
+            bool: Se algum histograma mudou
+        """
+        changed = False
+        # Lotes de abas diferentes podem chegar fora de ordem
+        events.sort(key=lambda event: event[4])
+        with self._lock:
+            for session, questionnaire, question, kind, t in events:
+                key = (tenant, session, questionnaire, question)
+                if kind == "shown":
+                    # Questão exibida de novo (voltou na página): vale a primeira exibição
+                    if key not in self._open:
+                        self._open[key] = t
+                        if len(self._open) > self.max_open:
+                            self._open.popitem(last=False)
+                    continue
+                shown = self._open.pop(key, None)
+                if shown is None:
+                    continue  # resposta alterada depois, ou exibição perdida
+                seconds = (t - shown) / 1000.0
+                if seconds < 0 or seconds > self.max_dwell:
+                    self.counters["discarded_dwell"] += 1
+                    continue
+                histogram = self._histograms.get((tenant, questionnaire, question))
+                if histogram is None:
+                    if self._histogram_counts.get(tenant, 0) >= self.max_histograms:
+                        self.counters["discarded_histograms"] += 1
+                        continue
+                    self._histogram_counts[tenant] = self._histogram_counts.get(tenant, 0) + 1
+                    histogram = self._histograms[(tenant, questionnaire, question)] = DwellHistogram()
+                histogram.add(seconds)
+                self.counters["paired"] += 1
+                changed = True
+        return changed
+
+    def _save_histograms(self, tenant):
+        with self._lock:
+            entries = [
+                {"questionnaire": qn, "question": q, **histogram.to_dict()}
+                for (owner, qn, q), histogram in self._histograms.items() if owner == tenant
+            ]
+        path = os.path.join(self._tenant_dir(tenant), "dwell.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao gravar telemetria: {e}")
+
+    def dwell_times(self, tenant=DEFAULT_TENANT, questionnaire=None):
+        """
+        Histogramas de tempo por questão, das mais demoradas (mediana) para as mais rápidas.
+
+        Returns:
+            list: {questionnaire, question, count, mean_seconds, p50_seconds, p90_seconds, buckets}
+        """
+        with self._lock:
+            items = [
+                {"questionnaire": qn, "question": q, **histogram.summary()}
+                for (owner, qn, q), histogram in self._histograms.items()
+                if owner == tenant and (questionnaire is None or qn == questionnaire)
+            ]
+        return sorted(items, key=lambda item: item["p50_seconds"] or 0, reverse=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered": sum(len(buffer) for buffer in self._buffers.values()),
+                "buffer_size": self.buffer_size,
+                "open_questions": len(self._open),
+                "histograms": len(self._histograms),
+                "max_histograms": self.max_histograms,
+                **self.counters,
+            }
@@ -0,0 +1,180 @@
+import contextvars
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from rate_limit import ConcurrencyLimiter, RateLimiter, env_float, env_int
+
+# Instituições (campi) atendidas, cada uma com sua própria aplicação no Parse Server.
+# Formato de data/tenants.json:
+# {
+#   "campus-centro": {
+#     "appId": "...", "restApiKey": "...", "serverUrl": "https://...",
+#     "hosts": ["centro.enade.exemplo.edu.br"],
+#     "maxConcurrency": 4, "maxQueue": 16,
+#     "rateLimits": {"submit": [60, 20]}
+#   }
+# }
+TENANTS_FILE = os.environ.get("TENANTS_FILE", os.path.join("data", "tenants.json"))
+TENANT_HEADER = "x-tenant-id"
+DEFAULT_TENANT = "default"
+
+# Quantidade de instituições com catálogo mantido em memória ao mesmo tempo
+TENANT_CACHE_SLOTS = env_int("TENANT_CACHE_SLOTS", 16)
+
+TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+class UnknownTenant(Exception):
+    pass
+
+
+class Tenant:
+    """
+    Uma instituição: credenciais do Parse Server, hosts e cotas próprias.
+    """
+
+    def __init__(self, tenant_id, app_id, rest_api_key, server_url, hosts=(), rate_overrides=None,
+                 max_concurrency=None, max_queue=None, queue_timeout=None):
+        self.id = tenant_id
+        self.app_id = app_id
+        self.rest_api_key = rest_api_key
+        self.server_url = server_url.rstrip("/")
+        self.hosts = tuple(h.lower() for h in hosts)
+        self.headers = {
+            "X-Parse-Application-Id": app_id,
+            "X-Parse-REST-API-Key": rest_api_key,
+            "Content-Type": "application/json"
+        }
+        # Cotas por instituição: o pico de uma não esgota a fila nem os baldes das outras
+        self.limiter = ConcurrencyLimiter(
+            max_concurrent=max_concurrency or env_int("TENANT_MAX_CONCURRENCY", 4),
+            max_queue=max_queue or env_int("TENANT_MAX_QUEUE", 16),
+            queue_timeout=queue_timeout or env_float("PARSE_QUEUE_TIMEOUT", 5.0),
+        )
+        # Baldes de taxa próprios, criados pelo TenantRegistry com as regras padrão + ajustes
+        self.rate_overrides = {name: tuple(rule) for name, rule in (rate_overrides or {}).items()}
+        self.rate_limiter = None
+
+    @property
+    def is_default(self):
+        return self.id == DEFAULT_TENANT
+
+    def storage_name(self, name):
+        """Nome de arquivo/diretório local (a instituição padrão mantém os nomes antigos)."""
+        return name if self.is_default else f"{name}-{self.id}"
+
+    def stats(self):
+        return {"hosts": list(self.hosts), "parse_concurrency": self.limiter.stats(),
+                "rate_limits": self.rate_limiter.stats()}
+
+
+class TenantRegistry:
+    """
+    Resolve a instituição de cada requisição, pelo cabeçalho X-Tenant-Id ou pelo host.
+    """
+
+    def __init__(self, default, rate_rules, path=TENANTS_FILE):
+        self.rate_rules = dict(rate_rules)
+        self.default = default
+        self.tenants = {}
+        self.by_host = {}
+        self._register(default)
+        self._load(path)
+
+    def _register(self, tenant):
+        rules = dict(self.rate_rules, **tenant.rate_overrides)
+        tenant.rate_limiter = RateLimiter(rules, max_keys=env_int("RATE_LIMIT_MAX_CLIENTS", 10000))
+        self.tenants[tenant.id] = tenant
+        for host in tenant.hosts:
+            self.by_host[host] = tenant
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        for tenant_id, data in config.items():
+            if not TENANT_ID.match(tenant_id):
+                print(f"Identificador de instituição inválido ignorado: {tenant_id}")
+                continue
+            self._register(Tenant(
+                tenant_id,
+                data["appId"],
+                data["restApiKey"],
+                data.get("serverUrl", self.default.server_url),
+                hosts=data.get("hosts", []),
+                rate_overrides=data.get("rateLimits"),
+                max_concurrency=data.get("maxConcurrency"),
+                max_queue=data.get("maxQueue"),
+            ))
+
+    def resolve(self, host=None, header=None):
+        """
+        Raises:
+            UnknownTenant: Se o cabeçalho indicar uma instituição não cadastrada
+        """
+        if header:
+            tenant = self.tenants.get(header.strip().lower())
+            if tenant is None:
+                raise UnknownTenant(header)
+            return tenant
+        if host:
+            tenant = self.by_host.get(host.split(":")[0].lower())
+            if tenant is not None:
+                return tenant
+        return self.default
+
+    def stats(self):
+        return {tenant_id: tenant.stats() for tenant_id, tenant in self.tenants.items()}
+
+
+class TenantCaches:
+    """
+    Estado em memória por instituição (catálogo, questionários, índice de busca),
+    com no máximo `max_tenants` instituições carregadas.
+
+    A instituição usada há mais tempo é descartada quando o limite é atingido;
+    ao voltar, seu estado é recriado a partir dos snapshots em disco.
+    """
+
+    def __init__(self, factory, max_tenants=TENANT_CACHE_SLOTS):
+        self.factory = factory
+        self.max_tenants = max(1, max_tenants)
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+        self.counters = {"created": 0, "evicted": 0}
+
+    def get(self, tenant):
+        with self._lock:
+            state = self._states.get(tenant.id)
+            if state is not None:
+                self._states.move_to_end(tenant.id)
+                return state
+
+        # Criado fora do lock: carregar o catálogo de uma instituição não bloqueia as outras
+        state = self.factory(tenant)
+        with self._lock:
+            existing = self._states.get(tenant.id)
+            if existing is not None:
+                return existing
+            self._states[tenant.id] = state
+            self.counters["created"] += 1
+            while len(self._states) > self.max_tenants:
+                self._states.popitem(last=False)
+                self.counters["evicted"] += 1
+        return state
+
+    def peek(self, tenant):
+        with self._lock:
+            return self._states.get(tenant.id)
+
+    def stats(self):
+        with self._lock:
+            return {"loaded": len(self._states), "max_tenants": self.max_tenants, **self.counters}
+
+
+# Instituição da requisição em andamento (propagada para o threadpool e as threads de revalidação)
+current_tenant = contextvars.ContextVar("current_tenant")
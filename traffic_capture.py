@@ -0,0 +1,419 @@
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode
+
+from rate_limit import env_float, env_int
+
+# Captura de tráfego para reproduzir localmente a carga de produção:
+# - TRAFFIC_CAPTURE=1 grava as requisições recebidas e as chamadas ao Parse Server
+#   (anonimizadas) em data/captures/capture-*.jsonl.gz
+# - PARSE_REPLAY_FIXTURES=<arquivo> faz o Parse Server ser respondido pelas chamadas
+#   gravadas, sem rede (usado por replay.py)
+CAPTURE_DIR = os.environ.get("CAPTURE_DIR", os.path.join("data", "captures"))
+CAPTURE_ENABLED = os.environ.get("TRAFFIC_CAPTURE", "0") == "1"
+# Chave dos pseudônimos; sem ela, uma chave aleatória por processo (irreversível)
+CAPTURE_SALT = os.environ.get("TRAFFIC_CAPTURE_SALT", "")
+CAPTURE_FLUSH_RECORDS = env_int("TRAFFIC_CAPTURE_FLUSH_RECORDS", 200)
+CAPTURE_FLUSH_INTERVAL = env_float("TRAFFIC_CAPTURE_FLUSH_INTERVAL", 5.0)
+REPLAY_FIXTURES = os.environ.get("PARSE_REPLAY_FIXTURES", "")
+# Fração da latência gravada do Parse Server simulada no replay (0 = respostas imediatas)
+REPLAY_LATENCY = env_float("PARSE_REPLAY_LATENCY", 1.0)
+
+# Campos com dados pessoais do aluno, substituídos por pseudônimos estáveis
+PERSONAL_FIELDS = ("studentName", "studentId", "studentEmail")
+
+# Únicos cabeçalhos gravados das requisições recebidas (nunca cookies ou credenciais)
+CAPTURED_HEADERS = ("accept", "accept-encoding", "content-type", "if-none-match", "x-tenant-id")
+
+# Rotas que não entram na captura (arquivos estáticos e o canal de eventos)
+SKIPPED_PREFIXES = ("/static/", "/api/responses/stream")
+
+
+class Pseudonymizer:
+    """
+    Troca os dados pessoais por pseudônimos (HMAC): o mesmo aluno recebe o mesmo
+    pseudônimo nas requisições e nas chamadas ao Parse Server, então o replay
+    encontra as chamadas gravadas.
+    """
+
+    def __init__(self, salt=CAPTURE_SALT):
+        self._key = (salt or secrets.token_hex(16)).encode("utf-8")
+
+    def token(self, value):
+        return hmac.new(self._key, str(value).encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+
+    def value(self, field, value):
+        if value in (None, ""):
+            return value
+        if field == "studentEmail":
+            return f"anon-{self.token(value)}@example.invalid"
+        return f"anon-{self.token(value)}"
+
+    def scrub(self, data):
+        """Cópia de `data` (dicts/listas aninhados) com os campos pessoais trocados."""
+        if isinstance(data, dict):
+            return {
+                key: self._scrub_field(key, value) if key in PERSONAL_FIELDS else self.scrub(value)
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [self.scrub(item) for item in data]
+        return data
+
+    def _scrub_field(self, field, value):
+        # Todo valor sob um campo pessoal vira pseudônimo, inclusive dentro de
+        # operadores do Parse (ex.: {"studentEmail": {"$in": [...]}})
+        if isinstance(value, dict):
+            return {key: self._scrub_field(field, item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._scrub_field(field, item) for item in value]
+        return self.value(field, value)
+
+    def scrub_text(self, text):
+        """Corpo JSON em texto; o que não for JSON é mantido."""
+        if not text:
+            return text
+        try:
+            return json.dumps(self.scrub(json.loads(text)), ensure_ascii=False, separators=(",", ":"))
+        except ValueError:
+            return text
+
+    def scrub_query(self, query):
+        pairs = parse_qsl(query, keep_blank_values=True)
+        return urlencode([(k, self.value(k, v) if k in PERSONAL_FIELDS else v) for k, v in pairs])
+
+
+def _decode_body(body):
+    """Texto do corpo (ou base64, se não for UTF-8)."""
+    if not body:
+        return None, None
+    try:
+        return body.decode("utf-8"), None
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode("ascii"), "base64"
+
+
+def encode_parse_params(params, pseudonymizer):
+    """
+    Forma canônica dos parâmetros de uma chamada ao Parse Server (chave do replay).
+    """
+    canonical = {}
+    for key, value in sorted((params or {}).items()):
+        if key == "where" and isinstance(value, str):
+            try:
+                value = json.dumps(pseudonymizer.scrub(json.loads(value)), sort_keys=True)
+            except ValueError:
+                pass
+        canonical[key] = str(value)
+    return canonical
+
+
+class TrafficCapture:
+    """
+    Grava requisições e chamadas ao Parse Server em blocos gzip, só acrescentando ao arquivo.
+
+    Os registros ficam em memória até `flush_records` registros ou
+    `flush_interval` segundos; cada gravação é um membro gzip completo, feita
+    por uma thread própria (nunca no event loop de quem registra).
+    """
+
+    def __init__(self, directory=CAPTURE_DIR, enabled=CAPTURE_ENABLED, pseudonymizer=None,
+                 flush_records=CAPTURE_FLUSH_RECORDS, flush_interval=CAPTURE_FLUSH_INTERVAL):
+        self.directory = directory
+        self.enabled = enabled
+        self.pseudonymizer = pseudonymizer or Pseudonymizer()
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.path = None
+        self._started = time.monotonic()
+        self._pending = []
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_due = threading.Event()
+        self._flusher = None
+        self.counters = {"http": 0, "parse": 0, "written": 0, "errors": 0}
+
+    def start(self):
+        """Inicia um novo arquivo de captura (os tempos dos registros contam a partir daqui)."""
+        with self._lock:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            self.path = os.path.join(self.directory, f"capture-{stamp}-{os.getpid()}.jsonl.gz")
+            self._started = time.monotonic()
+            self.enabled = True
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="capture-flush", daemon=True)
+                self._flusher.start()
+        return self.path
+
+    def _offset(self):
+        return round(time.monotonic() - self._started, 4)
+
+    def record_http(self, tenant, client, method, path, query, headers, body, status, latency, size):
+        """
+        Args:
+            tenant (str): Instituição da requisição
+            client (str): Endereço do cliente (gravado como pseudônimo)
+            headers (list): Cabeçalhos ASGI da requisição
+            body (bytes): Corpo da requisição
+            latency (float): Segundos até o fim da resposta
+            size (int): Bytes do corpo da resposta
+        """
+        anonymizer = self.pseudonymizer
+        text, encoding = _decode_body(body)
+        if encoding is None:
+            text = anonymizer.scrub_text(text)
+        captured = {}
+        for key, value in headers:
+            name = key.decode("latin-1").lower()
+            if name in CAPTURED_HEADERS:
+                captured[name] = value.decode("latin-1")
+        self._add({
+            "kind": "http",
+            "t": self._offset(),
+            "tenant": tenant,
+            "client": anonymizer.token(client),
+            "method": method,
+            "path": path,
+            "query": anonymizer.scrub_query(query),
+            "headers": captured,
+            "body": text,
+            "body_encoding": encoding,
+            "status": status,
+            "latency_ms": round(latency * 1000, 2),
+            "size": size,
+        })
+
+    def record_parse(self, tenant, method, path, kwargs, response, latency):
+        """
+        Args:
+            path (str): Caminho relativo ao servidor (ex.: "/classes/Question")
+            kwargs (dict): Argumentos da chamada (params, data)
+            response: Resposta do `requests`
+        """
+        anonymizer = self.pseudonymizer
+        body = kwargs.get("data")
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        try:
+            result = anonymizer.scrub(response.json())
+        except ValueError:
+            result = response.text
+        self._add({
+            "kind": "parse",
+            "t": self._offset(),
+            "tenant": tenant,
+            "method": method,
+            "path": path,
+            "params": encode_parse_params(kwargs.get("params"), anonymizer),
+            "body": anonymizer.scrub_text(body),
+            "status": response.status_code,
+            "latency_ms": round(latency * 1000, 2),
+            "response": result,
+        })
+
+    def _add(self, record):
+        with self._lock:
+            if self.path is None:
+                return
+            self._pending.append(record)
+            self.counters[record["kind"]] += 1
+            due = (len(self._pending) >= self.flush_records
+                   or time.monotonic() - self._flushed_at >= self.flush_interval)
+        if due:
+            # Chamado também pelo middleware, no event loop: a gravação fica com a thread
+            self._flush_due.set()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_due.wait(self.flush_interval)
+            self._flush_due.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+                self._flushed_at = time.monotonic()
+                path = self.path
+            if not records or path is None:
+                return
+            payload = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "ab") as f:
+                    f.write(gzip.compress(payload.encode("utf-8")))
+                with self._lock:
+                    self.counters["written"] += len(records)
+            except OSError as e:
+                print(f"Erro ao gravar captura de tráfego: {e}")
+                with self._lock:
+                    self.counters["errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": self.enabled, "file": self.path, "pending": len(self._pending), **self.counters}
+
+
+def read_capture(path):
+    """
+    Yields:
+        dict: Registros de um arquivo de captura, na ordem gravada
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class RecordedResponse:
+    """Resposta gravada, com a interface usada de `requests.Response`."""
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+
+    def json(self):
+        if isinstance(self._payload, str):
+            return json.loads(self._payload)
+        return self._payload
+
+
+class ParseFixtures:
+    """
+    Responde às chamadas ao Parse Server com as respostas gravadas na captura.
+
+    A chamada é procurada pela instituição, método, caminho e parâmetros
+    (chamadas repetidas devolvem as gravações em ordem, repetindo a última);
+    se os parâmetros não baterem (ex.: datas calculadas na hora), vale a
+    próxima gravação do mesmo método e caminho. O que não foi gravado recebe 404.
+    """
+
+    def __init__(self, path=None, latency=REPLAY_LATENCY):
+        self.latency = latency
+        self._exact = {}
+        self._by_path = {}
+        self._lock = threading.Lock()
+        self.counters = {"exact": 0, "fallback": 0, "missing": 0}
+        if path:
+            self.load(path)
+
+    @property
+    def active(self):
+        return bool(self._by_path)
+
+    def load(self, path):
+        for record in read_capture(path):
+            if record["kind"] != "parse":
+                continue
+            base = (record["tenant"], record["method"], record["path"].split("?")[0])
+            key = base + (json.dumps(record["params"], sort_keys=True),)
+            self._exact.setdefault(key, deque()).append(record)
+            self._by_path.setdefault(base, deque()).append(record)
+
+    @staticmethod
+    def _next(queue):
+        # A última gravação continua valendo para chamadas além das gravadas
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def respond(self, tenant, method, path, kwargs):
+        base = (tenant, method, path.split("?")[0])
+        # Os parâmetros do replay já chegam anonimizados (vêm das requisições gravadas)
+        params = {key: str(value) for key, value in sorted((kwargs.get("params") or {}).items())}
+        if "where" in params:
+            try:
+                params["where"] = json.dumps(json.loads(params["where"]), sort_keys=True)
+            except ValueError:
+                pass
+        key = base + (json.dumps(params, sort_keys=True),)
+        with self._lock:
+            if self._exact.get(key):
+                record = self._next(self._exact[key])
+                self.counters["exact"] += 1
+            elif self._by_path.get(base):
+                record = self._next(self._by_path[base])
+                self.counters["fallback"] += 1
+            else:
+                record = None
+                self.counters["missing"] += 1
+        if record is None:
+            return RecordedResponse(404, {"code": 101, "error": "Chamada não gravada na captura"})
+        if self.latency > 0:
+            time.sleep(record["latency_ms"] / 1000.0 * self.latency)
+        return RecordedResponse(record["status"], record["response"])
+
+    def stats(self):
+        with self._lock:
+            return {"calls": sum(len(q) for q in self._by_path.values()), "latency": self.latency, **self.counters}
+
+
+traffic_capture = TrafficCapture()
+parse_fixtures = ParseFixtures(REPLAY_FIXTURES or None)
+
+
+class CaptureMiddleware:
+    """
+    Grava cada requisição recebida (anonimizada) com o status, o tamanho e a
+    latência da resposta. Sem TRAFFIC_CAPTURE=1 a requisição passa direto.
+
+    A instituição gravada é a resolvida pela aplicação (`tenant_var`, que
+    também cobre a escolha pelo Host); sem ela, vale o cabeçalho `tenant_header`.
+    """
+
+    def __init__(self, app, capture=traffic_capture, tenant_var=None, tenant_header=b"x-tenant-id",
+                 default_tenant="default"):
+        self.app = app
+        self.capture = capture
+        self.tenant_var = tenant_var
+        self.tenant_header = tenant_header
+        self.default_tenant = default_tenant
+
+    def _tenant(self, headers):
+        tenant = self.tenant_var.get(None) if self.tenant_var is not None else None
+        if tenant is not None:
+            return tenant.id
+        return next((v.decode("latin-1") for k, v in headers if k.lower() == self.tenant_header),
+                    self.default_tenant)
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not self.capture.enabled
+                or scope["path"].startswith(SKIPPED_PREFIXES)):
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        chunks = []
+        state = {"status": None, "size": 0}
+
+        async def receive_tee():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def send_tee(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_tee, send_tee)
+        finally:
+            headers = scope.get("headers", [])
+            tenant = self._tenant(headers)
+            client = (scope.get("client") or ("unknown", 0))[0]
+            self.capture.record_http(
+                tenant, client, scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"),
+                headers, b"".join(chunks), state["status"] or 500, time.perf_counter() - start, state["size"],
+            )